@@ -1,9 +1,17 @@
 import os
+import csv
 import glob
-import pandas as pd
-from deepface import DeepFace
+import time
+import frame_sampling
+import frame_store
+from frame_writer import CAPTURE_DONE_FILENAME
+import session_catalog
+import tracing
 import argparse
 import warnings
+import multiprocessing
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 # Ignorar advertencias de TensorFlow que no son críticas
 warnings.filterwarnings("ignore")
@@ -15,72 +23,403 @@ os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
 # Nivel 2: Oculta mensajes de INFO y WARNINGS
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
 
-def analyze_emotions(input_dir):
+# ===============================================================
+# --- CONFIGURACIÓN ---
+# ===============================================================
+OUTPUT_FILENAME = session_catalog.EMOTIONS_FILENAME
+EMOTION_COLUMNS = ['angry', 'disgust', 'fear', 'happy', 'sad', 'surprise', 'neutral']
+COLUMN_ORDER = ['archivo', 'emocion_dominante'] + EMOTION_COLUMNS + ['origen']
+DEFAULT_CHUNK_SIZE = 64     # Frames por llamada a DeepFace (y por escritura incremental)
+DEFAULT_WORKERS = 1         # Procesos de análisis; cada uno carga su propia copia del modelo
+DEFAULT_KEYFRAME_INTERVAL = 30  # Modo --track: frames máximos entre dos detecciones de cara
+DEFAULT_ROI_SIZE = 224          # Modo --track: lado del recorte de la cara que recibe el modelo
+DEFAULT_LAG_BUDGET_S = 5.0      # Modo --stream: retraso máximo respecto a la captura antes de saltar frames
+DEFAULT_STREAM_CHUNK = 16       # Modo --stream: frames por llamada a DeepFace (bloques pequeños = menos retraso)
+STREAM_POLL_S = 0.5             # Modo --stream: cada cuánto se buscan frames nuevos
+STREAM_IDLE_TIMEOUT_S = 120     # Modo --stream: se abandona si no llegan frames nuevos en este tiempo
+
+# ===============================================================
+# --- FUNCIONES AUXILIARES ---
+# ===============================================================
+def list_frames(input_dir):
     """
-    Analiza todos los archivos de imagen en un directorio para detectar emociones.
+    Frames del directorio, en orden: los del frames.store si existe (rutas virtuales, ver frame_store.py)
+    y si no los .jpg (o .png si no hay .jpg).
     """
-    if not os.path.isdir(input_dir):
-        print(f"❌ Error: El directorio de entrada no existe: {input_dir}")
-        return
-
+    store_path = frame_store.store_path(input_dir)
+    if os.path.exists(store_path):
+        return frame_store.open_store(store_path).refs()
     image_files = glob.glob(os.path.join(input_dir, '*.jpg'))
     if not image_files:
         image_files = glob.glob(os.path.join(input_dir, '*.png'))
+    return sorted(image_files)
+
+def resolve_frames_dir(input_dir, newer_than=None):
+    """
+    Carpeta con los frames de una sesión: la propia carpeta si tiene frames, o si no su subcarpeta
+    más reciente (capture_10s.py guarda cada captura en <salida>/<fecha_hora>). Con `newer_than`
+    (epoch) se ignoran las carpetas sin cambios desde entonces (capturas anteriores de la misma sesión).
+    None si aún no hay ninguna.
+    """
+    def recent(path):
+        return newer_than is None or os.path.getmtime(path) >= newer_than
+    if list_frames(input_dir) and recent(input_dir):
+        return input_dir
+    subdirs = sorted(e.path for e in os.scandir(input_dir) if e.is_dir()) if os.path.isdir(input_dir) else []
+    subdirs = [d for d in subdirs if recent(d)]
+    return subdirs[-1] if subdirs else None
+
+def catalog_results(frames_dir, output_path, stage, seconds, **info):
+    """Registra en el catálogo de sesiones la carpeta de frames, el almacén (si lo hay), el CSV y el tiempo de análisis
+    (este último también en el log de trazas)."""
+    session_id = session_catalog.session_id_from_frames_dir(frames_dir)
+    session_catalog.safe_register(session_id, 'frames', frames_dir)
+    store_path = frame_store.store_path(frames_dir)
+    if os.path.exists(store_path):
+        session_catalog.safe_register(session_id, 'frame_store', store_path)
+    session_catalog.safe_register(session_id, 'emotions', output_path)
+    session_catalog.safe_record_timing(session_id, stage, seconds, **info)
+    tracing.record(session_id, stage, seconds, **info)
+
+def load_done_frames(output_path):
+    """Nombres de los frames que ya tienen resultado calculado en el CSV de salida (para reanudar)."""
+    if not os.path.exists(output_path):
+        return set()
+    with open(output_path, newline='') as f:
+        return {row['archivo'] for row in csv.DictReader(f, delimiter=';')
+                if row.get('archivo') and row.get('origen') != frame_sampling.ORIGIN_INFERRED}
+
+def result_to_row(res):
+    # Creamos un diccionario base con la información principal
+    row = {
+        'archivo': os.path.basename(res.get('source', 'N/A')),
+        'emocion_dominante': res.get('dominant_emotion', 'N/A'),
+        'origen': frame_sampling.ORIGIN_COMPUTED
+    }
+    # Añadimos las puntuaciones de cada emoción al diccionario
+    row.update({k: float(v) for k, v in res.get('emotion', {}).items()})
+    return row
+
+def results_to_rows(paths, results):
+    rows = []
+    for path, single_image_results in zip(paths, results):
+        if isinstance(single_image_results, dict):
+            single_image_results = [single_image_results]
+        if single_image_results:
+            res = dict(single_image_results[0])
+            res['source'] = path
+            rows.append(result_to_row(res))
+    return rows
+
+def analyze_chunk(image_files):
+    """
+    Analiza un bloque de frames con DeepFace y devuelve (una fila por frame con cara,
+    nº de frames en los que se ejecutó el detector de caras).
+    """
+    # DeepFace (y con él TensorFlow) se importa al analizar el primer bloque: --help o una carpeta
+    # sin frames nuevos no pagan su carga
+    from deepface import DeepFace
+    # Los frames del almacén se pasan como arrays (vistas del mmap); los archivos, por ruta
+    inputs = [frame_store.load_frame(f) for f in image_files] if frame_store.is_store_ref(image_files[0]) else image_files
+    results = DeepFace.analyze(
+        img_path=inputs,
+        actions=['emotion'],
+        enforce_detection=False
+    )
+    return results_to_rows(image_files, results), len(image_files)
+
+def analyze_chunk_tracked(image_files, keyframe_interval=DEFAULT_KEYFRAME_INTERVAL, roi_size=DEFAULT_ROI_SIZE, detector_backend='opencv'):
+    """
+    Como analyze_chunk, pero el detector solo se ejecuta en frames clave o al perder la cara;
+    el modelo de emoción recibe el recorte de la cara ya reducido (sin volver a detectar).
+    Cada bloque empieza con su propio seguimiento, así los bloques siguen siendo independientes.
+    """
+    from face_roi import FaceRoiTracker  # OpenCV se carga al analizar, no al importar el módulo
+    tracker = FaceRoiTracker(keyframe_interval=keyframe_interval, roi_size=roi_size, detector_backend=detector_backend)
+    crops, paths = [], []
+    for path in image_files:
+        frame = frame_store.load_frame(path)
+        if frame is None:
+            continue
+        crop = tracker.roi(frame)
+        if crop is not None:
+            crops.append(crop)
+            paths.append(path)
+    if not crops:
+        return [], tracker.detections
+    from deepface import DeepFace
+    results = DeepFace.analyze(
+        img_path=crops,
+        actions=['emotion'],
+        detector_backend='skip',
+        enforce_detection=False
+    )
+    return results_to_rows(paths, results), tracker.detections
+
+def serialize_inference(analyze_fn, lock):
+    """
+    analyze_fn que solo ejecuta un bloque con `lock` tomado: varios trabajos en hilos del mismo proceso
+    (servicio residente) comparten un único modelo, y solo la inferencia espera, no el trabajo entero.
+    """
+    def run(chunk):
+        with lock:
+            return analyze_fn(chunk)
+    return run
 
+def iter_chunk_results(chunks, workers, analyze_fn=analyze_chunk):
+    """Genera (bloque, resultado de analyze_fn o excepción) a medida que terminan; en paralelo si workers > 1."""
+    if workers <= 1:
+        for chunk in chunks:
+            try:
+                yield chunk, analyze_fn(chunk)
+            except Exception as e:
+                yield chunk, e
+        return
+    # 'spawn': TensorFlow no es seguro tras un fork; cada proceso importa y carga su propio modelo
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        futures = {pool.submit(analyze_fn, chunk): chunk for chunk in chunks}
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result()
+            except Exception as e:
+                yield futures[future], e
+
+def sort_output(output_path, all_frames=None):
+    """
+    Deja el CSV ordenado por frame (los bloques en paralelo terminan en cualquier orden).
+    Con `all_frames` se añaden, interpoladas y marcadas como inferidas, las filas de los frames no analizados.
+    """
+    import pandas as pd
+    df = pd.read_csv(output_path, sep=';')
+    if 'origen' not in df.columns:
+        df['origen'] = frame_sampling.ORIGIN_COMPUTED  # CSV de versiones anteriores
+    df = df.drop_duplicates(subset='archivo', keep='last').sort_values('archivo')
+    if all_frames is not None:
+        df = frame_sampling.fill_skipped(df, all_frames, EMOTION_COLUMNS)
+    df.to_csv(output_path, index=False, sep=';', columns=[c for c in COLUMN_ORDER if c in df.columns])
+
+# ===============================================================
+# --- ANÁLISIS ---
+# ===============================================================
+def analyze_emotions(input_dir, chunk_size=DEFAULT_CHUNK_SIZE, workers=DEFAULT_WORKERS, resume=True,
+                     track=False, keyframe_interval=DEFAULT_KEYFRAME_INTERVAL, roi_size=DEFAULT_ROI_SIZE, detector_backend='opencv',
+                     sampling='all', diff_threshold=frame_sampling.DEFAULT_DIFF_THRESHOLD, max_gap=frame_sampling.DEFAULT_MAX_GAP,
+                     target_fps=frame_sampling.DEFAULT_TARGET_FPS, capture_fps=frame_sampling.DEFAULT_CAPTURE_FPS,
+                     inference_lock=None, log=print):
+    """
+    Analiza todos los archivos de imagen en un directorio para detectar emociones.
+    Procesa los frames por bloques (en paralelo con `workers` > 1) y añade los resultados
+    al CSV a medida que termina cada bloque; con `resume` se saltan los frames ya analizados.
+    Con `track` la cara se detecta solo en frames clave y se sigue entre ellos (ver face_roi.py).
+    Con `sampling` distinto de 'all' solo se analizan los frames elegidos (ver frame_sampling.py) y el
+    resto se rellena interpolando, marcado como 'inferido' en la columna 'origen'.
+    Con `inference_lock` cada bloque analizado en este proceso toma el lock (ver serialize_inference) y
+    `log` recibe los mensajes en lugar de print (el servicio guarda así la salida de cada trabajo).
+    Devuelve la ruta del CSV generado, o None si no se generó.
+    """
+    if not os.path.isdir(input_dir):
+        log(f"❌ Error: El directorio de entrada no existe: {input_dir}")
+        return
+
+    input_dir = resolve_frames_dir(input_dir) or input_dir
+    image_files = list_frames(input_dir)
     if not image_files:
-        print(f"🤷 No se encontraron imágenes (.jpg, .png) en el directorio: {input_dir}")
+        log(f"🤷 No se encontraron imágenes (.jpg, .png, {frame_store.STORE_FILENAME}) en el directorio: {input_dir}")
         return
 
-    print(f"🙂 Encontradas {len(image_files)} imágenes. Iniciando análisis emocional con DeepFace...")
+    selected = image_files
+    if sampling != 'all':
+        t0 = time.monotonic()
+        selected = frame_sampling.select_frames(image_files, sampling, diff_threshold, max_gap, target_fps, capture_fps)
+        log(f"🎞️ Muestreo '{sampling}': se analizarán {len(selected)} de {len(image_files)} frames "
+              f"({len(image_files) - len(selected)} se interpolarán; selección en {time.monotonic() - t0:.2f} s).")
 
-    all_results_list = []
+    output_path = os.path.join(input_dir, OUTPUT_FILENAME)
+    if resume:
+        done = load_done_frames(output_path)
+        pending = [f for f in selected if os.path.basename(f) not in done]
+        if done:
+            log(f"⏩ Reanudando: {len(selected) - len(pending)} frames ya analizados, quedan {len(pending)}.")
+    else:
+        pending = selected
+        if os.path.exists(output_path):
+            os.remove(output_path)
 
+    if not pending:
+        if sampling != 'all' and os.path.exists(output_path):
+            sort_output(output_path, image_files)
+        log(f"\n✅ Todos los frames estaban analizados. Resultados en: {output_path}")
+        catalog_results(input_dir, output_path, 'analysis', 0.0, frames=len(image_files), analyzed=0)
+        return output_path
+
+    log(f"🙂 Encontradas {len(image_files)} imágenes. Iniciando análisis emocional con DeepFace "
+          f"({len(pending)} pendientes, bloques de {chunk_size}, {workers} proceso(s))...")
+
+    chunks = [pending[i:i + chunk_size] for i in range(0, len(pending), chunk_size)]
+    analyze_fn = analyze_chunk
+    if track:
+        analyze_fn = partial(analyze_chunk_tracked, keyframe_interval=keyframe_interval, roi_size=roi_size, detector_backend=detector_backend)
+    if inference_lock is not None and workers <= 1:
+        analyze_fn = serialize_inference(analyze_fn, inference_lock)
+    start_time = time.monotonic()
+    processed = 0
+    failed = 0
+    detections = 0
+    with open(output_path, 'a', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMN_ORDER, delimiter=';', extrasaction='ignore') # Punto y coma para evitar problemas con comas en los números
+        if f.tell() == 0:
+            writer.writeheader()
+        for chunk, result in iter_chunk_results(chunks, workers, analyze_fn):
+            if isinstance(result, Exception):
+                failed += len(chunk)
+                log(f"\n💥 Error durante el análisis con DeepFace de {os.path.basename(chunk[0])}..{os.path.basename(chunk[-1])}: {result}")
+                continue
+            rows, chunk_detections = result
+            detections += chunk_detections
+            # Escritura incremental: un fallo posterior no pierde lo ya analizado
+            writer.writerows(rows)
+            f.flush()
+            processed += len(chunk)
+            elapsed = time.monotonic() - start_time
+            fps = processed / elapsed if elapsed > 0 else 0
+            eta = (len(pending) - processed - failed) / fps if fps > 0 else 0
+            log(f"📈 {processed}/{len(pending)} frames ({fps:.1f} frames/s, quedan ~{eta:.0f} s)", flush=True)
+
+    if os.path.getsize(output_path) == 0 or not load_done_frames(output_path):
+        log("\n⚠️ No se detectaron caras en ninguna de las imágenes procesadas.")
+        return None
+
+    sort_output(output_path, image_files if sampling != 'all' else None)
+    elapsed = time.monotonic() - start_time
+    log(f"\n✅ Análisis completado en {elapsed:.1f} s ({processed / elapsed if elapsed > 0 else 0:.1f} frames/s). "
+          f"Resultados guardados en: {output_path}")
+    if track:
+        log(f"🎯 Detector de caras ejecutado en {detections} de {processed} frames.")
+    if failed:
+        log(f"⚠️ {failed} frames fallaron; vuelve a ejecutar el análisis para reintentarlos.")
+    catalog_results(input_dir, output_path, 'analysis', elapsed, frames=len(image_files), analyzed=processed, failed=failed)
+    return output_path
+
+# ===============================================================
+# --- ANÁLISIS EN STREAMING (DURANTE LA CAPTURA) ---
+# ===============================================================
+def stream_emotions(input_dir, lag_budget_s=DEFAULT_LAG_BUDGET_S, capture_fps=frame_sampling.DEFAULT_CAPTURE_FPS,
+                    chunk_size=DEFAULT_STREAM_CHUNK, poll_s=STREAM_POLL_S, idle_timeout_s=STREAM_IDLE_TIMEOUT_S,
+                    track=False, keyframe_interval=DEFAULT_KEYFRAME_INTERVAL, roi_size=DEFAULT_ROI_SIZE, detector_backend='opencv',
+                    inference_lock=None, log=print):
+    """
+    Analiza los frames a medida que la captura los escribe, hasta que aparece CAPTURE_DONE_FILENAME
+    (o no llegan frames nuevos en `idle_timeout_s`). Si el retraso respecto a la captura supera
+    `lag_budget_s`, se saltan los frames pendientes más antiguos; al final se rellenan interpolando
+    y quedan marcados como 'inferido'. `inference_lock` y `log` como en analyze_emotions.
+    Devuelve la ruta del CSV generado, o None si no se generó.
+    """
+    log(f"📡 Análisis en streaming de '{input_dir}' (retraso máximo {lag_budget_s:.1f} s)...", flush=True)
+    analyze_fn = analyze_chunk
+    if track:
+        analyze_fn = partial(analyze_chunk_tracked, keyframe_interval=keyframe_interval, roi_size=roi_size, detector_backend=detector_backend)
+    if inference_lock is not None:
+        analyze_fn = serialize_inference(analyze_fn, inference_lock)
+    max_backlog = max(chunk_size, int(lag_budget_s * capture_fps))
+    started_at = time.time() - 2  # Margen para la captura que arranca a la vez que el análisis
+    frames_dir = output_path = writer = f = None
+    done, skipped = set(), set()
+    processed = failed = 0
+    max_lag = 0.0
+    last_new_at = time.monotonic()
+    capture_done_at = None
     try:
-        results = DeepFace.analyze(
-            img_path=image_files,
-            actions=['emotion'],
-            enforce_detection=False
-        )
-
-        # --- Bucle de procesamiento de resultados (NUEVA VERSIÓN MEJORADA) ---
-        for single_image_results in results:
-            if single_image_results:
-                res = single_image_results[0]
-
-                # Creamos un diccionario base con la información principal
-                row = {
-                    'archivo': os.path.basename(res.get('source', 'N/A')),
-                    'emocion_dominante': res.get('dominant_emotion', 'N/A')
-                }
-
-                # Añadimos las puntuaciones de cada emoción al diccionario
-                emotions = res.get('emotion', {})
-                row.update(emotions)
-
-                all_results_list.append(row)
-
-        # Convertimos la lista de diccionarios a un DataFrame
-        df = pd.DataFrame(all_results_list)
-
-        # Reordenamos las columnas para que tengan un orden lógico
-        if not df.empty:
-            column_order = ['archivo', 'emocion_dominante', 'angry', 'disgust', 'fear', 'happy', 'sad', 'surprise', 'neutral']
-            # Nos aseguramos de que solo usamos las columnas que realmente existen en el DataFrame
-            existing_columns = [col for col in column_order if col in df.columns]
-            df = df[existing_columns]
-
-            output_path = os.path.join(input_dir, '_emotions_analysis.csv')
-            df.to_csv(output_path, index=False, sep=';') # Usamos punto y coma como separador para evitar problemas con comas en los números
-            print(f"\n✅ Análisis completado. Resultados guardados en: {output_path}")
-        else:
-            print("\n⚠️ No se detectaron caras en ninguna de las imágenes procesadas.")
-
-    except Exception as e:
-        print(f"\n💥 Error durante el análisis con DeepFace: {e}")
+        while True:
+            if frames_dir is None:
+                frames_dir = resolve_frames_dir(input_dir, newer_than=started_at) if os.path.isdir(input_dir) else None
+            frames = list_frames(frames_dir) if frames_dir else []
+            if frames_dir and capture_done_at is None and os.path.exists(os.path.join(frames_dir, CAPTURE_DONE_FILENAME)):
+                capture_done_at = time.monotonic()
+                frames = list_frames(frames_dir)  # Los últimos frames pueden haber llegado justo antes de la marca
+            if frames and f is None:
+                output_path = os.path.join(frames_dir, OUTPUT_FILENAME)
+                done = load_done_frames(output_path)
+                f = open(output_path, 'a', newline='')
+                writer = csv.DictWriter(f, fieldnames=COLUMN_ORDER, delimiter=';', extrasaction='ignore')
+                if f.tell() == 0:
+                    writer.writeheader()
+
+            pending = [p for p in frames if os.path.basename(p) not in done and os.path.basename(p) not in skipped]
+            if not pending:
+                if capture_done_at is not None:
+                    break
+                if time.monotonic() - last_new_at > idle_timeout_s:
+                    log(f"⚠️ No llegan frames nuevos desde hace {idle_timeout_s} s y la captura no ha marcado su fin; se termina.")
+                    break
+                time.sleep(poll_s)
+                continue
+
+            last_new_at = time.monotonic()
+            lag = len(pending) / capture_fps
+            max_lag = max(max_lag, lag)
+            if len(pending) > max_backlog:
+                # El analizador no da abasto: se salta lo más antiguo para seguir cerca del directo
+                for p in pending[:len(pending) - max_backlog]:
+                    skipped.add(os.path.basename(p))
+                log(f"⏭️ Retraso de {lag:.1f} s > {lag_budget_s:.1f} s: se saltan {len(pending) - max_backlog} frames.", flush=True)
+                pending = pending[len(pending) - max_backlog:]
+            chunk = pending[:chunk_size]
+            try:
+                rows, _ = analyze_fn(chunk)
+            except Exception as e:
+                failed += len(chunk)
+                skipped.update(os.path.basename(p) for p in chunk)
+                log(f"\n💥 Error durante el análisis con DeepFace de {os.path.basename(chunk[0])}..{os.path.basename(chunk[-1])}: {e}")
+                continue
+            writer.writerows(rows)
+            f.flush()
+            done.update(os.path.basename(p) for p in chunk)
+            processed += len(chunk)
+            log(f"📈 {processed} frames analizados, {len(pending) - len(chunk)} pendientes (retraso ~{(len(pending) - len(chunk)) / capture_fps:.1f} s)", flush=True)
+    finally:
+        if f is not None:
+            f.close()
+
+    if output_path is None or not load_done_frames(output_path):
+        log("\n⚠️ No se analizó ningún frame con cara.")
+        return None
+    sort_output(output_path, list_frames(frames_dir) if skipped else None)
+    ready_after = time.monotonic() - capture_done_at if capture_done_at is not None else None
+    log(f"\n✅ Análisis en streaming completado: {processed} frames analizados, {len(skipped)} saltados "
+          f"(retraso máximo {max_lag:.1f} s). Resultados guardados en: {output_path}")
+    if ready_after is not None:
+        log(f"⏱️ Resultados listos {ready_after:.1f} s después del fin de la captura.")
+    if failed:
+        log(f"⚠️ {failed} frames fallaron; se han rellenado interpolando.")
+    catalog_results(frames_dir, output_path, 'stream_analysis', time.time() - started_at,
+                    analyzed=processed, skipped=len(skipped), ready_after_s=ready_after)
+    return output_path
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Analizador de Emociones con DeepFace")
     parser.add_argument("--input", required=True, help="Directorio que contiene los frames de vídeo a analizar.")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Frames por bloque de análisis.")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Procesos de análisis en paralelo.")
+    parser.add_argument("--no-resume", action="store_true", help="Ignora los resultados previos y analiza todo de nuevo.")
+    parser.add_argument("--track", action="store_true", help="Detecta la cara solo en frames clave y la sigue entre ellos.")
+    parser.add_argument("--keyframe-interval", type=int, default=DEFAULT_KEYFRAME_INTERVAL, help="Modo --track: frames entre detecciones.")
+    parser.add_argument("--roi-size", type=int, default=DEFAULT_ROI_SIZE, help="Modo --track: lado del recorte de la cara.")
+    parser.add_argument("--detector", default="opencv", help="Detector de caras de DeepFace (opencv, retinaface, mtcnn...).")
+    parser.add_argument("--sample", choices=frame_sampling.SAMPLING_MODES, default="all", help="Frames a analizar: todos, adaptativo (según cambios en la imagen) o a ritmo fijo.")
+    parser.add_argument("--diff-threshold", type=float, default=frame_sampling.DEFAULT_DIFF_THRESHOLD, help="Modo adaptativo: diferencia media (0-255) para analizar un frame.")
+    parser.add_argument("--max-gap", type=int, default=frame_sampling.DEFAULT_MAX_GAP, help="Modo adaptativo: frames máximos seguidos sin analizar.")
+    parser.add_argument("--target-fps", type=float, default=frame_sampling.DEFAULT_TARGET_FPS, help="Modo 'rate': frames analizados por segundo.")
+    parser.add_argument("--capture-fps", type=float, default=frame_sampling.DEFAULT_CAPTURE_FPS, help="Modos 'rate' y --stream: frames capturados por segundo.")
+    parser.add_argument("--stream", action="store_true", help="Analiza los frames mientras se capturan, hasta que la captura termine.")
+    parser.add_argument("--lag-budget", type=float, default=DEFAULT_LAG_BUDGET_S, help="Modo --stream: retraso máximo (s) antes de saltar frames.")
     args = parser.parse_args()
 
-    analyze_emotions(args.input)
+    if args.stream:
+        stream_emotions(args.input, lag_budget_s=args.lag_budget, capture_fps=args.capture_fps,
+                        track=args.track, keyframe_interval=args.keyframe_interval, roi_size=args.roi_size, detector_backend=args.detector)
+    else:
+        analyze_emotions(args.input, chunk_size=args.chunk_size, workers=args.workers, resume=not args.no_resume,
+                         track=args.track, keyframe_interval=args.keyframe_interval, roi_size=args.roi_size, detector_backend=args.detector,
+                         sampling=args.sample, diff_threshold=args.diff_threshold, max_gap=args.max_gap,
+                         target_fps=args.target_fps, capture_fps=args.capture_fps)
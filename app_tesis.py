@@ -1,21 +1,27 @@
+import time
+_import_started = time.perf_counter()
 import gradio as gr
 import subprocess
 import os
 import shutil
-import json
-import pandas as pd
-import plotly.express as px
 from datetime import datetime
 from gradio.themes.base import Base
 import paho.mqtt.client as mqtt
-import paho.mqtt.publish as publish
 import threading
-import requests
-from PIL import Image
-import io
-import time
-from watchdog.observers import Observer
-from watchdog.events import FileSystemEventHandler
+import emotion_service
+from biomedidas_cache import BiomedidasCache
+import decimation
+from collections import deque
+from live_buffer import LiveSignalBuffer, LIVE_CHANNELS
+from biopayload import is_binary_payload
+import session_catalog
+import tracing
+import control_client
+# Arranque rápido: plotly, requests, watchdog (vía orquestador.py) y fusion.py se importan dentro de las funciones
+# que los usan, y los clientes MQTT y de control, el endpoint de métricas y el índice del catálogo se crean con la
+# interfaz ya en marcha (start_background_services). gradio sigue arriba porque la interfaz se define al importar
+# el módulo; él mismo carga numpy y pandas, así que decimation.py, biomedidas_cache.py y live_buffer.py los
+# importan arriba sin coste añadido. 'python3 import_profile.py app_tesis' mide el coste de cada importación.
 
 # ===============================================================
 # --- TEMA Y CONFIGURACIÓN GLOBAL ---
@@ -30,7 +36,7 @@ WINDOWS_HOST_IP = "192.168.1.143"
 CAMERA_SERVER_URL = f"http://{WINDOWS_HOST_IP}:5000"
 
 ACESTEP_OUTPUT_DIR = "/home/alvar/ACE-Step/outputs"
-DEST_DIR_WSL = "/mnt/c/Users/alvar/Desktop/DOCTORADO/PROGRAMAS/musica_generada"; FRAMES_DIR_WSL = "/mnt/c/Users/alvar/Desktop/DOCTORADO/PROGRAMAS/frames"; ANALYZER_SCRIPT_WSL = "/home/alvar/analizar_emocion.py"; BIOMEDIDAS_CSV_DIR = "/home/alvar/biomedidas"; MQTT_BROKER = "localhost"; MQTT_CONTROL_TOPIC = "tesis/control"; MQTT_DATA_TOPIC = "tesis/biomedidas"; ACESTEP_RUN_SCRIPT = "/home/alvar/run_acestep.sh"; CAPTURE_SCRIPT_WIN = "C:\\Users\\alvar\\Desktop\\DOCTORADO\\PROGRAMAS\\capture_10s.py"; MUSIC_GENERADA_WIN = "C:\\Users\\alvar\\Desktop\\DOCTORADO\\PROGRAMAS\\musica_generada"; POWERSHELL_PATH = "/mnt/c/Windows/System32/WindowsPowerShell/v1.0/powershell.exe"
+DEST_DIR_WSL = "/mnt/c/Users/alvar/Desktop/DOCTORADO/PROGRAMAS/musica_generada"; FRAMES_DIR_WSL = "/mnt/c/Users/alvar/Desktop/DOCTORADO/PROGRAMAS/frames"; ANALYZER_SCRIPT_WSL = "/home/alvar/analizar_emocion.py"; BIOMEDIDAS_CSV_DIR = "/home/alvar/biomedidas"; MQTT_BROKER = "localhost"; MQTT_DATA_TOPIC = "tesis/biomedidas"; MQTT_DEVICE_DATA_TOPIC = "tesis/+/biomedidas"; ACESTEP_RUN_SCRIPT = "/home/alvar/run_acestep.sh"; CAPTURE_SCRIPT_WIN = "C:\\Users\\alvar\\Desktop\\DOCTORADO\\PROGRAMAS\\capture_10s.py"; MUSIC_GENERADA_WIN = "C:\\Users\\alvar\\Desktop\\DOCTORADO\\PROGRAMAS\\musica_generada"; POWERSHELL_PATH = "/mnt/c/Windows/System32/WindowsPowerShell/v1.0/powershell.exe"
 
 # ===============================================================
 # --- LÓGICA PARA EL MODO AUTOMÁTICO (VIGILANCIA DE CARPETA) ---
@@ -40,27 +46,26 @@ stop_monitoring_flag = threading.Event()
 monitoring_logs = []
 
 def trigger_recording_from_file(file_path):
+    import requests
     try:
         filename = os.path.basename(file_path)
         session_id = os.path.splitext(filename)[0]
-        shutil.copy(file_path, DEST_DIR_WSL)
+        with tracing.span(session_id, 'copia'): shutil.copy(file_path, DEST_DIR_WSL)
         log_msg = f"[{datetime.now().strftime('%H:%M:%S')}] ✅ Nuevo archivo: {filename}. Copiado."
         monitoring_logs.append(log_msg); print(log_msg)
         params = {'session_id': session_id, 'audio_filename': filename}
-        requests.get(f"{CAMERA_SERVER_URL}/record_start", params=params, timeout=10)
+        tracing.record(session_id, 'orden_grabacion'); requests.get(f"{CAMERA_SERVER_URL}/record_start", params=params, timeout=10)
         log_msg = f"[{datetime.now().strftime('%H:%M:%S')}] ✅ Orden de grabar enviada para '{session_id}'."
         monitoring_logs.append(log_msg); print(log_msg)
     except Exception as e:
         log_msg = f"[{datetime.now().strftime('%H:%M:%S')}] ❌ Error procesando {file_path}: {e}"
         monitoring_logs.append(log_msg); print(log_msg)
 
-class NewFileHandler(FileSystemEventHandler):
-    def on_created(self, event):
-        if not event.is_directory and event.src_path.endswith('.wav'):
-            time.sleep(1); trigger_recording_from_file(event.src_path)
-
 def watchdog_thread_function():
-    event_handler = NewFileHandler()
+    from watchdog.observers import Observer
+    from orquestador import StableFileWatcher
+    # La grabación se lanza cuando ACE-Step termina de escribir el WAV (sin esperas fijas; ver orquestador.py)
+    event_handler = StableFileWatcher(trigger_recording_from_file)
     observer = Observer()
     observer.schedule(event_handler, ACESTEP_OUTPUT_DIR, recursive=False)
     observer.start()
@@ -93,110 +98,277 @@ def get_monitoring_logs(): return "\n".join(monitoring_logs)
 # ===============================================================
 # --- RECEPTOR MQTT Y OTRAS FUNCIONES DE BACKEND ---
 # ===============================================================
-mqtt_log_queue = []
-mqtt_client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION1)
+mqtt_log_queue = deque(maxlen=50)
+# Buffer circular de NumPy con las últimas muestras recibidas: alimenta el panel en directo sin pasar por texto ni por el CSV
+live_buffer = LiveSignalBuffer()
+LIVE_REFRESH_S = 1.0; LIVE_WINDOW_S = 120; LIVE_PLOT_POINTS = 600
+# Se crean en start_background_services: los comandos START/STOP salen por la misma conexión persistente que el log
+mqtt_client = None; control = None
+def get_control():
+    if control is None: raise ConnectionError("los servicios MQTT aún no se han iniciado")
+    return control
 def on_connect(client, userdata, flags, rc, properties=None):
     print(f"MQTT Log Listener Connected with code {rc}")
-    client.subscribe(MQTT_DATA_TOPIC)
+    client.subscribe([(MQTT_DATA_TOPIC, 0), (MQTT_DEVICE_DATA_TOPIC, 0), (control_client.ACK_TOPIC, 1)])
 def on_message(client, userdata, msg):
     try:
-        payload = msg.payload.decode('utf-8')
-        if len(mqtt_log_queue) > 50: mqtt_log_queue.pop(0)
-        mqtt_log_queue.append(f"[{datetime.now().strftime('%H:%M:%S')}] {payload}")
+        n = live_buffer.append_payload(msg.payload)
+        payload = f"trama binaria ({n} muestras)" if is_binary_payload(msg.payload) else msg.payload.decode('utf-8')
+        mqtt_log_queue.append(f"[{datetime.now().strftime('%H:%M:%S')}] {msg.topic}: {payload}")
     except Exception as e: mqtt_log_queue.append(f"❌ Error MQTT: {e}")
-def mqtt_listener():
+def start_background_services():
+    # Con la interfaz ya servida: si el bróker no responde, paho reintenta en su hilo sin bloquear el arranque
+    global mqtt_client, control
+    mqtt_client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION1)
     mqtt_client.on_connect = on_connect; mqtt_client.on_message = on_message
-    mqtt_client.connect(MQTT_BROKER, 1883, 60); mqtt_client.loop_forever()
-mqtt_thread = threading.Thread(target=mqtt_listener, daemon=True)
-mqtt_thread.start()
+    control = control_client.ControlClient(mqtt_client)
+    mqtt_client.connect_async(MQTT_BROKER, 1883, 60); mqtt_client.loop_start()
+    tracing.start_metrics_server()
+    threading.Thread(target=index_existing_sessions, daemon=True).start()
 def get_mqtt_log(): return "\n".join(mqtt_log_queue)
+def live_biomedidas_update(window_s):
+    # Se dibujan solo los últimos window_s segundos, diezmados a un nº fijo de puntos: el coste no depende de la duración de la sesión
+    import numpy as np, pandas as pd, plotly.graph_objects as go
+    data = live_buffer.latest(seconds=window_s or LIVE_WINDOW_S)
+    if len(data['timestamp']) == 0: return None, "⏳ Esperando datos del ESP32...", get_mqtt_log()
+    x = pd.to_datetime(data['timestamp'], unit='s').to_numpy()
+    fig = go.Figure()
+    for c in LIVE_CHANNELS:
+        xs, ys = decimation.decimate(x, data[c], LIVE_PLOT_POINTS, 'minmax')
+        if len(xs): fig.add_trace(go.Scattergl(x=xs, y=ys, mode='lines', name=c))
+    fig.update_layout(title="Bioseñales en directo", xaxis_title="timestamp", legend_title="variable", uirevision="live")
+    age = time.time() - np.nanmax(data['timestamp'])
+    return fig, f"📡 {len(data['timestamp'])} muestras en la ventana ({live_buffer.total} recibidas); última hace {age:.1f} s.", get_mqtt_log()
+def toggle_live_view(enabled): return gr.Timer(active=bool(enabled))
+CAMERA_VIEWER_OFF = "<div style='padding:2em;text-align:center;color:#888'>Cámara apagada</div>"
+def camera_stream_html():
+    # El navegador se conecta directamente al stream MJPEG del servidor de cámara; el parámetro t fuerza la reconexión
+    return f"<img src='{CAMERA_SERVER_URL}/stream?t={time.time():.0f}' style='width:100%;max-width:960px' alt='Vídeo en directo'/>"
 def start_camera_remote():
+    import requests
     try:
         requests.get(f"{CAMERA_SERVER_URL}/start_camera", timeout=10)
-        return "✅ Cámara iniciada. Pulsa 'Actualizar Foto' para ver la imagen."
+        return "✅ Cámara iniciada. El visor muestra el vídeo en directo.", camera_stream_html()
     except requests.exceptions.RequestException:
-        return f"❌ Error al conectar con el servidor de cámara. ¿Está ejecutándose?"
+        return f"❌ Error al conectar con el servidor de cámara. ¿Está ejecutándose?", CAMERA_VIEWER_OFF
 def stop_camera_remote():
+    import requests
     try:
-        requests.get(f"{CAMERA_SERVER_URL}/stop_camera", timeout=10)
-        return "✅ Cámara detenida.", None
+        response = requests.get(f"{CAMERA_SERVER_URL}/stop_camera", timeout=10)
+        if not response.ok: return f"❌ La cámara no se detuvo: {response.text}", camera_stream_html()
+        return "✅ Cámara detenida.", CAMERA_VIEWER_OFF
     except requests.exceptions.RequestException:
-        return f"❌ Error al detener la cámara.", None
+        return f"❌ Error al detener la cámara.", CAMERA_VIEWER_OFF
 def update_snapshot():
-    try:
-        response = requests.get(f"{CAMERA_SERVER_URL}/snapshot", timeout=10)
-        if response.status_code == 200 and len(response.content) > 0:
-            pil_image = Image.open(io.BytesIO(response.content)); return pil_image
-        return None
-    except requests.exceptions.RequestException: return None
+    """Reconecta el visor al stream (p. ej. si la cámara se inició desde otro sitio)."""
+    return camera_stream_html()
 def record_remote(session_id, audio_file_obj):
     if not session_id: return "❌ Por favor, introduce un ID de sesión."
     audio_filename = None
     if audio_file_obj is not None:
         try:
             audio_dest_path = os.path.join(DEST_DIR_WSL, os.path.basename(audio_file_obj.name))
-            shutil.copy(audio_file_obj.name, audio_dest_path)
+            with tracing.span(session_id, 'copia'): shutil.copy(audio_file_obj.name, audio_dest_path)
             audio_filename = os.path.basename(audio_file_obj.name)
+            session_catalog.safe_register(session_id, 'audio', audio_dest_path)
             print(f"Audio '{audio_filename}' copiado a la carpeta compartida.")
         except Exception as e: return f"❌ Error al copiar el archivo de audio: {e}"
+    import requests
     try:
         params = {'session_id': session_id, 'audio_filename': audio_filename}
-        requests.get(f"{CAMERA_SERVER_URL}/record_start", params=params, timeout=10)
+        tracing.record(session_id, 'orden_grabacion'); requests.get(f"{CAMERA_SERVER_URL}/record_start", params=params, timeout=10)
         if audio_filename: return f"✅ Orden de grabar enviada (sincronizada con '{audio_filename}')."
         else: return f"✅ Orden de grabar enviada (10 segundos)."
     except requests.exceptions.RequestException as e: return f"❌ Error al enviar la orden de grabar: {e}"
 def create_session(session_id, audio_file_obj):
     if not session_id or not audio_file_obj: return None, "❌ ERROR: El ID de sesión y el archivo de audio son obligatorios.", gr.Button(interactive=False), gr.Button(interactive=False)
     os.makedirs(os.path.join(DEST_DIR_WSL), exist_ok=True); os.makedirs(os.path.join(FRAMES_DIR_WSL, session_id), exist_ok=True)
-    audio_path_wsl = os.path.join(DEST_DIR_WSL, os.path.basename(audio_file_obj.name)); shutil.copy(audio_file_obj.name, audio_path_wsl)
+    audio_path_wsl = os.path.join(DEST_DIR_WSL, os.path.basename(audio_file_obj.name))
+    with tracing.span(session_id, 'copia'): shutil.copy(audio_file_obj.name, audio_path_wsl)
+    session_catalog.safe_register(session_id, 'audio', audio_path_wsl); session_catalog.safe_register(session_id, 'frames', os.path.join(FRAMES_DIR_WSL, session_id))
     log_message = f"✅ Sesión '{session_id}' creada.\n➡️ Listo para el Paso 2: Iniciar Captura."
     return session_id, log_message, gr.Button(interactive=True), gr.Button(interactive=False)
+# Análisis en streaming: se pide al servicio al iniciar la captura y la respuesta se recoge en el Paso 3
+stream_jobs = {}
+# Lo que el Paso 3 espera al streaming antes de devolver el control a la interfaz (el análisis sigue en el servicio)
+STREAM_WAIT_S = 60
+def start_stream_analysis(session_id, frames_dir):
+    job = {'result': None, 'error': None}
+    def run():
+        try: job['result'] = emotion_service.analyze_via_service(frames_dir, mode='stream')
+        except OSError as e: job['error'] = e
+    job['thread'] = threading.Thread(target=run, daemon=True); job['thread'].start()
+    stream_jobs[session_id] = job
 def start_capture_and_recording(session_id):
     if not session_id: return "❌ ERROR: No hay una sesión activa.", gr.Button(interactive=True)
     try:
-        publish.single(MQTT_CONTROL_TOPIC, payload=json.dumps({"command": "start", "session_id": session_id}), hostname=MQTT_BROKER)
-        log_message = f"✅ Comando START enviado a ESP32 para '{session_id}'.\n"
+        result = get_control().send("start", session_id)
+        if not control_client.confirmed(result): return f"❌ El receptor no confirmó el START de '{session_id}'.\n{control_client.format_result(result)}", gr.Button(interactive=True)
+        log_message = f"✅ Grabación de biomedidas confirmada para '{session_id}'.\n⏱️ {control_client.format_result(result)}\n"
     except Exception as e: return f"❌ ERROR MQTT: {e}", gr.Button(interactive=True)
-    audio_filename_in_windows = os.path.basename(next((f for f in os.listdir(DEST_DIR_WSL) if session_id in f), f"{session_id}.wav"))
+    # Audio de la sesión: el registrado en el catálogo al crearla (coincidencia exacta, sin recorrer la carpeta)
+    audio_filename_in_windows = os.path.basename(session_catalog.find_audio(session_id, DEST_DIR_WSL) or f"{session_id}.wav")
     output_frames_win = os.path.join("C:\\Users\\alvar\\Desktop\\DOCTORADO\\PROGRAMAS\\frames", session_id)
-    audio_path_win = os.path.join(MUSIC_GENERADA_WIN, audio_filename_in_windows); command_win = [POWERSHELL_PATH, "-Command", f"python '{CAPTURE_SCRIPT_WIN}' --output '{output_frames_win}' --audio '{audio_path_win}' --session_id '{session_id}'"]; subprocess.Popen(command_win)
+    if emotion_service.is_available():
+        start_stream_analysis(session_id, os.path.join(FRAMES_DIR_WSL, session_id)); log_message += "📡 Análisis emocional en streaming iniciado (se analiza mientras se captura).\n"
+    audio_path_win = os.path.join(MUSIC_GENERADA_WIN, audio_filename_in_windows); command_win = [POWERSHELL_PATH, "-Command", f"python '{CAPTURE_SCRIPT_WIN}' --output '{output_frames_win}' --audio '{audio_path_win}' --session_id '{session_id}'"]
+    with tracing.span(session_id, 'lanzamiento_powershell'): subprocess.Popen(command_win)
     log_message += "✅ Script de captura lanzado en Windows.\n➡️ Cuando termine, pulsa el Paso 3 para analizar."
     return log_message, gr.Button(interactive=True)
 def stop_and_analyze(session_id):
     if not session_id: return "❌ ERROR: No hay una sesión activa."
     try:
-        publish.single(MQTT_CONTROL_TOPIC, payload=json.dumps({"command": "stop"}), hostname=MQTT_BROKER)
-        log_message = f"✅ Comando STOP enviado a ESP32 para '{session_id}'.\n"
+        result = get_control().send("stop", session_id)
+        log_message = f"{'✅' if control_client.confirmed(result) else '⚠️'} Comando STOP enviado para '{session_id}'.\n⏱️ {control_client.format_result(result)}\n"
     except Exception as e: return f"❌ ERROR MQTT: {e}"
     frames_to_analyze_wsl = os.path.join(FRAMES_DIR_WSL, session_id)
+    job = stream_jobs.pop(session_id, None)
+    if job is not None:
+        log_message += f"📡 Esperando al análisis en streaming (termina en cuanto acaba la captura)...\n"
+        with tracing.span(session_id, 'espera_analisis', mode='streaming'): job['thread'].join(STREAM_WAIT_S)
+        if job['thread'].is_alive():
+            # El servicio sigue escribiendo el CSV de esta carpeta: un segundo análisis competiría con él
+            stream_jobs[session_id] = job
+            return log_message + f"⏳ El análisis en streaming sigue en marcha tras {STREAM_WAIT_S} s. Pulsa de nuevo el Paso 3 para recoger el resultado."
+        result = job['result']
+        if result is not None and result.get('ok'):
+            log_message += f"--- SALIDA DEL ANÁLISIS ---\n{result.get('log', '')}\n"
+            return log_message + "🎉 ¡Flujo de trabajo completado!"
+        log_message += f"⚠️ El análisis en streaming no terminó bien ({job['error'] or (result or {}).get('error', 'sin resultados')}). Se analiza la sesión completa...\n"
+    # Primero se usa el servicio residente (modelos ya cargados); si no está en marcha, un subproceso como antes
+    try:
+        log_message += f"📊 Ejecutando análisis emocional en el servicio residente...\n"
+        with tracing.span(session_id, 'espera_analisis', mode='servicio'): result = emotion_service.analyze_via_service(frames_to_analyze_wsl)
+        log_message += f"--- SALIDA DEL ANÁLISIS ---\n{result.get('log', result.get('error', ''))}\n"
+        log_message += f"⏱️ Análisis en {result.get('run_s')} s con el modelo en caliente (en frío ~{result.get('cold_equivalent_s')} s).\n"
+        return log_message + ("🎉 ¡Flujo de trabajo completado!" if result.get('ok') else "❌ ERROR al analizar.")
+    except OSError as e: log_message += f"⚠️ Servicio de análisis no disponible ({e}). Lanzando subproceso...\n"
     try:
         log_message += f"📊 Ejecutando análisis emocional...\n"
-        proc = subprocess.run(["python3", ANALYZER_SCRIPT_WSL, "--input", frames_to_analyze_wsl], capture_output=True, text=True, check=True)
-        log_message += f"--- SALIDA DEL ANÁLISIS ---\n{proc.stdout}\n{proc.stderr}\n🎉 ¡Flujo de trabajo completado!"
+        t0 = time.monotonic()
+        with tracing.span(session_id, 'espera_analisis', mode='subproceso'): proc = subprocess.run(["python3", ANALYZER_SCRIPT_WSL, "--input", frames_to_analyze_wsl], capture_output=True, text=True, check=True)
+        log_message += f"--- SALIDA DEL ANÁLISIS ---\n{proc.stdout}\n{proc.stderr}\n⏱️ Análisis en {time.monotonic() - t0:.2f} s (en frío).\n🎉 ¡Flujo de trabajo completado!"
     except (subprocess.CalledProcessError, FileNotFoundError) as e: log_message += f"❌ ERROR al analizar: {e}\nSalida: {e.stderr if hasattr(e, 'stderr') else 'N/A'}"
     return log_message
 def start_esp32_mqtt():
     try:
         session_id = f"manual_session_{datetime.now().strftime('%H%M%S')}"
-        publish.single(MQTT_CONTROL_TOPIC, payload=json.dumps({"command": "start", "session_id": session_id}), hostname=MQTT_BROKER)
-        return f"✅ Comando START manual enviado (sesión: {session_id})."
+        result = get_control().send("start", session_id)
+        return f"✅ Comando START manual enviado (sesión: {session_id}).\n{control_client.format_result(result)}"
     except Exception as e: return f"❌ Error: {e}"
 def stop_esp32_mqtt():
     try:
-        publish.single(MQTT_CONTROL_TOPIC, payload=json.dumps({"command": "stop"}), hostname=MQTT_BROKER)
-        return "✅ Comando STOP manual enviado."
+        result = get_control().send("stop")
+        return f"✅ Comando STOP manual enviado.\n{control_client.format_result(result)}"
     except Exception as e: return f"❌ Error: {e}"
-def get_latest_biomedidas(session_id):
-    if not session_id: return None, "Introduce un ID de sesión.", pd.DataFrame(), ""
+# Caché de biomedidas: solo se parsean las filas añadidas desde la última consulta y la figura se reutiliza si no cambian los datos ni la vista
+biomedidas_cache = BiomedidasCache()
+biomedidas_figures = {}
+BIOMEDIDAS_SIGNALS = ['hr', 'temp', 'gsr', 'spo2']; TABLE_PAGE_SIZE = 100
+def build_biomedidas_figure(df, session_id, width, method):
+    # Cada señal se diezma al ancho del gráfico (decimation.py): el navegador recibe ~width puntos por señal, no la sesión entera
+    import plotly.graph_objects as go
+    series = decimation.decimate_frame(df, BIOMEDIDAS_SIGNALS, int(width), method)
+    fig = go.Figure([go.Scattergl(x=x, y=y, mode='lines', name=name) for name, (x, y) in series.items()])
+    fig.update_layout(title=f"Bioseñales: {session_id}", xaxis_title="timestamp", legend_title="variable")
+    return fig, sum(len(x) for x, _ in series.values())
+def biomedidas_table_page(df, page):
+    # La tabla muestra una página de TABLE_PAGE_SIZE filas; página vacía o fuera de rango = la última (datos más recientes)
+    pages = max(1, -(-len(df) // TABLE_PAGE_SIZE))
+    page = pages if not page or page > pages else max(1, int(page))
+    return df.iloc[(page - 1) * TABLE_PAGE_SIZE:page * TABLE_PAGE_SIZE], page, f"Página {page} de {pages} ({len(df)} filas)"
+# Al arrancar se indexan en el catálogo las sesiones que ya hay en disco (biomedidas, frames, audio y análisis emocionales),
+# también las archivadas o copiadas a mano que ningún productor registró; las listas esperan a que termine
+catalog_indexed = threading.Event()
+CATALOG_INDEX_WAIT_S = 10
+def index_existing_sessions():
+    try:
+        t0 = time.perf_counter(); total = session_catalog.get_catalog().rebuild(BIOMEDIDAS_CSV_DIR, FRAMES_DIR_WSL, DEST_DIR_WSL)
+        print(f"🗂️ Catálogo de sesiones indexado: {total} sesiones ({time.perf_counter() - t0:.2f} s).")
+    except Exception as e: print(f"⚠️ No se pudo indexar el catálogo de sesiones: {e}")
+    finally: catalog_indexed.set()
+def list_biomedidas_sessions():
+    # Las sesiones salen del catálogo (session_catalog.py), indexado al arrancar
+    try:
+        catalog_indexed.wait(CATALOG_INDEX_WAIT_S)
+        return session_catalog.get_catalog().list_sessions('biomedidas')
+    except Exception as e:
+        print(f"⚠️ Catálogo de sesiones no disponible ({e}); se recorre la carpeta de biomedidas.")
+        return sorted(os.listdir(BIOMEDIDAS_CSV_DIR)) if os.path.exists(BIOMEDIDAS_CSV_DIR) else []
+def get_latest_biomedidas(session_id, start_s=0, end_s=0, width=decimation.DEFAULT_PLOT_WIDTH, method=decimation.DEFAULT_METHOD, page=None):
+    import pandas as pd
+    empty = (None, "", pd.DataFrame(), "", None, "")
+    if not session_id: return (None, "Introduce un ID de sesión.") + empty[2:]
     biomedidas_path = os.path.join(BIOMEDIDAS_CSV_DIR, session_id, 'biomedidas.csv')
-    if not os.path.exists(biomedidas_path): return None, f"❌ No existe archivo para '{session_id}'.", pd.DataFrame(), ""
+    if not os.path.exists(biomedidas_path): return (None, f"❌ No existe archivo para '{session_id}'.") + empty[2:]
     try:
-        df = pd.read_csv(biomedidas_path, sep=';'); df['timestamp'] = pd.to_datetime(df['timestamp'], unit='s')
-        fig = px.line(df, x='timestamp', y=['hr', 'temp', 'gsr', 'spo2'], title=f"Bioseñales: {session_id}")
+        t0 = time.perf_counter(); df = biomedidas_cache.load(biomedidas_path)
+        if df.empty: return (None, f"⚠️ La sesión '{session_id}' aún no tiene datos.") + empty[2:]
+        view = (len(df), start_s or 0, end_s or 0, int(width), method)
+        cached = biomedidas_figures.get(biomedidas_path)
+        if cached is None or cached[0] != view:
+            window = decimation.time_window(df, start_s, end_s)
+            if window.empty: return (None, f"⚠️ No hay datos entre {start_s} s y {end_s} s.") + empty[2:]
+            cached = biomedidas_figures[biomedidas_path] = (view, *build_biomedidas_figure(window, session_id, width, method), len(window))
+        _, fig, points, window_rows = cached
+        table, page, page_info = biomedidas_table_page(df, page)
         last_row = df.iloc[-1]
         latest_data = (f"Últimos datos ({last_row['timestamp'].strftime('%H:%M:%S')}):\n - HR: {last_row['hr']} bpm\n - GSR: {last_row['gsr']}")
-        return fig, f"✅ Datos de '{session_id}' cargados.", df, latest_data
-    except Exception as e: return None, f"❌ Error: {e}", pd.DataFrame(), ""
+        status = (f"✅ Datos de '{session_id}' cargados ({len(df)} filas, {biomedidas_cache.last_new_rows(biomedidas_path)} nuevas; "
+                  f"{points} puntos dibujados de {window_rows * len(BIOMEDIDAS_SIGNALS)}; {1000 * (time.perf_counter() - t0):.0f} ms).")
+        return fig, status, table, latest_data, page, page_info
+    except Exception as e: return (None, f"❌ Error: {e}") + empty[2:]
+def load_biomedidas_session(session_id, width, method):
+    # Al cambiar de sesión se vuelve a la vista completa y a la última página
+    return (*get_latest_biomedidas(session_id, 0, 0, width, method), 0, 0)
+def show_biomedidas_page(session_id, page):
+    # Solo cambia la página de la tabla: los datos salen de la caché sin releer el CSV
+    import pandas as pd
+    biomedidas_path = os.path.join(BIOMEDIDAS_CSV_DIR, session_id or '', 'biomedidas.csv')
+    if not session_id or not os.path.exists(biomedidas_path): return pd.DataFrame(), None, ""
+    return biomedidas_table_page(biomedidas_cache.load(biomedidas_path), max(1, int(page or 1)))
+def list_fusion_sessions():
+    catalog_indexed.wait(CATALOG_INDEX_WAIT_S)
+    try: return session_catalog.get_catalog().list_sessions('emotions')
+    except Exception as e: print(f"⚠️ Catálogo de sesiones no disponible: {e}"); return []
+def show_fusion(session_id):
+    # Tabla fusionada de la sesión (de la caché en disco si sus archivos no han cambiado): emociones arriba, bioseñales abajo
+    if not session_id: return None, "Selecciona una sesión con análisis emocional."
+    import fusion, pandas as pd, plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+    try:
+        t0 = time.perf_counter(); fused, cached = fusion.fuse_session(session_id)
+    except Exception as e: return None, f"❌ No se pudo fusionar la sesión '{session_id}': {e}"
+    x = pd.to_datetime(fused['timestamp'], unit='s')
+    fig = make_subplots(rows=2, cols=1, shared_xaxes=True, vertical_spacing=0.08, subplot_titles=("Emoción facial (media por segundo)", "Bioseñales"))
+    for c in fusion.EMOTION_COLUMNS:
+        if c in fused.columns: fig.add_trace(go.Scattergl(x=x, y=fused[c], mode='lines', name=c), row=1, col=1)
+    for c in fusion.BIOSIGNAL_COLUMNS:
+        if c in fused.columns and fused[c].notna().any(): fig.add_trace(go.Scattergl(x=x, y=fused[c], mode='lines', name=c), row=2, col=1)
+    fig.update_layout(title=f"Fusión: {session_id}", height=700)
+    origin = "caché" if cached else "calculada"
+    return fig, f"{fusion.summarize(fused)}\n({origin} en {1000 * (time.perf_counter() - t0):.0f} ms)"
+# Tiempos por etapa: trazas de todos los procesos (tracing.py) como histogramas, resumen y cronología de una sesión
+def show_timings(session_id):
+    import pandas as pd, plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+    records = tracing.load_all()
+    durations = {}
+    for r in records:
+        if r['d'] > 0: durations.setdefault(r['e'], []).append(r['d'])
+    stages = sorted(durations); cols = 3; rows = max(1, -(-len(stages) // cols))
+    hist = make_subplots(rows=rows, cols=cols, subplot_titles=stages or ["Sin trazas"])
+    for i, stage in enumerate(stages): hist.add_trace(go.Histogram(x=durations[stage], name=stage, showlegend=False), row=i // cols + 1, col=i % cols + 1)
+    hist.update_layout(title="Distribución de latencias por etapa (s)", height=250 * rows)
+    summary = pd.DataFrame([{'etapa': k, **v} for k, v in tracing.stage_summary(records).items()])
+    sessions = sorted({r['s'] for r in records if r.get('s')})
+    session_records = sorted((r for r in records if r.get('s') == session_id), key=lambda r: r['w'])
+    timeline = go.Figure()
+    if session_records:
+        t0 = session_records[0]['w']
+        timeline.add_trace(go.Bar(y=[f"{r['e']} ({r['p']})" for r in session_records], x=[max(r['d'], 0.01) for r in session_records], base=[r['w'] - t0 for r in session_records], orientation='h'))
+        timeline.update_layout(title=f"Cronología: {session_id}", xaxis_title="s desde el primer registro", yaxis=dict(autorange='reversed'), height=max(300, 30 * len(session_records)))
+    return hist, summary, timeline, gr.Dropdown(choices=sessions, value=session_id)
 def run_ace_step():
     wsl_exe_path = "/mnt/c/Windows/System32/wsl.exe"
     command_in_new_terminal = f"{ACESTEP_RUN_SCRIPT}; exec bash"
@@ -238,9 +410,9 @@ with gr.Blocks(title="Interfaz de Tesis", theme=custom_theme) as demo:
                     gr.Markdown("## Control de Cámara y Grabación Sincronizada Manual")
                     with gr.Row():
                         with gr.Column(scale=2):
-                            camera_output = gr.Image(label="Visor de Cámara", type="pil")
+                            gr.Markdown("#### Visor de Cámara"); camera_output = gr.HTML(CAMERA_VIEWER_OFF)
                         with gr.Column(scale=1):
-                            facial_status = gr.Textbox(label="Estado", interactive=False); btn_start_cam = gr.Button("▶️ Iniciar Cámara"); btn_refresh_cam = gr.Button("🔄 Actualizar Foto"); btn_stop_cam = gr.Button("⏹️ Parar Cámara"); gr.Markdown("---"); facial_session_id = gr.Textbox(label="ID de Sesión para Grabación", placeholder="Ej: prueba_sonrisa_01"); facial_audio_input = gr.File(label="Sube Audio (WAV) (Opcional)", file_types=[".wav"]); btn_record_cam = gr.Button("🔴 Grabar")
+                            facial_status = gr.Textbox(label="Estado", interactive=False); btn_start_cam = gr.Button("▶️ Iniciar Cámara"); btn_refresh_cam = gr.Button("🔄 Reconectar Vídeo"); btn_stop_cam = gr.Button("⏹️ Parar Cámara"); gr.Markdown("---"); facial_session_id = gr.Textbox(label="ID de Sesión para Grabación", placeholder="Ej: prueba_sonrisa_01"); facial_audio_input = gr.File(label="Sube Audio (WAV) (Opcional)", file_types=[".wav"]); btn_record_cam = gr.Button("🔴 Grabar")
         with gr.Tab("❤️ Control y Biomedidas (ESP32)"):
             with gr.Row():
                 with gr.Column(scale=1):
@@ -249,14 +421,32 @@ with gr.Blocks(title="Interfaz de Tesis", theme=custom_theme) as demo:
                         manual_start_btn = gr.Button("▶️ Arrancar Programa"); manual_stop_btn = gr.Button("⏹️ Parar Programa")
                     gr.Markdown("### Log de Trama MQTT en Tiempo Real"); mqtt_log_box = gr.Textbox(label="Trama MQTT", interactive=False, lines=15, autoscroll=True); refresh_log_btn = gr.Button("🔄 Refrescar Log MQTT")
                 with gr.Column(scale=2):
+                    gr.Markdown("### Bioseñales en Directo")
+                    with gr.Row():
+                        live_toggle = gr.Checkbox(label="Actualizar en directo", value=False); live_window = gr.Slider(label="Ventana (s)", minimum=10, maximum=600, step=10, value=LIVE_WINDOW_S)
+                    live_status = gr.Textbox(label="Estado del directo", interactive=False); live_plot = gr.Plot(label="Bioseñales en Directo"); live_timer = gr.Timer(LIVE_REFRESH_S, active=False)
                     gr.Markdown("### Visualización de Datos de Sesiones")
                     with gr.Row():
-                        session_dropdown = gr.Dropdown(label="Selecciona una Sesión", choices=sorted(os.listdir(BIOMEDIDAS_CSV_DIR)) if os.path.exists(BIOMEDIDAS_CSV_DIR) else []); refresh_btn = gr.Button("🔄 Refrescar Lista")
-                    biomedidas_status = gr.Textbox(label="Estado de la Carga", interactive=False); latest_biomedidas_data = gr.Textbox(label="Últimos Datos Registrados", interactive=False, lines=3); biomedidas_plot = gr.Plot(label="Gráfico de Bioseñales"); biomedidas_table = gr.Dataframe(label="Datos en Tabla", interactive=False)
+                        session_dropdown = gr.Dropdown(label="Selecciona una Sesión", choices=[]); refresh_btn = gr.Button("🔄 Refrescar Lista")
+                    biomedidas_status = gr.Textbox(label="Estado de la Carga", interactive=False); latest_biomedidas_data = gr.Textbox(label="Últimos Datos Registrados", interactive=False, lines=3); biomedidas_plot = gr.Plot(label="Gráfico de Bioseñales")
+                    with gr.Row():
+                        zoom_start = gr.Number(label="Desde (s)", value=0, precision=1); zoom_end = gr.Number(label="Hasta (s, 0 = final)", value=0, precision=1); plot_width = gr.Slider(label="Ancho del gráfico (puntos por señal)", minimum=200, maximum=4000, step=100, value=decimation.DEFAULT_PLOT_WIDTH); plot_method = gr.Radio(label="Diezmado", choices=list(decimation.DECIMATION_METHODS), value=decimation.DEFAULT_METHOD)
+                    with gr.Row():
+                        zoom_btn = gr.Button("🔍 Ampliar Ventana"); zoom_reset_btn = gr.Button("↩️ Ver Sesión Completa")
+                    biomedidas_table = gr.Dataframe(label="Datos en Tabla", interactive=False)
+                    with gr.Row():
+                        table_prev_btn = gr.Button("◀️ Anterior"); table_page = gr.Number(label="Página", value=None, precision=0); table_next_btn = gr.Button("Siguiente ▶️"); table_page_info = gr.Textbox(label="Tabla", interactive=False)
         with gr.Tab("🧠 Análisis Emocional"):
-            gr.Markdown("## Modelo Unificado de Emoción (Imagen + Biomedidas)"); gr.Markdown("Este espacio está reservado para mostrar la salida del modelo unificado que combinará el análisis de imágenes con las bioseñales para una detección de emociones más precisa.")
+            gr.Markdown("## Modelo Unificado de Emoción (Imagen + Biomedidas)"); gr.Markdown("Emoción facial y bioseñales de la sesión alineadas en el tiempo (fusion.py): puntuaciones medias por segundo junto a HR, GSR, temperatura y SpO2.")
+            with gr.Row():
+                fusion_dropdown = gr.Dropdown(label="Sesión analizada", choices=[]); fusion_refresh_btn = gr.Button("🔄 Refrescar Lista")
+            with gr.Row():
+                placeholder_plot = gr.Plot(label="Resultado Emocional Combinado"); placeholder_text = gr.Textbox(label="Diagnóstico del Modelo", interactive=False, lines=10)
+        with gr.Tab("⏱️ Tiempos"):
+            gr.Markdown("## Tiempos por Etapa"); gr.Markdown(f"Trazas de copia, lanzamiento de la captura, pre-captura, desfase START → primer frame y análisis. Endpoint JSON: `http://{tracing.METRICS_HOST}:{tracing.METRICS_PORT}/metrics`.")
             with gr.Row():
-                placeholder_plot = gr.Plot(label="Resultado Emocional Combinado"); placeholder_text = gr.Textbox(label="Diagnóstico del Modelo", interactive=False)
+                timings_session = gr.Dropdown(label="Sesión (cronología)", choices=[]); timings_refresh_btn = gr.Button("🔄 Refrescar Tiempos")
+            timings_hist = gr.Plot(label="Histogramas de latencia"); timings_table = gr.Dataframe(label="Resumen por etapa (s)", interactive=False); timings_timeline = gr.Plot(label="Cronología de la sesión")
         with gr.Tab("⚙️ Lanzar Módulos"):
             gr.Markdown("### Ejecución de Módulos Externos")
             with gr.Row():
@@ -271,12 +461,26 @@ with gr.Blocks(title="Interfaz de Tesis", theme=custom_theme) as demo:
     btn_start_monitoring.click(fn=start_monitoring, outputs=monitoring_log_output)
     btn_stop_monitoring.click(fn=stop_monitoring, outputs=monitoring_log_output)
     monitoring_refresh_btn.click(fn=get_monitoring_logs, inputs=None, outputs=monitoring_log_output)
-    btn_start_cam.click(fn=start_camera_remote, inputs=None, outputs=[facial_status]); btn_stop_cam.click(fn=stop_camera_remote, inputs=None, outputs=[facial_status, camera_output]); btn_refresh_cam.click(fn=update_snapshot, inputs=None, outputs=[camera_output]); btn_record_cam.click(fn=record_remote, inputs=[facial_session_id, facial_audio_input], outputs=[facial_status])
+    btn_start_cam.click(fn=start_camera_remote, inputs=None, outputs=[facial_status, camera_output]); btn_stop_cam.click(fn=stop_camera_remote, inputs=None, outputs=[facial_status, camera_output]); btn_refresh_cam.click(fn=update_snapshot, inputs=None, outputs=[camera_output]); btn_record_cam.click(fn=record_remote, inputs=[facial_session_id, facial_audio_input], outputs=[facial_status])
     manual_start_btn.click(fn=start_esp32_mqtt, inputs=None, outputs=manual_status); manual_stop_btn.click(fn=stop_esp32_mqtt, inputs=None, outputs=manual_status)
-    def update_dropdown(): return gr.Dropdown(choices=sorted(os.listdir(BIOMEDIDAS_CSV_DIR)) if os.path.exists(BIOMEDIDAS_CSV_DIR) else [])
+    def update_dropdown(): return gr.Dropdown(choices=list_biomedidas_sessions())
     refresh_btn.click(fn=update_dropdown, outputs=session_dropdown)
-    session_dropdown.change(fn=get_latest_biomedidas, inputs=session_dropdown, outputs=[biomedidas_plot, biomedidas_status, biomedidas_table, latest_biomedidas_data])
+    # Las listas de sesiones se rellenan al abrir la página, no al construir la interfaz
+    demo.load(fn=update_dropdown, outputs=session_dropdown); demo.load(fn=lambda: gr.Dropdown(choices=list_fusion_sessions()), outputs=fusion_dropdown)
+    live_toggle.change(fn=toggle_live_view, inputs=live_toggle, outputs=live_timer); live_timer.tick(fn=live_biomedidas_update, inputs=live_window, outputs=[live_plot, live_status, mqtt_log_box])
+    biomedidas_outputs = [biomedidas_plot, biomedidas_status, biomedidas_table, latest_biomedidas_data, table_page, table_page_info]
+    session_dropdown.change(fn=load_biomedidas_session, inputs=[session_dropdown, plot_width, plot_method], outputs=biomedidas_outputs + [zoom_start, zoom_end])
+    zoom_btn.click(fn=get_latest_biomedidas, inputs=[session_dropdown, zoom_start, zoom_end, plot_width, plot_method, table_page], outputs=biomedidas_outputs)
+    zoom_reset_btn.click(fn=load_biomedidas_session, inputs=[session_dropdown, plot_width, plot_method], outputs=biomedidas_outputs + [zoom_start, zoom_end])
+    plot_width.release(fn=get_latest_biomedidas, inputs=[session_dropdown, zoom_start, zoom_end, plot_width, plot_method, table_page], outputs=biomedidas_outputs); plot_method.change(fn=get_latest_biomedidas, inputs=[session_dropdown, zoom_start, zoom_end, plot_width, plot_method, table_page], outputs=biomedidas_outputs)
+    table_prev_btn.click(fn=lambda s, p: show_biomedidas_page(s, (p or 2) - 1), inputs=[session_dropdown, table_page], outputs=[biomedidas_table, table_page, table_page_info]); table_next_btn.click(fn=lambda s, p: show_biomedidas_page(s, (p or 0) + 1), inputs=[session_dropdown, table_page], outputs=[biomedidas_table, table_page, table_page_info]); table_page.submit(fn=show_biomedidas_page, inputs=[session_dropdown, table_page], outputs=[biomedidas_table, table_page, table_page_info])
+    fusion_refresh_btn.click(fn=lambda: gr.Dropdown(choices=list_fusion_sessions()), outputs=fusion_dropdown); fusion_dropdown.change(fn=show_fusion, inputs=fusion_dropdown, outputs=[placeholder_plot, placeholder_text])
+    timings_outputs = [timings_hist, timings_table, timings_timeline, timings_session]
+    timings_refresh_btn.click(fn=show_timings, inputs=timings_session, outputs=timings_outputs); timings_session.input(fn=show_timings, inputs=timings_session, outputs=timings_outputs)
     btn_ace.click(fn=run_ace_step, inputs=None, outputs=module_status); btn_musicgen.click(fn=run_musicgen_placeholder, inputs=None, outputs=module_status); refresh_log_btn.click(fn=get_mqtt_log, inputs=None, outputs=mqtt_log_box)
 
 if __name__ == "__main__":
-    demo.launch(share=False)
+    demo.launch(share=False, prevent_thread_lock=True)
+    start_background_services()
+    print(f"🚀 Interfaz lista en {time.perf_counter() - _import_started:.1f} s.")
+    demo.block_thread()
@@ -0,0 +1,247 @@
+import os
+import sys
+import json
+import time
+import queue
+import random
+import shutil
+import argparse
+import tempfile
+import threading
+from collections import namedtuple
+
+# El receptor registra sesiones en el catálogo y escribe trazas: el benchmark los redirige a una carpeta
+# temporal propia (antes de importarlo, porque leen la ruta al importarse) para no tocar el estado real.
+BENCH_STATE_DIR = tempfile.mkdtemp(prefix="bench_ingesta_")
+os.environ['TESIS_CATALOG'] = os.path.join(BENCH_STATE_DIR, 'sesiones.db')
+os.environ['TESIS_TRACES'] = os.path.join(BENCH_STATE_DIR, 'trazas.jsonl')
+
+import receptor_controlado as receptor
+
+# ===============================================================
+# --- BENCHMARK DE INGESTA DE BIOSEÑALES ---
+# ===============================================================
+# Reproduce tramas sintéticas con la misma forma que `processAndPublishData` en
+# final_ESP32.ino (incluidos los valores "ND") directamente sobre el callback
+# `on_message` del receptor, sin bróker ni red: se puede ejecutar offline en CI.
+#
+#   python3 bench_ingesta.py                       (4 dispositivos a 2000 muestras/s durante 5 s, sin pérdidas)
+#   python3 bench_ingesta.py --devices 8 --rate 0 --samples 50000 --queue-size 100000 --min-throughput 20000
+#
+# Por defecto la carga es sostenible y se exige pérdida 0: el código de salida es 1 si no se cumplen los
+# umbrales (--max-loss -1 lo desactiva, p. ej. para medir la saturación con --rate 0).
+
+FakeMessage = namedtuple('FakeMessage', ['topic', 'payload'])
+
+class FakeClient:
+    """Sustituto mínimo del cliente paho: guarda lo que el receptor publica (métricas)."""
+
+    def __init__(self):
+        self.published = []
+
+    def publish(self, topic, payload=None, *args, **kwargs):
+        self.published.append((topic, payload))
+
+# ===============================================================
+# --- GENERACIÓN DE TRAMAS ---
+# ===============================================================
+def make_payload(epoch, rng, nd_probability=0.15):
+    """Trama JSON como la del ESP32: números de temp/hr como texto y "ND" cuando falta la lectura."""
+    doc = {'timestamp': epoch, 'gsr': rng.randint(0, 4095)}
+    doc['temp'] = "ND" if rng.random() < nd_probability else f"{rng.uniform(33.0, 37.5):.2f}"
+    doc['hr'] = "ND" if rng.random() < nd_probability else f"{rng.uniform(55, 110):.1f}"
+    doc['spo2'] = "ND" if rng.random() < nd_probability else rng.randint(90, 100)
+    return json.dumps(doc, separators=(',', ':')).encode()
+
+def make_binary_payload(epoch, count, rng, nd_probability=0.15):
+    """Trama binaria (biopayload) con `count` muestras consecutivas y NaN donde el JSON llevaría "ND"."""
+    from biopayload import encode_samples
+    nan = float('nan')
+    rows = [(epoch + k, rng.randint(0, 4095),
+             nan if rng.random() < nd_probability else rng.uniform(33.0, 37.5),
+             nan if rng.random() < nd_probability else rng.uniform(55, 110),
+             nan if rng.random() < nd_probability else rng.randint(90, 100)) for k in range(count)]
+    return encode_samples(*zip(*rows))
+
+def make_messages(devices, total, rng, binary_batch=0):
+    """Genera `total` muestras repartidas por igual entre dispositivos, en JSON o en tramas binarias."""
+    epoch0 = int(time.time())
+    if not binary_batch:
+        return [FakeMessage(device_topic(n % devices), make_payload(epoch0 + n // devices, rng)) for n in range(total)]
+    messages = []
+    for n in range(0, total, binary_batch * devices):
+        for d in range(devices):
+            count = min(binary_batch, max(0, (total - n - d * binary_batch)))
+            if count:
+                messages.append(FakeMessage(device_topic(d), make_binary_payload(epoch0 + n // devices, count, rng)))
+    return messages
+
+def device_topic(index):
+    # El dispositivo 0 usa el tópico heredado para cubrir también ese camino
+    return receptor.TOPIC if index == 0 else f"tesis/bench{index:02d}/biomedidas"
+
+def device_id(index):
+    return receptor.DEFAULT_DEVICE_ID if index == 0 else f"bench{index:02d}"
+
+def count_rows(path):
+    if not os.path.exists(path):
+        return 0
+    with open(path, 'rb') as f:
+        return max(0, sum(1 for _ in f) - 1)  # sin la cabecera
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))]
+
+# ===============================================================
+# --- BENCHMARK DEL RECEPTOR ---
+# ===============================================================
+def bench_receptor(devices, rate, duration, samples, queue_size, binary_batch=0, seed=0):
+    """
+    Ejecuta el receptor en proceso con `devices` dispositivos publicando a `rate` muestras/s cada uno
+    (0 = lo más rápido posible). Con `binary_batch` > 0 se envían tramas binarias de ese número de
+    muestras en lugar de JSON. Devuelve un dict con throughput, latencias y pérdidas.
+    """
+    rng = random.Random(seed)
+    data_dir = tempfile.mkdtemp(prefix="bench_biomedidas_", dir=BENCH_STATE_DIR)
+    receptor.DATA_DIR_BASE = data_dir
+    receptor.ingest_queue = queue.Queue(maxsize=queue_size)
+    receptor.INGEST_QUEUE_SIZE = queue_size
+    receptor.control_overflow.clear()
+    receptor.metrics = receptor.IngestMetrics()
+    receptor.metrics.latencies = []  # Se guardan todas las latencias, no solo las más recientes
+    client = FakeClient()
+
+    worker = threading.Thread(target=receptor.ingest_worker, daemon=True)
+    worker.start()
+    session_ids = [f"bench_{i:02d}" for i in range(devices)]
+    for i, sid in enumerate(session_ids):
+        command = {"command": "start", "session_id": sid, "device_id": device_id(i)}
+        receptor.on_message(client, None, FakeMessage(receptor.CONTROL_TOPIC, json.dumps(command).encode()))
+
+    total = samples if samples else int(rate * duration * devices)
+    if total <= 0:
+        raise ValueError("Indica --samples o un --rate y --duration mayores que 0.")
+    # Las tramas se generan antes para no medir el coste del generador
+    messages = make_messages(devices, total, rng, binary_batch)
+
+    total_rate = rate * devices * len(messages) / total
+    start = time.monotonic()
+    for n, msg in enumerate(messages):
+        if total_rate > 0:
+            # Simula el hilo de red de paho entregando tramas al ritmo configurado
+            delay = start + n / total_rate - time.monotonic()
+            if delay > 0.001:
+                time.sleep(delay)
+        receptor.on_message(client, None, msg)
+    publish_time = time.monotonic() - start
+
+    receptor.on_message(client, None, FakeMessage(receptor.CONTROL_TOPIC, json.dumps({"command": "stop"}).encode()))
+    receptor.ingest_queue.put(None)
+    worker.join()
+    receptor.drain_sessions()
+    elapsed = time.monotonic() - start
+
+    persisted = sum(
+        count_rows(os.path.join(data_dir, sid, "biomedidas.csv" if i == 0 else f"biomedidas_{device_id(i)}.csv"))
+        for i, sid in enumerate(session_ids)
+    )
+    latencies = list(receptor.metrics.latencies)
+    shutil.rmtree(data_dir, ignore_errors=True)
+    return {
+        'devices': devices,
+        'rate_per_device': rate,
+        'payload': f"binario x{binary_batch}" if binary_batch else "json",
+        'messages': len(messages),
+        'sent': total,
+        'persisted': persisted,
+        # Tramas descartadas con la cola de ingesta llena + segmentos descartados con la cola de una sesión llena
+        'dropped': receptor.metrics.dropped + receptor.metrics.session_dropped,
+        'dropped_ingest': receptor.metrics.dropped,
+        'dropped_session': receptor.metrics.session_dropped,
+        'loss': round(1 - persisted / total, 6),
+        'publish_rate': round(total / publish_time, 1),
+        'throughput': round(persisted / elapsed, 1),
+        'latency_ms_p50': round(percentile(latencies, 0.50) * 1000, 3) if latencies else None,
+        'latency_ms_p95': round(percentile(latencies, 0.95) * 1000, 3) if latencies else None,
+        'latency_ms_p99': round(percentile(latencies, 0.99) * 1000, 3) if latencies else None,
+        'latency_ms_max': round(max(latencies) * 1000, 3) if latencies else None,
+        'queue_max_depth': receptor.metrics.max_depth,
+    }
+
+# ===============================================================
+# --- BENCHMARK DEL LISTENER DE LA INTERFAZ ---
+# ===============================================================
+def bench_app_listener(devices, samples, seed=0):
+    """Mide el coste del callback `on_message` de app_tesis (log MQTT de la interfaz) bajo carga."""
+    import app_tesis
+    rng = random.Random(seed)
+    messages = make_messages(devices, samples, rng)
+    durations = []
+    start = time.monotonic()
+    for msg in messages:
+        t0 = time.perf_counter()
+        app_tesis.on_message(None, None, msg)
+        durations.append(time.perf_counter() - t0)
+    elapsed = time.monotonic() - start
+    return {
+        'sent': samples,
+        'throughput': round(samples / elapsed, 1),
+        'callback_us_p50': round(percentile(durations, 0.50) * 1e6, 2),
+        'callback_us_p99': round(percentile(durations, 0.99) * 1e6, 2),
+        'callback_us_max': round(max(durations) * 1e6, 2),
+    }
+
+# ===============================================================
+# --- PUNTO DE ENTRADA ---
+# ===============================================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark offline de la ingesta de bioseñales (receptor y listener de la interfaz).")
+    parser.add_argument("--devices", type=int, default=4, help="Número de dispositivos simulados.")
+    parser.add_argument("--rate", type=float, default=2000, help="Muestras/s por dispositivo (0 = lo más rápido posible).")
+    parser.add_argument("--duration", type=float, default=5, help="Duración en segundos cuando se usa --rate.")
+    parser.add_argument("--samples", type=int, default=0, help="Número total de tramas (tiene prioridad sobre --duration).")
+    parser.add_argument("--binary-batch", type=int, default=0, help="Envía tramas binarias con este número de muestras (0 = JSON).")
+    parser.add_argument("--queue-size", type=int, default=receptor.INGEST_QUEUE_SIZE, help="Capacidad de la cola de ingesta.")
+    parser.add_argument("--app", action="store_true", help="Mide también el listener MQTT de app_tesis (importa gradio).")
+    parser.add_argument("--json", action="store_true", help="Imprime el resultado como JSON.")
+    parser.add_argument("--min-throughput", type=float, default=None, help="Falla si el throughput (muestras/s) es menor.")
+    parser.add_argument("--max-loss", type=float, default=0.0, help="Falla si la fracción de muestras perdidas es mayor (negativo = sin umbral).")
+    parser.add_argument("--max-p95-ms", type=float, default=None, help="Falla si la latencia p95 de ingesta es mayor.")
+    args = parser.parse_args()
+
+    if not args.samples and args.rate <= 0:
+        args.samples = 50000
+
+    result = {'receptor': bench_receptor(args.devices, args.rate, args.duration, args.samples, args.queue_size, args.binary_batch)}
+    if args.app:
+        result['app_listener'] = bench_app_listener(args.devices, args.samples or int(args.rate * args.duration * args.devices))
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        r = result['receptor']
+        print("\n--- Resultado del benchmark de ingesta ---")
+        print(f"Formato: {r['payload']} | Mensajes MQTT: {r['messages']}")
+        print(f"Dispositivos: {r['devices']} | Enviadas: {r['sent']} | Guardadas: {r['persisted']} | Descartadas: {r['dropped']} ({r['dropped_ingest']} en la cola de ingesta, {r['dropped_session']} en colas de sesión) | Pérdida: {r['loss']:.2%}")
+        print(f"Ritmo de publicación: {r['publish_rate']:.0f} muestras/s | Throughput de ingesta: {r['throughput']:.0f} muestras/s")
+        print(f"Latencia de ingesta (ms): p50 {r['latency_ms_p50']} | p95 {r['latency_ms_p95']} | p99 {r['latency_ms_p99']} | máx. {r['latency_ms_max']}")
+        print(f"Profundidad máxima de la cola: {r['queue_max_depth']}")
+        if 'app_listener' in result:
+            a = result['app_listener']
+            print(f"Listener de la interfaz: {a['throughput']:.0f} msg/s | callback p50 {a['callback_us_p50']} µs | p99 {a['callback_us_p99']} µs | máx. {a['callback_us_max']} µs")
+
+    shutil.rmtree(BENCH_STATE_DIR, ignore_errors=True)
+    r = result['receptor']
+    failures = []
+    if args.min_throughput is not None and r['throughput'] < args.min_throughput:
+        failures.append(f"throughput {r['throughput']} < {args.min_throughput}")
+    if args.max_loss is not None and args.max_loss >= 0 and r['loss'] > args.max_loss:
+        failures.append(f"pérdida {r['loss']} > {args.max_loss}")
+    if args.max_p95_ms is not None and (r['latency_ms_p95'] or 0) > args.max_p95_ms:
+        failures.append(f"latencia p95 {r['latency_ms_p95']} ms > {args.max_p95_ms} ms")
+    if failures:
+        print("❌ Regresión de ingesta: " + "; ".join(failures))
+        sys.exit(1)
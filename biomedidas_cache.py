@@ -0,0 +1,92 @@
+import io
+import os
+import threading
+from collections import OrderedDict
+import pandas as pd
+
+# ===============================================================
+# --- CACHÉ INCREMENTAL DE biomedidas.csv ---
+# ===============================================================
+# La interfaz vuelve a pedir los datos de una sesión en cada cambio del desplegable y en cada
+# refresco en directo. En lugar de releer y reparsear el CSV entero, se recuerda por archivo el
+# offset hasta el que se ha leído y el DataFrame ya parseado, y solo se parsean las filas nuevas.
+# Si el archivo encoge o se sustituye (otro inodo), se vuelve a leer desde el principio.
+# Una línea final a medio escribir (el receptor escribe por lotes) se deja para la siguiente lectura.
+
+DEFAULT_MAX_SESSIONS = 16   # Sesiones que se mantienen en memoria (se descartan las menos usadas)
+CSV_SEPARATOR = ';'
+NA_VALUES = ['ND']          # Lecturas no disponibles del ESP32
+
+class _Entry:
+    def __init__(self, inode):
+        self.inode = inode
+        self.offset = 0       # Bytes ya consumidos (siempre al final de una línea completa)
+        self.size = None      # Tamaño y mtime de la última lectura, para saber si hay cambios
+        self.mtime_ns = None
+        self.header = None
+        self.df = pd.DataFrame()
+        self.last_new_rows = 0
+
+class BiomedidasCache:
+    """Caché por archivo de los CSV de biomedidas con lectura incremental de las filas añadidas."""
+
+    def __init__(self, max_sessions=DEFAULT_MAX_SESSIONS):
+        self.max_sessions = max_sessions
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.full_loads = 0
+        self.incremental_loads = 0
+
+    def load(self, path):
+        """DataFrame con todas las filas del CSV (timestamp ya convertido a datetime). Lanza OSError si no existe."""
+        st = os.stat(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None or st.st_ino != entry.inode or st.st_size < entry.offset:
+                entry = self._entries[path] = _Entry(st.st_ino)
+                self.full_loads += 1
+            elif (st.st_size, st.st_mtime_ns) != (entry.size, entry.mtime_ns):
+                self.incremental_loads += 1
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.max_sessions:
+                self._entries.popitem(last=False)
+            entry.last_new_rows = 0
+            if (st.st_size, st.st_mtime_ns) != (entry.size, entry.mtime_ns):
+                self._read_new(path, entry, st)
+            return entry.df
+
+    def last_new_rows(self, path):
+        """Filas parseadas en la última llamada a load() de ese archivo (0 si venían de la caché)."""
+        entry = self._entries.get(path)
+        return entry.last_new_rows if entry is not None else 0
+
+    def invalidate(self, path=None):
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(path, None)
+
+    def _read_new(self, path, entry, st):
+        with open(path, 'rb') as f:
+            f.seek(entry.offset)
+            data = f.read(st.st_size - entry.offset)
+        entry.size, entry.mtime_ns = st.st_size, st.st_mtime_ns
+        end = data.rfind(b'\n')
+        if end < 0:
+            entry.size = None  # Solo hay una línea incompleta: se reintenta en la siguiente llamada
+            return
+        chunk = data[:end + 1]
+        entry.offset += end + 1
+        if entry.header is None:
+            header_end = chunk.find(b'\n') + 1
+            entry.header, chunk = chunk[:header_end], chunk[header_end:]
+        if not chunk:
+            if entry.df.empty:
+                entry.df = pd.read_csv(io.BytesIO(entry.header), sep=CSV_SEPARATOR)
+            return
+        new = pd.read_csv(io.BytesIO(entry.header + chunk), sep=CSV_SEPARATOR, na_values=NA_VALUES)
+        if 'timestamp' in new.columns:
+            new['timestamp'] = pd.to_datetime(new['timestamp'], unit='s')
+        entry.df = new if entry.df.empty else pd.concat([entry.df, new], ignore_index=True)
+        entry.last_new_rows = len(new)
@@ -0,0 +1,63 @@
+import struct
+import numpy as np
+
+# ===============================================================
+# --- FORMATO BINARIO DE TRAMAS DE BIOSEÑALES ---
+# ===============================================================
+# Alternativa compacta al JSON de `processAndPublishData` (final_ESP32.ino).
+# Una trama contiene una cabecera y N muestras de ancho fijo, little-endian:
+#
+#   cabecera (6 bytes):  magic 'BP' | versión (uint8) | flags (uint8) | nº de muestras (uint16)
+#   muestra (18 bytes):  timestamp (uint32, epoch) | gsr (uint16) | temp, hr, spo2 (float32)
+#
+# Las lecturas no disponibles ("ND" en el JSON) se envían como NaN.
+# El receptor distingue el formato por el magic, así que JSON y binario conviven.
+
+PAYLOAD_MAGIC = b'BP'
+PAYLOAD_VERSION = 1
+PAYLOAD_HEADER = struct.Struct('<2sBBH')
+PAYLOAD_SAMPLE = struct.Struct('<IHfff')
+SAMPLE_DTYPE = np.dtype([('timestamp', '<u4'), ('gsr', '<u2'), ('temp', '<f4'), ('hr', '<f4'), ('spo2', '<f4')])
+MAX_SAMPLES_PER_PAYLOAD = 0xFFFF
+
+def is_binary_payload(payload):
+    """True si la trama empieza por el magic del formato binario (un JSON siempre empieza por '{')."""
+    return payload[:2] == PAYLOAD_MAGIC
+
+def decode_payload(payload):
+    """
+    Decodifica una trama binaria a un array estructurado de NumPy con campos
+    timestamp, gsr, temp, hr y spo2. Es una vista sobre el buffer: no crea objetos por muestra.
+    """
+    if len(payload) < PAYLOAD_HEADER.size:
+        raise ValueError("Trama binaria demasiado corta.")
+    magic, version, flags, count = PAYLOAD_HEADER.unpack_from(payload)
+    if magic != PAYLOAD_MAGIC:
+        raise ValueError("La trama no es binaria.")
+    if version != PAYLOAD_VERSION:
+        raise ValueError(f"Versión de trama binaria no soportada: {version}")
+    expected = PAYLOAD_HEADER.size + count * SAMPLE_DTYPE.itemsize
+    if len(payload) != expected:
+        raise ValueError(f"Longitud de trama incorrecta: {len(payload)} bytes, se esperaban {expected}.")
+    return np.frombuffer(payload, dtype=SAMPLE_DTYPE, count=count, offset=PAYLOAD_HEADER.size)
+
+def decode_payloads(payloads):
+    """Decodifica varias tramas y concatena sus muestras en un único array."""
+    arrays = [decode_payload(p) for p in payloads]
+    return np.concatenate(arrays) if arrays else np.empty(0, dtype=SAMPLE_DTYPE)
+
+def encode_samples(timestamp, gsr, temp, hr, spo2):
+    """
+    Codifica columnas (arrays o listas de igual longitud) en una trama binaria.
+    Usado por el benchmark y la reproducción de sesiones; el ESP32 lo hace en C.
+    """
+    count = len(timestamp)
+    if count > MAX_SAMPLES_PER_PAYLOAD:
+        raise ValueError(f"Como máximo {MAX_SAMPLES_PER_PAYLOAD} muestras por trama.")
+    samples = np.empty(count, dtype=SAMPLE_DTYPE)
+    samples['timestamp'] = timestamp
+    samples['gsr'] = gsr
+    samples['temp'] = temp
+    samples['hr'] = hr
+    samples['spo2'] = spo2
+    return PAYLOAD_HEADER.pack(PAYLOAD_MAGIC, PAYLOAD_VERSION, 0, count) + samples.tobytes()
@@ -7,24 +7,105 @@ import os
 from datetime import datetime
 from pygame import mixer
 from mutagen.wave import WAVE
+from frame_writer import AsyncFrameWriter, FRAME_FORMATS, DEFAULT_FORMAT, format_stats, mark_capture_done
+from frame_index import FrameIndexWriter
+from tracing import TraceLog, TRACE_FILENAME
 
 # --- Configuración ---
 FRAMES_OUTPUT_DIR = "C:\\Users\\alvar\\Desktop\\DOCTORADO\\PROGRAMAS\\frames"
 MUSIC_INPUT_DIR = "C:\\Users\\alvar\\Desktop\\DOCTORADO\\PROGRAMAS\\musica_generada"
 SHARED_SIGNALS_DIR = "C:\\Users\\alvar\\Desktop\\DOCTORADO\\PROGRAMAS\\shared_data\\signals"
+RECORD_FPS = 20.0  # Ritmo de grabación objetivo (antes lo marcaba un sleep fijo de 0.05 s por frame)
+
+RING_SIZE = 8      # Últimos frames guardados por el hilo de cámara
+STREAM_FPS = 15.0  # Ritmo máximo del stream MJPEG que ve la interfaz
+JPEG_QUALITY = 80  # Calidad de los JPEG de /snapshot y /stream
 
 # --- Variables Globales ---
 app = Flask(__name__)
 CORS(app)
-camera_state = {'capture': None} 
+camera_state = {'capture': None, 'thread': None, 'stop': None, 'ring': None}
+camera_lock = threading.Lock()  # Serializa /start_camera y /stop_camera
 
 # ===============================================================
 # --- FUNCIONES DE LÓGICA ---
 # ===============================================================
 
-def record_frames_thread(session_id, audio_filename=None):
+class FrameRing:
+    """
+    Buffer circular con los últimos frames de la cámara. Un único hilo escribe (el dueño de la
+    cámara) y cualquier número de lectores (snapshot, grabaciones, streams) espera al siguiente frame
+    sin tocar el dispositivo.
+    """
+
+    def __init__(self, size=RING_SIZE):
+        self.size = size
+        self.frames = [None] * size
+        self.seq = 0  # Número del último frame publicado (0 = ninguno)
+        self.closed = False
+        self._cond = threading.Condition()
+        self._jpeg = (0, None)  # JPEG del último frame, compartido por /snapshot y /stream
+
+    def publish(self, frame):
+        with self._cond:
+            self.seq += 1
+            self.frames[self.seq % self.size] = (self.seq, time.monotonic(), frame)
+            self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def latest(self):
+        """(nº de frame, instante monotónico, frame) del último frame, o None si aún no hay ninguno."""
+        with self._cond:
+            return self.frames[self.seq % self.size] if self.seq else None
+
+    def wait_next(self, after_seq, timeout=1.0):
+        """Espera un frame posterior a `after_seq`. Devuelve None si la cámara se para o vence el timeout."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.seq > after_seq or self.closed, timeout) or self.seq <= after_seq:
+                return None
+            return self.frames[self.seq % self.size]
+
+    def latest_jpeg(self):
+        """(nº de frame, JPEG) del último frame; se codifica una sola vez aunque haya varios clientes."""
+        item = self.latest()
+        if item is None:
+            return 0, None
+        seq, _, frame = item
+        cached_seq, cached = self._jpeg
+        if cached_seq != seq:
+            ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+            cached = buffer.tobytes() if ok else None
+            self._jpeg = (seq, cached)
+        return seq, cached
+
+def camera_loop(capture, ring, stop_event):
+    """Único hilo que lee de la cámara: publica cada frame en el buffer circular."""
+    failures = 0
+    while not stop_event.is_set():
+        success, frame = capture.read()
+        if not success:
+            failures += 1
+            if failures >= 50:
+                print("[SERVER] ERROR: La cámara ha dejado de entregar frames.")
+                break
+            time.sleep(0.02)
+            continue
+        failures = 0
+        ring.publish(frame)
+    ring.close()
+    capture.release()
+
+def camera_running():
+    return camera_state['ring'] is not None and not camera_state['ring'].closed
+
+def record_frames_thread(session_id, audio_filename=None, frame_format=DEFAULT_FORMAT, fps=RECORD_FPS):
     """Graba frames sincronizados con un audio, o durante 10s si no hay audio."""
-    if camera_state['capture'] is None or not camera_state['capture'].isOpened():
+    ring = camera_state['ring']
+    if not camera_running():
         print("[SERVER] Error: Intento de grabar con la cámara apagada.")
         return
 
@@ -54,22 +135,50 @@ def record_frames_thread(session_id, audio_filename=None):
     if audio_filename:
         mixer.music.play()
 
+    writer = AsyncFrameWriter(output_dir, fmt=frame_format, fps=fps)
+    frame_index = FrameIndexWriter(output_dir)
+    # Trazas de tiempo de la sesión, junto a sus frames (se leen desde WSL)
+    trace = TraceLog(os.path.join(output_dir, TRACE_FILENAME))
+    # El buffer guarda el instante monotónico de cada frame; la hora de reloj se deriva con este desfase
+    wall_offset = time.time() - time.monotonic()
     start_time = time.time()
+    start_mono = time.monotonic()
     frame_count = 0
+    next_frame_at = time.monotonic()
+    last_seq = ring.seq
     while time.time() - start_time < duration_sec:
-        success, frame = camera_state['capture'].read()
-        if not success: break
-        
-        frame_path = os.path.join(output_dir, f"frame_{frame_count:04d}.png")
-        cv2.imwrite(frame_path, frame)
+        item = ring.wait_next(last_seq)
+        if item is None:
+            if ring.closed: break
+            continue
+        last_seq, grabbed_at, frame = item
+        # Se toman los frames del buffer al ritmo pedido; los intermedios se ignoran
+        if grabbed_at < next_frame_at:
+            continue
+        queued = writer.submit(frame, frame_count)
+        if frame_count == 0:
+            trace.record(session_id, 'primer_frame', max(0.0, grabbed_at - start_mono), start_time, start_mono)
+        audio_pos = float('nan')
+        if audio_filename:
+            audio_ms = mixer.music.get_pos()
+            if audio_ms >= 0:
+                audio_pos = audio_ms / 1000 - (time.monotonic() - grabbed_at)
+        frame_index.append(frame_count, grabbed_at, grabbed_at + wall_offset, audio_pos, dropped=not queued)
         frame_count += 1
-        time.sleep(0.05)
+        next_frame_at += 1.0 / fps
+        if next_frame_at < grabbed_at:
+            next_frame_at = grabbed_at + 1.0 / fps
 
     if audio_filename:
         mixer.music.stop()
         mixer.quit()
 
-    print(f"[SERVER] Grabación finalizada. Se guardaron {frame_count} frames.")
+    stats = writer.close()
+    frame_index.close()
+    mark_capture_done(output_dir, stats)
+    trace.record(session_id, 'grabacion', time.monotonic() - start_mono, start_time, start_mono, frames=frame_count)
+    trace.close()
+    print(f"[SERVER] Grabación finalizada. {format_stats(stats)}")
     
     # Crear un archivo de señal al finalizar
     try:
@@ -91,46 +200,91 @@ def index():
 
 @app.route('/snapshot')
 def snapshot():
-    if camera_state['capture'] is not None and camera_state['capture'].isOpened():
-        success, frame = camera_state['capture'].read()
-        if success:
-            ret, buffer = cv2.imencode('.jpg', frame)
-            return Response(buffer.tobytes(), mimetype='image/jpeg')
+    if camera_running():
+        _, jpeg = camera_state['ring'].latest_jpeg()
+        if jpeg is not None:
+            return Response(jpeg, mimetype='image/jpeg')
     return Response(status=204)
 
+@app.route('/stream')
+def stream():
+    """Vídeo en directo como MJPEG (multipart/x-mixed-replace), válido como src de una etiqueta <img>."""
+    if not camera_running():
+        return Response(status=204)
+    ring = camera_state['ring']
+    max_fps = request.args.get('fps', STREAM_FPS, type=float)
+    if not max_fps > 0:
+        return f"Error: fps debe ser mayor que 0 (recibido {request.args.get('fps')})", 400
+
+    def generate():
+        last_seq = 0
+        next_at = time.monotonic()
+        while True:
+            item = ring.wait_next(last_seq)
+            if item is None:
+                if ring.closed: return
+                continue
+            last_seq = item[0]
+            if item[1] < next_at:
+                continue
+            next_at = item[1] + 1.0 / max_fps
+            _, jpeg = ring.latest_jpeg()
+            if jpeg is None:
+                continue
+            yield (b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: " + str(len(jpeg)).encode() + b"\r\n\r\n" + jpeg + b"\r\n")
+
+    return Response(generate(), mimetype='multipart/x-mixed-replace; boundary=frame')
+
 @app.route('/start_camera')
 def start_camera():
-    if camera_state['capture'] is None:
+    with camera_lock:
+        if camera_running():
+            return "Already started"
         cap = cv2.VideoCapture(1, cv2.CAP_DSHOW)
         if not cap.isOpened():
             cap = cv2.VideoCapture(0, cv2.CAP_DSHOW)
         if cap.isOpened():
             cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
             cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-            camera_state['capture'] = cap
+            ring, stop_event = FrameRing(), threading.Event()
+            thread = threading.Thread(target=camera_loop, args=(cap, ring, stop_event), daemon=True)
+            camera_state.update(capture=cap, ring=ring, stop=stop_event, thread=thread)
+            thread.start()
             print("[SERVER] Cámara iniciada con éxito usando DSHOW.")
             return "OK"
         else:
             print("[SERVER] ERROR: No se pudo abrir ninguna cámara.")
             if cap: cap.release()
             return "Error: Camera not found", 500
-    return "Already started"
 
 @app.route('/stop_camera')
 def stop_camera():
-    if camera_state['capture'] is not None:
-        camera_state['capture'].release()
-        camera_state['capture'] = None
+    with camera_lock:
+        if camera_state['thread'] is None:
+            return "Already stopped"
+        # El hilo de cámara libera el dispositivo al salir
+        camera_state['stop'].set()
+        camera_state['thread'].join(timeout=5)
+        if camera_state['thread'].is_alive():
+            # Se conserva el estado: si se descartara, un nuevo start_camera abriría el dispositivo que el hilo aún tiene
+            print("[SERVER] ERROR: el hilo de cámara no terminó en 5 s; se mantiene el estado.")
+            return "Error: Camera thread still running", 409
+        camera_state.update(capture=None, ring=None, stop=None, thread=None)
         print("[SERVER] Cámara detenida.")
         return "OK"
-    return "Already stopped"
 
 @app.route('/record_start')
 def record_start():
     session_id = request.args.get('session_id', f"rec_{datetime.now().strftime('%H%M%S')}")
     audio_filename = request.args.get('audio_filename', None)
+    frame_format = request.args.get('format', DEFAULT_FORMAT)
+    if frame_format not in FRAME_FORMATS:
+        return f"Error: formato desconocido '{frame_format}'", 400
+    fps = request.args.get('fps', RECORD_FPS, type=float)
+    if not fps > 0:
+        return f"Error: fps debe ser mayor que 0 (recibido {request.args.get('fps')})", 400
     
-    record_thread = threading.Thread(target=record_frames_thread, args=(session_id, audio_filename))
+    record_thread = threading.Thread(target=record_frames_thread, args=(session_id, audio_filename, frame_format, fps))
     record_thread.start()
     return f"OK, iniciando grabación para la sesión {session_id}"
 
@@ -5,15 +5,22 @@ import time
 from pygame import mixer
 from mutagen.wave import WAVE
 import warnings
+from frame_writer import AsyncFrameWriter, FRAME_FORMATS, DEFAULT_FORMAT, DEFAULT_JPEG_QUALITY, DEFAULT_QUEUE_SIZE, DEFAULT_WORKERS, format_stats, mark_capture_done
+from frame_index import FrameIndexWriter, frame_timing_summary, read_frame_index
+from tracing import TraceLog, TRACE_FILENAME
 
 # Ignorar las advertencias de pygame sobre el API obsoleto
 warnings.filterwarnings("ignore", category=UserWarning)
 
-def capture_video_with_audio(output_folder, audio_path, camera_index, delay_s, session_id):
+def capture_video_with_audio(output_folder, audio_path, camera_index, delay_s, session_id, frame_format=DEFAULT_FORMAT,
+                             jpeg_quality=DEFAULT_JPEG_QUALITY, fps=30, writer_queue=DEFAULT_QUEUE_SIZE, writer_threads=DEFAULT_WORKERS):
     # Definir la ruta del archivo de señal en la carpeta compartida de Windows
     shared_data_dir = "C:\\Users\\alvar\\Desktop\\DOCTORADO\\PROGRAMAS\\shared_data"
     signal_dir = os.path.join(shared_data_dir, session_id)
     signal_file = os.path.join(signal_dir, "start_signal.txt")
+    # Trazas de tiempo de la sesión en su carpeta de frames (se leen desde WSL con tracing.py)
+    trace = TraceLog(os.path.join(output_folder, TRACE_FILENAME))
+    script_wall, script_mono = time.time(), time.monotonic()
     
     # Si el índice de la cámara es None, buscar uno automáticamente
     if camera_index is None:
@@ -58,14 +65,17 @@ def capture_video_with_audio(output_folder, audio_path, camera_index, delay_s, s
         return
 
     # --- Configurar la resolución y FPS de la cámara ---
-    # Se establece una resolución de 1280x720 (HD) y se intenta 30 FPS
+    # Se establece una resolución de 1280x720 (HD) y se intentan los FPS pedidos (30 por defecto)
     cap.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
     cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
-    cap.set(cv2.CAP_PROP_FPS, 30)
+    cap.set(cv2.CAP_PROP_FPS, fps)
+
+    trace.record(session_id, 'apertura_camara', time.monotonic() - script_mono, script_wall, script_mono, camera_index=camera_index)
 
     # --- Pre-captura para estabilización ---
     print(f"DEBUG: Pre-captura iniciada para estabilizar la cámara. Esperando {delay_s} segundos...")
     pre_capture_start = time.time()
+    pre_capture_mono = time.monotonic()
     while time.time() - pre_capture_start < delay_s:
         ret, frame = cap.read()
         if not ret:
@@ -76,13 +86,21 @@ def capture_video_with_audio(output_folder, audio_path, camera_index, delay_s, s
             break
     
     cv2.destroyAllWindows()
+    trace.record(session_id, 'pre_captura', time.monotonic() - pre_capture_mono, pre_capture_start, pre_capture_mono, delay_s=delay_s)
     print("DEBUG: Pre-captura finalizada. Cámara estabilizada.")
 
     # --- Creación de carpetas ---
     session_folder_name = time.strftime("%Y-%m-%d_%H-%M-%S")
     session_path = os.path.join(output_folder, session_folder_name)
     os.makedirs(session_path, exist_ok=True)
-    print(f"DEBUG: Guardando frames en: {session_path}")
+    print(f"DEBUG: Guardando frames en: {session_path} (formato {frame_format})")
+    # Líneas de evento para orquestador.py, que lee la salida del proceso en lugar de sondear carpetas
+    print(f"EVENTO frames_dir {session_path}", flush=True)
+    # La codificación y escritura a disco van en hilos aparte para no frenar la captura
+    writer = AsyncFrameWriter(session_path, fmt=frame_format, fps=fps, jpeg_quality=jpeg_quality,
+                              queue_size=writer_queue, workers=writer_threads)
+    # Instante real de cada frame (monotónico, hora de reloj y posición del audio) en frame_index.bin
+    frame_index = FrameIndexWriter(session_path)
 
     # --- Crear el archivo de señal para el script de Bash ---
     print("DEBUG: Enviando señal de inicio a WSL2...")
@@ -90,16 +108,20 @@ def capture_video_with_audio(output_folder, audio_path, camera_index, delay_s, s
     os.makedirs(signal_dir, exist_ok=True)
     with open(signal_file, 'w') as f:
         f.write("start")
+    print("EVENTO captura_iniciada", flush=True)
 
     # --- Captura real ---
     print("DEBUG: Iniciando reproducción y captura...")
     mixer.music.play()
 
     start_time = time.time()
+    start_mono = time.monotonic()
     frame_count = 0
 
     while time.time() - start_time < audio_duration:
         ret, frame = cap.read()
+        grabbed_at, grabbed_wall = time.monotonic(), time.time()
+        audio_ms = mixer.music.get_pos()  # -1 si el audio no se está reproduciendo
 
         if not ret:
             print("ERROR: No se pudo capturar el frame.")
@@ -108,9 +130,11 @@ def capture_video_with_audio(output_folder, audio_path, camera_index, delay_s, s
         cv2.putText(frame, "GRABANDO", (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
         cv2.imshow('Captura en Progreso', frame)
 
-        # Guardamos el frame en formato PNG con alta calidad
-        frame_filename = os.path.join(session_path, f"frame_{frame_count:04d}.png")
-        cv2.imwrite(frame_filename, frame, [cv2.IMWRITE_PNG_COMPRESSION, 0])
+        # Se encola para escribir; si el disco no da abasto el frame se descarta (y se cuenta)
+        queued = writer.submit(frame, frame_count)
+        if frame_count == 0:
+            trace.record(session_id, 'primer_frame', max(0.0, grabbed_at - start_mono), start_time, start_mono)
+        frame_index.append(frame_count, grabbed_at, grabbed_wall, audio_ms / 1000 if audio_ms >= 0 else float('nan'), dropped=not queued)
         frame_count += 1
 
         if cv2.waitKey(1) & 0xFF == ord('q'):
@@ -124,6 +148,19 @@ def capture_video_with_audio(output_folder, audio_path, camera_index, delay_s, s
     # --- Limpieza ---
     cap.release()
     cv2.destroyAllWindows()
+    print("DEBUG: Esperando a que terminen de escribirse los frames...")
+    stats = writer.close()
+    print(f"DEBUG: {format_stats(stats)}")
+    frame_index.close()
+    mark_capture_done(session_path, stats)
+    trace.record(session_id, 'grabacion', time.monotonic() - start_mono, start_time, start_mono, frames=frame_count, dropped=stats['dropped'])
+    trace.close()
+    if frame_index.count:
+        timing = frame_timing_summary(read_frame_index(frame_index.path))
+        print(f"DEBUG: Índice de frames en {frame_index.path}: {timing['fps']} FPS reales, "
+              f"intervalo medio {timing['interval_ms_mean']} ms (máx. {timing['interval_ms_max']} ms)")
+    if stats['dropped']:
+        print(f"ADVERTENCIA: Se descartaron {stats['dropped']} frames porque el disco no daba abasto (prueba --format jpg).")
     # Usamos un timeout para evitar que el script se quede colgado
     timeout_start = time.time()
     while mixer.music.get_busy() and time.time() - timeout_start < 5:
@@ -137,5 +174,11 @@ if __name__ == "__main__":
     parser.add_argument("--camera_index", type=int, default=None, help="Índice de la cámara a usar. Si no se especifica, se buscará automáticamente.")
     parser.add_argument("--delay", type=int, default=3, help="Tiempo de pre-captura en segundos para estabilizar la cámara.")
     parser.add_argument("--session_id", required=True, help="ID de la sesión para el comando MQTT.")
+    parser.add_argument("--format", choices=FRAME_FORMATS, default=DEFAULT_FORMAT, help="Formato de salida: PNG por frame, JPEG por frame, un único vídeo o un frames.store en crudo.")
+    parser.add_argument("--jpeg_quality", type=int, default=DEFAULT_JPEG_QUALITY, help="Calidad JPEG (0-100) con --format jpg.")
+    parser.add_argument("--fps", type=int, default=30, help="FPS pedidos a la cámara.")
+    parser.add_argument("--writer_queue", type=int, default=DEFAULT_QUEUE_SIZE, help="Frames en cola de escritura como máximo.")
+    parser.add_argument("--writer_threads", type=int, default=DEFAULT_WORKERS, help="Hilos de escritura de frames.")
     args = parser.parse_args()
-    capture_video_with_audio(args.output, args.audio, args.camera_index, args.delay, args.session_id)
\ No newline at end of file
+    capture_video_with_audio(args.output, args.audio, args.camera_index, args.delay, args.session_id, args.format,
+                             args.jpeg_quality, args.fps, args.writer_queue, args.writer_threads)
\ No newline at end of file
@@ -0,0 +1,148 @@
+import json
+import time
+import uuid
+import threading
+import paho.mqtt.client as mqtt
+import tracing
+
+# ===============================================================
+# --- CLIENTE DE CONTROL CON ACUSE DE RECIBO ---
+# ===============================================================
+# Los comandos START/STOP se publican en tesis/control con un identificador de correlación ("id")
+# por una conexión MQTT persistente (sin abrir una conexión y un handshake nuevos en cada orden).
+# receptor_controlado.py y el ESP32 (final_ESP32.ino) responden en ACK_TOPIC con el mismo "id":
+#
+#   {"id": ..., "source": "receptor" | <device_id>, "command": "start", "session_id": ..., "ok": true,
+#    "ts": hora del emisor al ejecutar el comando (epoch s), ...}
+#
+# El ida y vuelta (RTT) se mide con el reloj monotónico del que envía; "ts" es informativo (el reloj
+# del ESP32 tiene resolución de 1 s). Los comandos sin "id" (remitentes antiguos) no se confirman.
+
+MQTT_BROKER = "localhost"
+MQTT_PORT = 1883
+CONTROL_TOPIC = "tesis/control"
+ACK_TOPIC = "tesis/control/ack"
+ACK_TIMEOUT_S = 3.0
+CONNECT_TIMEOUT_S = 5.0
+# Quién debe confirmar por defecto: el receptor (grabación en disco). El acuse del ESP32 por defecto es opcional:
+# se espera como mucho OPTIONAL_GRACE_S más tras los obligatorios, así un ESP32 apagado no retrasa cada orden
+DEFAULT_EXPECT = ('receptor',)
+DEFAULT_OPTIONAL = ('esp32',)
+OPTIONAL_GRACE_S = 0.3
+
+class ControlClient:
+    """Envía comandos de control y espera sus acuses. Con `client` reutiliza una conexión paho ya
+    existente (su on_connect debe suscribirse a ACK_TOPIC); sin él abre una propia que se reconecta sola."""
+
+    def __init__(self, client=None, broker=MQTT_BROKER, port=MQTT_PORT):
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._connected = threading.Event()
+        self.own_client = client is None
+        if self.own_client:
+            client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION1, client_id=f"control_{uuid.uuid4().hex[:8]}")
+            client.on_connect = self._on_connect
+            client.on_disconnect = lambda *args: self._connected.clear()
+            client.connect_async(broker, port, 60)
+            client.loop_start()
+        client.message_callback_add(ACK_TOPIC, self._on_ack)
+        self.client = client
+
+    def _on_connect(self, client, userdata, flags, rc, properties=None):
+        if rc == 0:
+            client.subscribe(ACK_TOPIC, qos=1)
+            self._connected.set()
+        else:
+            print(f"❌ Cliente de control: fallo de conexión al bróker (código {rc}).")
+
+    def _on_ack(self, client, userdata, msg):
+        received = time.monotonic()
+        try:
+            ack = json.loads(msg.payload.decode('utf-8'))
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            return
+        if not isinstance(ack, dict):
+            return
+        with self._lock:
+            pending = self._pending.get(ack.get('id'))
+            if pending is None:
+                return
+            ack['rtt_ms'] = round(1000 * (received - pending['sent']), 1)
+            pending['acks'][str(ack.get('source'))] = ack
+            if all(s in pending['acks'] for s in pending['expect']):
+                pending['done'].set()
+                if all(s in pending['acks'] for s in pending['optional']):
+                    pending['all'].set()
+
+    def send(self, command, session_id=None, device_id=None, expect=DEFAULT_EXPECT, optional=DEFAULT_OPTIONAL, timeout=ACK_TIMEOUT_S):
+        """
+        Publica el comando y espera hasta `timeout` s a que confirmen todos los de `expect` (y, como mucho
+        OPTIONAL_GRACE_S más, los de `optional`). Devuelve {'id', 'command', 'session_id',
+        'acks': {origen: acuse con 'rtt_ms'}, 'missing': [...], 'optional_missing': [...]}.
+        Lanza ConnectionError sin publicar nada si no hay conexión con el bróker: paho guardaría el
+        mensaje y lo entregaría al reconectar, cuando quien lo envió ya lo ha dado por fallido.
+        """
+        if self.own_client and not self._connected.wait(CONNECT_TIMEOUT_S):
+            raise ConnectionError(f"sin conexión con el bróker MQTT ({CONNECT_TIMEOUT_S:.0f} s)")
+        if not self.client.is_connected():
+            raise ConnectionError("sin conexión con el bróker MQTT")
+        payload = {"command": command, "id": uuid.uuid4().hex[:12]}
+        if session_id is not None:
+            payload["session_id"] = session_id
+        if device_id is not None:
+            payload["device_id"] = device_id
+        optional = tuple(s for s in optional if s not in expect)
+        pending = {'sent': time.monotonic(), 'acks': {}, 'expect': tuple(expect), 'optional': optional,
+                   'done': threading.Event(), 'all': threading.Event()}
+        with self._lock:
+            self._pending[payload['id']] = pending
+        try:
+            if session_id is not None:
+                tracing.record(session_id, f"mqtt_{command}")
+            info = self.client.publish(CONTROL_TOPIC, json.dumps(payload), qos=1)
+            if info.rc != mqtt.MQTT_ERR_SUCCESS:
+                raise ConnectionError(f"no se pudo publicar el comando (código {info.rc})")
+            if pending['expect'] and pending['done'].wait(timeout) and optional:
+                pending['all'].wait(OPTIONAL_GRACE_S)
+        finally:
+            with self._lock:
+                self._pending.pop(payload['id'], None)
+        acks = dict(pending['acks'])
+        if session_id is not None:
+            for source, ack in acks.items():
+                tracing.record(session_id, f"ack_{command}", ack['rtt_ms'] / 1000, source=source, ok=ack.get('ok', True))
+        return {'id': payload['id'], 'command': command, 'session_id': session_id, 'acks': acks,
+                'missing': [s for s in pending['expect'] if s not in acks],
+                'optional_missing': [s for s in optional if s not in acks]}
+
+    def close(self):
+        if self.own_client:
+            self.client.loop_stop()
+            self.client.disconnect()
+
+def format_result(result):
+    """Resumen de una línea: quién confirmó, con qué latencia, y quién no respondió."""
+    parts = []
+    for source, ack in sorted(result['acks'].items()):
+        status = "✅" if ack.get('ok', True) else f"❌ ({ack.get('error', 'error')})"
+        parts.append(f"{source} {status} {ack['rtt_ms']:.0f} ms")
+    if result['missing']:
+        parts.append(f"⚠️ sin confirmación de {', '.join(result['missing'])}")
+    if result.get('optional_missing'):
+        parts.append(f"sin acuse de {', '.join(result['optional_missing'])} (¿desconectado?)")
+    return f"{result['command'].upper()}: " + ("; ".join(parts) or "sin acuses")
+
+def confirmed(result, source='receptor'):
+    ack = result['acks'].get(source)
+    return ack is not None and ack.get('ok', True)
+
+_default_client = None
+_default_lock = threading.Lock()
+
+def get_control_client():
+    """Cliente de control compartido del proceso (se conecta la primera vez que se pide)."""
+    global _default_client
+    with _default_lock:
+        if _default_client is None:
+            _default_client = ControlClient()
+        return _default_client
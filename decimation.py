@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+
+# ===============================================================
+# --- DIEZMADO DE SERIES PARA LAS GRÁFICAS ---
+# ===============================================================
+# Una sesión larga de biomedidas tiene cientos de miles de puntos por señal, pero el gráfico solo
+# tiene unos cientos de píxeles de ancho: enviar todos los puntos al navegador congela la interfaz
+# sin mostrar nada más. Antes de dibujar, cada señal se reduce a un número de puntos del orden del
+# ancho del gráfico, conservando su forma visual:
+#
+#   'lttb':   Largest-Triangle-Three-Buckets; en cada tramo elige el punto que forma el triángulo de
+#             mayor área con el punto elegido antes y la media del tramo siguiente (sigue la forma)
+#   'minmax': el mínimo y el máximo de cada tramo (conserva todos los picos, p. ej. en la GSR)
+#
+# Los valores no disponibles ('ND', NaN) se descartan antes de diezmar. Al ampliar una ventana de
+# tiempo se vuelve a diezmar solo esa ventana, así que la resolución aumenta con el zoom.
+
+DECIMATION_METHODS = ('lttb', 'minmax')
+DEFAULT_METHOD = 'lttb'
+DEFAULT_PLOT_WIDTH = 1000   # Ancho aproximado del gráfico en píxeles = puntos por señal
+
+def _as_float(x):
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        return x.astype('datetime64[ns]').astype(np.int64).astype(np.float64)
+    return x.astype(np.float64)
+
+def minmax_indices(y, n_out):
+    """Índices (ordenados) del mínimo y el máximo de cada uno de los n_out // 2 tramos de y."""
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    buckets = max(1, n_out // 2)
+    if n <= n_out:
+        return np.arange(n)
+    size = -(-n // buckets)
+    # Se rellena hasta un múltiplo del tamaño de tramo para operar sobre una matriz (tramos x puntos)
+    padded = np.full(buckets * size, np.nan)
+    padded[:n] = y
+    padded = padded.reshape(buckets, size)
+    offsets = np.arange(buckets) * size
+    lows = np.where(np.isnan(padded), np.inf, padded).argmin(axis=1) + offsets
+    highs = np.where(np.isnan(padded), -np.inf, padded).argmax(axis=1) + offsets
+    indices = np.unique(np.concatenate([lows, highs]))
+    return indices[indices < n]
+
+def lttb_indices(x, y, n_out):
+    """Índices de los n_out puntos elegidos por LTTB (siempre incluye el primero y el último)."""
+    x, y = _as_float(x), np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    # n_out - 2 tramos entre el primer y el último punto
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    starts, ends = edges[:-1], edges[1:]
+    # Media de cada tramo (para el tramo siguiente de cada paso), con sumas acumuladas en lugar de un bucle
+    cx, cy = np.concatenate([[0.0], np.cumsum(x)]), np.concatenate([[0.0], np.cumsum(y)])
+    counts = np.maximum(ends - starts, 1)
+    mean_x = (cx[ends] - cx[starts]) / counts
+    mean_y = (cy[ends] - cy[starts]) / counts
+    mean_x, mean_y = np.append(mean_x, x[-1]), np.append(mean_y, y[-1])
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        bx, by = x[starts[i]:ends[i]], y[starts[i]:ends[i]]
+        area = np.abs((x[a] - mean_x[i + 1]) * (by - y[a]) - (x[a] - bx) * (mean_y[i + 1] - y[a]))
+        a = starts[i] + int(area.argmax())
+        selected[i + 1] = a
+    return selected
+
+def decimate(x, y, n_out=DEFAULT_PLOT_WIDTH, method=DEFAULT_METHOD):
+    """Devuelve (x, y) reducidos a unos n_out puntos, sin los valores NaN."""
+    if method not in DECIMATION_METHODS:
+        raise ValueError(f"Método de diezmado desconocido: {method} (usa {', '.join(DECIMATION_METHODS)})")
+    x, y = np.asarray(x), np.asarray(y, dtype=np.float64)
+    valid = ~np.isnan(y)
+    x, y = x[valid], y[valid]
+    indices = lttb_indices(x, y, n_out) if method == 'lttb' else minmax_indices(y, n_out)
+    return x[indices], y[indices]
+
+def time_window(df, start_s=None, end_s=None, time_column='timestamp'):
+    """Filas de df entre start_s y end_s segundos desde el inicio de la sesión (None = sin límite)."""
+    if df.empty or (not start_s and not end_s):
+        return df
+    t = df[time_column]
+    origin = t.iloc[0]
+    mask = np.ones(len(df), dtype=bool)
+    if start_s:
+        mask &= (t >= origin + pd.Timedelta(seconds=start_s)).to_numpy()
+    if end_s:
+        mask &= (t <= origin + pd.Timedelta(seconds=end_s)).to_numpy()
+    return df[mask]
+
+def decimate_frame(df, columns, n_out=DEFAULT_PLOT_WIDTH, method=DEFAULT_METHOD, time_column='timestamp'):
+    """Diezma cada columna de df por separado: {columna: (x, y)}; las columnas que faltan se omiten."""
+    x = df[time_column].to_numpy()
+    return {c: decimate(x, pd.to_numeric(df[c], errors='coerce').to_numpy(), n_out, method) for c in columns if c in df.columns}
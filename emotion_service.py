@@ -0,0 +1,207 @@
+import io
+import sys
+import json
+import time
+import socket
+import argparse
+import threading
+import socketserver
+from functools import partial
+
+# ===============================================================
+# --- CONFIGURACIÓN ---
+# ===============================================================
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 5055
+# Tiempo máximo que el cliente espera la respuesta de un trabajo (análisis de canciones largas)
+CLIENT_TIMEOUT_S = 3600
+
+# ===============================================================
+# --- SERVICIO DE ANÁLISIS EMOCIONAL RESIDENTE ---
+# ===============================================================
+# Proceso de larga duración que importa TensorFlow/DeepFace y carga los modelos una sola vez.
+# Protocolo: una petición JSON por conexión (una línea) y una respuesta JSON (una línea).
+#
+#   {"cmd": "ping"}                       -> estado del servicio
+#   {"cmd": "analyze", "input": "<dir>"}  -> analiza la carpeta de frames con analizar_emocion
+#                                            ("options": argumentos de analyze_emotions, p. ej. {"sampling": "adaptive"})
+#   {"cmd": "stream", "input": "<dir>"}   -> analiza los frames mientras se capturan; responde cuando la
+#                                            captura termina ("options": argumentos de stream_emotions)
+#   {"cmd": "stats"}                      -> latencias en frío y en caliente de los trabajos
+#
+#   python3 emotion_service.py serve
+#   python3 emotion_service.py analyze --input /ruta/a/frames
+#   python3 emotion_service.py stream --input /ruta/a/frames/<sesion> --lag-budget 5
+
+class InferenceTurn:
+    """Acceso de un trabajo al modelo compartido: toma el lock común y acumula lo que el trabajo espera por él."""
+
+    def __init__(self, lock):
+        self.lock = lock
+        self.wait_s = 0.0
+
+    def __enter__(self):
+        t0 = time.monotonic()
+        self.lock.acquire()
+        self.wait_s += time.monotonic() - t0
+
+    def __exit__(self, *exc):
+        self.lock.release()
+
+class EmotionService:
+    """
+    Mantiene DeepFace cargado y atiende varios trabajos a la vez (uno por conexión). Solo la inferencia
+    se serializa (un solo modelo en GPU): un trabajo en streaming de la canción siguiente analiza sus
+    bloques entre los de otro trabajo en lugar de esperar a que este termine.
+    """
+
+    def __init__(self):
+        self.analyzer = None
+        self.warmup_seconds = None
+        self.started = time.time()
+        self.jobs = []
+        self._inference_lock = threading.Lock()
+
+    def warm_up(self):
+        """Importa DeepFace y ejecuta un análisis sobre una imagen vacía para cargar los modelos y el grafo."""
+        t0 = time.monotonic()
+        import numpy as np
+        import analizar_emocion
+        from deepface import DeepFace
+        DeepFace.analyze(img_path=np.zeros((224, 224, 3), dtype=np.uint8), actions=['emotion'], enforce_detection=False)
+        self.analyzer = analizar_emocion
+        self.warmup_seconds = time.monotonic() - t0
+        print(f"🔥 Modelos cargados y calientes en {self.warmup_seconds:.2f} s (coste de arranque en frío).")
+
+    def analyze(self, input_dir, options=None, mode='analyze'):
+        run = self.analyzer.stream_emotions if mode == 'stream' else self.analyzer.analyze_emotions
+        # Salida propia de cada trabajo (sin tocar sys.stdout, que comparten los trabajos concurrentes)
+        log = io.StringIO()
+        turn = InferenceTurn(self._inference_lock)
+        started_at = time.monotonic()
+        output_path = run(input_dir, **(options or {}), inference_lock=turn, log=partial(print, file=log))
+        finished_at = time.monotonic()
+        job = {
+            'mode': mode,
+            'input': input_dir,
+            'output': output_path,
+            'ok': output_path is not None,
+            # Tiempo que el trabajo esperó a que otros terminaran su inferencia
+            'inference_wait_s': round(turn.wait_s, 3),
+            'run_s': round(finished_at - started_at, 3),
+            # Latencia en frío equivalente: lo que habría costado con un subproceso nuevo
+            'cold_equivalent_s': round(finished_at - started_at + (self.warmup_seconds or 0), 3),
+            'log': log.getvalue(),
+        }
+        self.jobs.append({k: v for k, v in job.items() if k != 'log'})
+        print(f"✅ Trabajo {len(self.jobs)}: '{input_dir}' en {job['run_s']:.2f} s en caliente "
+              f"(en frío serían ~{job['cold_equivalent_s']:.2f} s; {job['inference_wait_s']:.2f} s esperando el modelo).")
+        return job
+
+    def stats(self):
+        runs = [j['run_s'] for j in self.jobs]
+        return {
+            'uptime_s': round(time.time() - self.started, 1),
+            'warmup_s': round(self.warmup_seconds, 3) if self.warmup_seconds is not None else None,
+            'jobs': len(self.jobs),
+            'warm_run_s_mean': round(sum(runs) / len(runs), 3) if runs else None,
+            'last_jobs': self.jobs[-20:],
+        }
+
+    def handle(self, request):
+        cmd = request.get('cmd')
+        if cmd == 'ping':
+            return {'ok': True, 'ready': self.analyzer is not None, 'warmup_s': self.warmup_seconds}
+        if cmd == 'stats':
+            return {'ok': True, **self.stats()}
+        if cmd in ('analyze', 'stream'):
+            if not request.get('input'):
+                return {'ok': False, 'error': "Falta el campo 'input'."}
+            return self.analyze(request['input'], request.get('options'), mode=cmd)
+        return {'ok': False, 'error': f"Comando desconocido: {cmd}"}
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline().decode('utf-8'))
+            response = self.server.service.handle(request)
+        except Exception as e:
+            response = {'ok': False, 'error': str(e)}
+        self.wfile.write((json.dumps(response) + "\n").encode('utf-8'))
+
+class ServiceServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+def serve(host=SERVICE_HOST, port=SERVICE_PORT):
+    service = EmotionService()
+    service.warm_up()
+    with ServiceServer((host, port), RequestHandler) as server:
+        server.service = service
+        print(f"🧠 Servicio de análisis emocional escuchando en {host}:{port}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            print("⏹️ Servicio de análisis emocional detenido.")
+
+# ===============================================================
+# --- CLIENTE ---
+# ===============================================================
+def request(payload, host=SERVICE_HOST, port=SERVICE_PORT, timeout=CLIENT_TIMEOUT_S):
+    """Envía una petición al servicio. Lanza OSError (p. ej. ConnectionRefusedError) si no está en marcha."""
+    with socket.create_connection((host, port), timeout=timeout) as sock:
+        sock.sendall((json.dumps(payload) + "\n").encode('utf-8'))
+        with sock.makefile('rb') as f:
+            line = f.readline()
+    if not line:
+        raise ConnectionError("El servicio cerró la conexión sin responder.")
+    return json.loads(line.decode('utf-8'))
+
+def analyze_via_service(input_dir, host=SERVICE_HOST, port=SERVICE_PORT, timeout=CLIENT_TIMEOUT_S, options=None, mode='analyze'):
+    """
+    Pide el análisis de una carpeta de frames y devuelve la respuesta (incluye 'log', 'run_s' y 'output').
+    Con mode='stream' el análisis empieza ya y la respuesta llega cuando la captura termina.
+    """
+    t0 = time.monotonic()
+    payload = {'cmd': mode, 'input': input_dir}
+    if options:
+        payload['options'] = options
+    response = request(payload, host, port, timeout)
+    response['client_s'] = round(time.monotonic() - t0, 3)
+    return response
+
+def is_available(host=SERVICE_HOST, port=SERVICE_PORT):
+    try:
+        return request({'cmd': 'ping'}, host, port, timeout=2).get('ready', False)
+    except OSError:
+        return False
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servicio residente de análisis emocional con DeepFace.")
+    parser.add_argument("mode", choices=["serve", "analyze", "stream", "stats"], help="'serve' arranca el servicio; 'analyze', 'stream' y 'stats' actúan como cliente.")
+    parser.add_argument("--input", help="Directorio de frames a analizar (modo 'analyze').")
+    parser.add_argument("--sample", choices=["all", "adaptive", "rate"], default=None, help="Muestreo de frames (ver analizar_emocion.py --sample).")
+    parser.add_argument("--lag-budget", type=float, default=None, help="Modo 'stream': retraso máximo (s) antes de saltar frames.")
+    parser.add_argument("--host", default=SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=SERVICE_PORT)
+    args = parser.parse_args()
+
+    if args.mode == "serve":
+        serve(args.host, args.port)
+    elif args.mode == "stats":
+        print(json.dumps(request({'cmd': 'stats'}, args.host, args.port), indent=2))
+    else:
+        if not args.input:
+            parser.error(f"--input es obligatorio en modo '{args.mode}'.")
+        if args.mode == "stream":
+            options = {'lag_budget_s': args.lag_budget} if args.lag_budget is not None else None
+        else:
+            options = {'sampling': args.sample} if args.sample else None
+        try:
+            result = analyze_via_service(args.input, args.host, args.port, options=options, mode=args.mode)
+        except OSError as e:
+            print(f"❌ El servicio de análisis no está disponible en {args.host}:{args.port}: {e}")
+            sys.exit(2)
+        print(result.get('log', ''))
+        print(f"⏱️ Análisis en {result.get('run_s')} s (modelo residente), {result.get('client_s')} s de extremo a extremo.")
+        sys.exit(0 if result.get('ok') else 1)
@@ -0,0 +1,94 @@
+import cv2
+
+# ===============================================================
+# --- SEGUIMIENTO DE CARA Y RECORTE DE ROI ---
+# ===============================================================
+# En las sesiones hay un único participante sentado que apenas se mueve. En lugar de
+# ejecutar el detector de caras en cada frame de 1280x720, se detecta solo en frames
+# clave y entre ellos se sigue la caja con correlación de plantilla sobre imágenes
+# reducidas. Si la correlación cae (movimiento brusco, oclusión) se vuelve a detectar.
+# El modelo de emoción recibe solo el recorte de la cara, ya reducido.
+
+DEFAULT_KEYFRAME_INTERVAL = 30   # Frames máximos entre dos detecciones completas
+DEFAULT_ROI_SIZE = 224           # Lado del recorte que se pasa al modelo de emoción
+DEFAULT_MARGIN = 0.2             # Margen alrededor de la caja detectada (fracción del tamaño)
+MIN_TRACK_SCORE = 0.6            # Correlación mínima para dar el seguimiento por bueno
+TEMPLATE_SIZE = 64               # Lado de la plantilla reducida usada para seguir la cara
+
+def detect_face(frame, detector_backend='opencv'):
+    """Devuelve la caja (x, y, w, h) de la cara más grande del frame, o None."""
+    from deepface import DeepFace
+    faces = DeepFace.extract_faces(img_path=frame, detector_backend=detector_backend, enforce_detection=False)
+    best = None
+    for face in faces:
+        area = face.get('facial_area', {})
+        w, h = area.get('w', 0), area.get('h', 0)
+        # Con enforce_detection=False, si no hay cara se devuelve el frame entero con confianza 0
+        if face.get('confidence', 0) <= 0 or w * h >= 0.9 * frame.shape[0] * frame.shape[1]:
+            continue
+        if best is None or w * h > best[2] * best[3]:
+            best = (area['x'], area['y'], w, h)
+    return best
+
+def expand_box(box, margin, shape):
+    x, y, w, h = box
+    dx, dy = int(w * margin), int(h * margin)
+    x0, y0 = max(0, x - dx), max(0, y - dy)
+    x1, y1 = min(shape[1], x + w + dx), min(shape[0], y + h + dy)
+    return x0, y0, x1 - x0, y1 - y0
+
+def to_gray(image):
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+
+class FaceRoiTracker:
+    """Decide para cada frame la región de la cara: detección en frames clave y seguimiento entre ellos."""
+
+    def __init__(self, keyframe_interval=DEFAULT_KEYFRAME_INTERVAL, roi_size=DEFAULT_ROI_SIZE,
+                 margin=DEFAULT_MARGIN, detector_backend='opencv'):
+        self.keyframe_interval = keyframe_interval
+        self.roi_size = roi_size
+        self.margin = margin
+        self.detector_backend = detector_backend
+        self.box = None
+        self.template = None
+        self.scale = 1.0
+        self.since_keyframe = 0
+        self.detections = 0
+        self.frames = 0
+
+    def _detect(self, frame):
+        self.detections += 1
+        self.since_keyframe = 0
+        self.box = detect_face(frame, self.detector_backend)
+        if self.box is None:
+            self.template = None
+            return
+        x, y, w, h = self.box
+        # La plantilla se guarda a escala reducida para que la búsqueda sea barata
+        self.scale = TEMPLATE_SIZE / max(w, h)
+        self.template = cv2.resize(to_gray(frame[y:y + h, x:x + w]), None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+
+    def _track(self, frame):
+        """Busca la plantilla en un entorno de la última caja. Devuelve False si se ha perdido la cara."""
+        x, y, w, h = self.box
+        sx, sy, sw, sh = expand_box(self.box, 0.5, frame.shape)
+        region = cv2.resize(to_gray(frame[sy:sy + sh, sx:sx + sw]), None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        if region.shape[0] < self.template.shape[0] or region.shape[1] < self.template.shape[1]:
+            return False
+        scores = cv2.matchTemplate(region, self.template, cv2.TM_CCOEFF_NORMED)
+        _, best_score, _, (mx, my) = cv2.minMaxLoc(scores)
+        if best_score < MIN_TRACK_SCORE:
+            return False
+        self.box = (sx + int(mx / self.scale), sy + int(my / self.scale), w, h)
+        return True
+
+    def roi(self, frame):
+        """Recorte de la cara listo para el modelo (roi_size x roi_size), o None si no hay cara."""
+        self.frames += 1
+        self.since_keyframe += 1
+        if self.box is None or self.since_keyframe >= self.keyframe_interval or not self._track(frame):
+            self._detect(frame)
+        if self.box is None:
+            return None
+        x, y, w, h = expand_box(self.box, self.margin, frame.shape)
+        return cv2.resize(frame[y:y + h, x:x + w], (self.roi_size, self.roi_size), interpolation=cv2.INTER_AREA)
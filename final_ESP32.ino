@@ -19,8 +19,24 @@ IPAddress gateway(192, 168, 1, 1);
 IPAddress subnet(255, 255, 255, 0);
 
 const int MQTT_PORT = 1883;
-const char* MQTT_TOPIC = "tesis/biomedidas";
+// Identificador del dispositivo: cada ESP32 publica en su propio tópico tesis/<DEVICE_ID>/biomedidas
+// para que el receptor pueda grabar varios dispositivos a la vez.
+const char* DEVICE_ID = "esp32";
+String mqttTopic = String("tesis/") + DEVICE_ID + "/biomedidas";
+String ppgTopic = String("tesis/") + DEVICE_ID + "/ppg";
 const char* MQTT_CONTROL_TOPIC = "tesis/control"; // Nuevo tópico para los comandos
+// Acuses de los comandos con "id" (ver control_client.py): el dispositivo confirma START/STOP ejecutados
+const char* MQTT_ACK_TOPIC = "tesis/control/ack";
+// --- Formato de las tramas ---
+// false: JSON (formato original). true: formato binario compacto (ver biopayload.py) con
+// BINARY_BATCH_SIZE muestras por mensaje; el receptor acepta ambos formatos.
+const bool USE_BINARY_PAYLOAD = false;
+const int BINARY_BATCH_SIZE = 10;
+const uint8_t PAYLOAD_VERSION = 1;
+const int PAYLOAD_HEADER_SIZE = 6;   // 'B' 'P' | versión | flags | nº de muestras (uint16)
+const int PAYLOAD_SAMPLE_SIZE = 18;  // timestamp (uint32) | gsr (uint16) | temp, hr, spo2 (float32)
+uint8_t binaryPayload[PAYLOAD_HEADER_SIZE + BINARY_BATCH_SIZE * PAYLOAD_SAMPLE_SIZE];
+int binarySamples = 0;
 // Desplazamiento UTC en segundos.
 // UTC+2 para Madrid (CEST) = 2 * 3600 = 7200
 const long UTC_OFFSET_SECONDS = 7200;
@@ -43,6 +59,13 @@ const int SAMPLES_BUFFER_SIZE = 100; // 2 segundos de datos a 50Hz
 uint32_t irBuffer[SAMPLES_BUFFER_SIZE];
 uint32_t redBuffer[SAMPLES_BUFFER_SIZE];
 int bufferIndex = 0;
+// --- Modo PPG en bruto ---
+// true: además de los valores procesados, cada bloque IR/rojo se publica sin procesar en
+// tesis/<DEVICE_ID>/ppg para que el servidor estime HR/SpO2 con mejores algoritmos (ver ppg.py).
+const bool RAW_PPG_MODE = false;
+const uint16_t PPG_SAMPLE_RATE = 100; // 400 Hz con media de 4 muestras (ver particleSensor.setup)
+const int PPG_HEADER_SIZE = 16;       // 'P' 'G' | versión | flags | nº muestras | Hz | epoch | millis
+uint8_t ppgPayload[PPG_HEADER_SIZE + 8 * SAMPLES_BUFFER_SIZE];
 // --- Estabilización de Lecturas ---
 const int HR_HISTORY_SIZE = 4;
 float hrHistory[HR_HISTORY_SIZE];
@@ -61,6 +84,48 @@ bool isProgramRunning = false; // Flag para controlar la ejecución
 // --- FUNCIONES AUXILIARES ---
 // =================================================================
 
+// Publica las muestras binarias acumuladas (el ESP32 es little-endian, igual que el formato)
+void publishBinaryBatch() {
+    if (binarySamples == 0) return;
+    uint16_t count = binarySamples;
+    binaryPayload[0] = 'B';
+    binaryPayload[1] = 'P';
+    binaryPayload[2] = PAYLOAD_VERSION;
+    binaryPayload[3] = 0;
+    memcpy(binaryPayload + 4, &count, 2);
+    mqttClient.publish(mqttTopic.c_str(), binaryPayload, PAYLOAD_HEADER_SIZE + binarySamples * PAYLOAD_SAMPLE_SIZE);
+    binarySamples = 0;
+}
+
+// Añade una muestra a la trama binaria; los valores no disponibles se envían como NaN
+void appendBinarySample(uint32_t epoch, uint16_t gsr, float temp, float hr, float spo2) {
+    uint8_t* p = binaryPayload + PAYLOAD_HEADER_SIZE + binarySamples * PAYLOAD_SAMPLE_SIZE;
+    memcpy(p, &epoch, 4);
+    memcpy(p + 4, &gsr, 2);
+    memcpy(p + 6, &temp, 4);
+    memcpy(p + 10, &hr, 4);
+    memcpy(p + 14, &spo2, 4);
+    binarySamples++;
+    if (binarySamples >= BINARY_BATCH_SIZE) {
+        publishBinaryBatch();
+    }
+}
+
+// Confirma un comando con identificador de correlación: id, dispositivo, hora NTP y millis()
+void publishAck(const String& id, const String& action) {
+    if (id.length() == 0) return;
+    StaticJsonDocument<192> ack;
+    ack["id"] = id;
+    ack["source"] = DEVICE_ID;
+    ack["command"] = action;
+    ack["ok"] = true;
+    ack["ts"] = timeClient.getEpochTime();
+    ack["millis"] = millis();
+    char buffer[192];
+    size_t n = serializeJson(ack, buffer);
+    mqttClient.publish(MQTT_ACK_TOPIC, (const uint8_t*)buffer, n, false);
+}
+
 // Función de callback para manejar los mensajes MQTT
 void callback(char* topic, byte* payload, unsigned int length) {
   Serial.print("Mensaje recibido en el tema [");
@@ -73,12 +138,30 @@ void callback(char* topic, byte* payload, unsigned int length) {
   Serial.println(message);
 
   if (String(topic) == MQTT_CONTROL_TOPIC) {
-    if (message.indexOf("start") != -1) {
+    // Los comandos dirigidos a otro dispositivo (campo "device_id") se ignoran
+    String action = message;
+    String commandId = "";
+    StaticJsonDocument<256> command;
+    if (deserializeJson(command, message) == DeserializationError::Ok) {
+      if (command.containsKey("device_id") && String((const char*)command["device_id"]) != DEVICE_ID) {
+        return;
+      }
+      if (command.containsKey("command")) {
+        action = String((const char*)command["command"]);
+      }
+      if (command.containsKey("id")) {
+        commandId = String((const char*)command["id"]);
+      }
+    }
+    if (action.indexOf("start") != -1) {
       Serial.println("Comando 'start' recibido. Iniciando programa...");
       isProgramRunning = true;
-    } else if (message.indexOf("stop") != -1) {
+      publishAck(commandId, "start");
+    } else if (action.indexOf("stop") != -1) {
       Serial.println("Comando 'stop' recibido. Deteniendo programa...");
       isProgramRunning = false;
+      publishBinaryBatch(); // Envía la trama binaria incompleta para no perder muestras
+      publishAck(commandId, "stop");
     }
   }
 }
@@ -159,6 +242,26 @@ float getAverageHr(float newHr) {
     return totalHr / validHrReadings;
 }
 
+// Publica el bloque IR/rojo completo sin procesar (formato de ppg.py, little-endian)
+void publishRawPpgBlock() {
+    timeClient.update();
+    uint16_t count = SAMPLES_BUFFER_SIZE;
+    // El bloque empezó count / PPG_SAMPLE_RATE segundos antes de completarse
+    uint32_t epoch = timeClient.getEpochTime() - count / PPG_SAMPLE_RATE;
+    uint32_t ms = millis();
+    ppgPayload[0] = 'P';
+    ppgPayload[1] = 'G';
+    ppgPayload[2] = 1;
+    ppgPayload[3] = 0;
+    memcpy(ppgPayload + 4, &count, 2);
+    memcpy(ppgPayload + 6, &PPG_SAMPLE_RATE, 2);
+    memcpy(ppgPayload + 8, &epoch, 4);
+    memcpy(ppgPayload + 12, &ms, 4);
+    memcpy(ppgPayload + PPG_HEADER_SIZE, irBuffer, 4 * count);
+    memcpy(ppgPayload + PPG_HEADER_SIZE + 4 * count, redBuffer, 4 * count);
+    mqttClient.publish(ppgTopic.c_str(), ppgPayload, PPG_HEADER_SIZE + 8 * count);
+}
+
 void processAndPublishData() {
     // Definimos las variables con valores predeterminados para el JSON
     int32_t spo2 = -1;
@@ -189,6 +292,14 @@ void processAndPublishData() {
     // Creación del documento JSON
     timeClient.update();
     unsigned long epochTime = timeClient.getEpochTime();
+
+    if (USE_BINARY_PAYLOAD) {
+        appendBinarySample(epochTime, gsrValue,
+                           temperatura != -1.0 ? temperatura : NAN,
+                           heartRate != -1 ? (float)heartRate : NAN,
+                           spo2 != -1 ? (float)spo2 : NAN);
+        return;
+    }
     
     StaticJsonDocument<256> doc;
     doc["timestamp"] = epochTime;
@@ -218,7 +329,7 @@ void processAndPublishData() {
     
     Serial.print("\nPublicando datos: ");
     Serial.println(payload);
-    mqttClient.publish(MQTT_TOPIC, payload);
+    mqttClient.publish(mqttTopic.c_str(), payload);
 }
 
 
@@ -247,6 +358,7 @@ void setup() {
 
     setup_wifi();
     mqttClient.setServer(MQTT_SERVER, MQTT_PORT);
+    mqttClient.setBufferSize(1024); // Caben una trama binaria de BINARY_BATCH_SIZE muestras y un bloque PPG en bruto
     mqttClient.setCallback(callback); // Establecer la función de callback
     timeClient.begin();
     Serial.println("-> Red y NTP configurados.");
@@ -278,6 +390,9 @@ void loop() {
             
             bufferIndex++;
             if (bufferIndex >= SAMPLES_BUFFER_SIZE) {
+                if (RAW_PPG_MODE) {
+                    publishRawPpgBlock();
+                }
                 processAndPublishData();
                 bufferIndex = 0;
             }
@@ -0,0 +1,80 @@
+import os
+import struct
+import numpy as np
+
+# ===============================================================
+# --- ÍNDICE TEMPORAL DE FRAMES ---
+# ===============================================================
+# Cada sesión de captura guarda junto a los frames un frame_index.bin con el instante real en el
+# que se leyó cada frame de la cámara, para no tener que suponer un ritmo constante:
+#
+#   cabecera (8 bytes):  magic 'FIDX' | versión (uint16) | reservado (uint16)
+#   registro (32 bytes): nº de frame (uint32) | flags (uint32) | reloj monotónico (float64, s)
+#                        | hora de reloj (float64, epoch s) | posición del audio (float64, s; NaN sin audio)
+#
+# La hora de reloj es la misma referencia (epoch) que el timestamp NTP de biomedidas.csv.
+# Los frames descartados por el escritor se indexan igualmente con FLAG_DROPPED: no tienen archivo.
+
+FRAME_INDEX_FILENAME = 'frame_index.bin'
+FRAME_INDEX_MAGIC = b'FIDX'
+FRAME_INDEX_VERSION = 1
+FRAME_INDEX_HEADER = struct.Struct('<4sHH')
+FRAME_INDEX_RECORD = struct.Struct('<IIddd')
+FRAME_INDEX_DTYPE = np.dtype([('frame_no', '<u4'), ('flags', '<u4'), ('monotonic', '<f8'), ('wall', '<f8'), ('audio_pos', '<f8')])
+FLAG_DROPPED = 1
+
+class FrameIndexWriter:
+    """Escritor del índice: un struct.pack y una escritura con buffer por frame, apto para el bucle de captura."""
+
+    def __init__(self, session_dir, filename=FRAME_INDEX_FILENAME):
+        self.path = os.path.join(session_dir, filename)
+        self._file = open(self.path, 'wb')
+        self._file.write(FRAME_INDEX_HEADER.pack(FRAME_INDEX_MAGIC, FRAME_INDEX_VERSION, 0))
+        self.count = 0
+
+    def append(self, frame_no, monotonic, wall, audio_pos=float('nan'), dropped=False):
+        if self._file is None:
+            return
+        self._file.write(FRAME_INDEX_RECORD.pack(frame_no, FLAG_DROPPED if dropped else 0, monotonic, wall, audio_pos))
+        self.count += 1
+
+    def close(self):
+        if self._file is None:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self._file = None
+
+def read_frame_index(path):
+    """Lee un frame_index.bin completo a un array estructurado de NumPy (FRAME_INDEX_DTYPE)."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < FRAME_INDEX_HEADER.size:
+        raise ValueError("Índice de frames demasiado corto.")
+    magic, version, _ = FRAME_INDEX_HEADER.unpack_from(data)
+    if magic != FRAME_INDEX_MAGIC or version != FRAME_INDEX_VERSION:
+        raise ValueError("El archivo no es un índice de frames reconocido.")
+    # Un registro final incompleto (captura interrumpida) se ignora
+    count = (len(data) - FRAME_INDEX_HEADER.size) // FRAME_INDEX_DTYPE.itemsize
+    return np.frombuffer(data, dtype=FRAME_INDEX_DTYPE, count=count, offset=FRAME_INDEX_HEADER.size)
+
+def load_session_index(session_dir, include_dropped=False):
+    """Índice de la carpeta de una sesión, o None si la sesión no lo tiene (capturas antiguas)."""
+    path = os.path.join(session_dir, FRAME_INDEX_FILENAME)
+    if not os.path.exists(path):
+        return None
+    index = read_frame_index(path)
+    return index if include_dropped else index[(index['flags'] & FLAG_DROPPED) == 0]
+
+def frame_timing_summary(index):
+    """Ritmo real de la captura: FPS medio e intervalos entre frames (ms) a partir del reloj monotónico."""
+    if len(index) < 2:
+        return {'frames': int(len(index)), 'fps': 0.0, 'interval_ms_mean': None, 'interval_ms_max': None}
+    intervals = np.diff(index['monotonic']) * 1000
+    return {
+        'frames': int(len(index)),
+        'fps': round(float((len(index) - 1) / (index['monotonic'][-1] - index['monotonic'][0])), 2),
+        'interval_ms_mean': round(float(intervals.mean()), 2),
+        'interval_ms_max': round(float(intervals.max()), 2),
+    }
@@ -0,0 +1,133 @@
+import os
+import frame_store
+
+# ===============================================================
+# --- SELECCIÓN DE FRAMES A ANALIZAR ---
+# ===============================================================
+# Durante una canción el participante apenas se mueve: la mayoría de frames consecutivos
+# son casi idénticos y analizarlos todos con DeepFace no aporta información. Aquí se decide
+# qué frames se analizan y se rellenan los demás interpolando las puntuaciones.
+#
+#   'all':      se analizan todos los frames (comportamiento original)
+#   'adaptive': se analiza un frame cuando su miniatura difiere lo suficiente del último analizado
+#               (diferencia perceptual), o cuando han pasado `max_gap` frames sin analizar
+#   'rate':     se analizan frames a un ritmo fijo (`target_fps` de los `capture_fps` capturados)
+#
+# El primer y el último frame se analizan siempre, para que la interpolación no extrapole.
+
+SAMPLING_MODES = ('all', 'adaptive', 'rate')
+SIGNATURE_SIZE = 32            # Lado de la miniatura en escala de grises usada para comparar frames
+DEFAULT_DIFF_THRESHOLD = 3.0   # Diferencia media absoluta (niveles de gris, 0-255) para considerar un frame nuevo
+DEFAULT_MAX_GAP = 30           # Frames máximos seguidos sin analizar en modo 'adaptive'
+DEFAULT_CAPTURE_FPS = 20.0     # Ritmo de captura aproximado de capture_10s.py / camera_server.py
+DEFAULT_TARGET_FPS = 2.0       # Ritmo de análisis en modo 'rate'
+
+ORIGIN_COMPUTED = 'calculado'
+ORIGIN_INFERRED = 'inferido'
+
+def frame_signature(path, size=SIGNATURE_SIZE):
+    """Miniatura size x size en escala de grises (float32), o None si el frame no se puede leer."""
+    # OpenCV y NumPy se importan al usarlos: el analizador importa este módulo aunque no muestree
+    import cv2
+    import numpy as np
+    if frame_store.is_store_ref(path):
+        image = cv2.cvtColor(cv2.resize(frame_store.load_frame(path), (size * 4, size * 4), interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+    else:
+        # IMREAD_REDUCED_GRAYSCALE_4 decodifica los JPEG directamente a 1/4 de resolución
+        image = cv2.imread(path, cv2.IMREAD_REDUCED_GRAYSCALE_4)
+    if image is None:
+        return None
+    return cv2.resize(image, (size, size), interpolation=cv2.INTER_AREA).astype(np.float32)
+
+def frame_signatures(paths, size=SIGNATURE_SIZE):
+    """Miniaturas de todos los frames apiladas en un array (N, size, size); los ilegibles quedan en NaN."""
+    import numpy as np
+    signatures = np.full((len(paths), size, size), np.nan, dtype=np.float32)
+    for i, path in enumerate(paths):
+        signature = frame_signature(path, size)
+        if signature is not None:
+            signatures[i] = signature
+    return signatures
+
+def select_adaptive(signatures, threshold=DEFAULT_DIFF_THRESHOLD, max_gap=DEFAULT_MAX_GAP):
+    """Máscara booleana de frames a analizar según la diferencia con el último frame analizado."""
+    import numpy as np
+    n = len(signatures)
+    selected = np.zeros(n, dtype=bool)
+    if n == 0:
+        return selected
+    flat = signatures.reshape(n, -1)
+    # Diferencia con el frame anterior, de una vez para toda la secuencia: detecta los cambios bruscos;
+    # la comparación con el último frame analizado recoge las derivas lentas
+    step = np.nanmean(np.abs(np.diff(flat, axis=0)), axis=1) if n > 1 else np.empty(0)
+    last = 0
+    selected[0] = True
+    for i in range(1, n):
+        if i - last >= max_gap or not np.isfinite(step[i - 1]):
+            selected[i] = True
+        elif step[i - 1] >= threshold or np.nanmean(np.abs(flat[i] - flat[last])) >= threshold:
+            selected[i] = True
+        if selected[i]:
+            last = i
+    selected[-1] = True
+    return selected
+
+def select_rate(n, target_fps=DEFAULT_TARGET_FPS, capture_fps=DEFAULT_CAPTURE_FPS):
+    """Máscara booleana que elige frames equiespaciados a `target_fps`."""
+    import numpy as np
+    selected = np.zeros(n, dtype=bool)
+    if n == 0:
+        return selected
+    step = max(1.0, capture_fps / target_fps)
+    selected[np.unique(np.round(np.arange(0, n, step)).astype(int).clip(0, n - 1))] = True
+    selected[-1] = True
+    return selected
+
+def select_frames(paths, mode='all', threshold=DEFAULT_DIFF_THRESHOLD, max_gap=DEFAULT_MAX_GAP,
+                  target_fps=DEFAULT_TARGET_FPS, capture_fps=DEFAULT_CAPTURE_FPS):
+    """Devuelve la lista de rutas a analizar (en orden) según el modo de muestreo."""
+    if mode not in SAMPLING_MODES:
+        raise ValueError(f"Modo de muestreo desconocido: {mode} (usa {', '.join(SAMPLING_MODES)})")
+    if mode == 'all':
+        return list(paths)
+    if mode == 'rate':
+        selected = select_rate(len(paths), target_fps, capture_fps)
+    else:
+        selected = select_adaptive(frame_signatures(paths), threshold, max_gap)
+    return [p for p, keep in zip(paths, selected) if keep]
+
+def fill_skipped(df, all_frames, score_columns, name_column='archivo', origin_column='origen', label_column='emocion_dominante'):
+    """
+    Completa el DataFrame de resultados con una fila por cada frame de `all_frames` que no se analizó.
+    Las puntuaciones se interpolan linealmente según la posición del frame en la secuencia (fuera del
+    rango analizado se copia el más cercano) y la emoción dominante es la de mayor puntuación interpolada.
+    Las filas nuevas se marcan como inferidas en `origin_column`. Sin ninguna fila calculada (p. ej. el
+    seguimiento no encontró caras) no hay nada de lo que interpolar y se devuelve `df` sin cambios.
+    """
+    import numpy as np
+    names = [os.path.basename(p) for p in all_frames]
+    position = {name: i for i, name in enumerate(names)}
+    results = df.copy()
+    if origin_column not in results.columns:
+        results[origin_column] = ORIGIN_COMPUTED
+    results[origin_column] = results[origin_column].fillna(ORIGIN_COMPUTED)
+    computed = results[(results[origin_column] == ORIGIN_COMPUTED) & results[name_column].isin(position.keys())]
+    if computed.empty:
+        return df
+
+    known_x = computed[name_column].map(position).to_numpy()
+    order = np.argsort(known_x)
+    known_x = known_x[order]
+    computed_names = set(computed[name_column])
+    missing = np.array([i for i, name in enumerate(names) if name not in computed_names], dtype=int)
+    if len(missing) == 0:
+        return computed
+
+    inferred = {name_column: [names[i] for i in missing], origin_column: ORIGIN_INFERRED}
+    for column in score_columns:
+        known_y = computed[column].to_numpy(dtype=float)[order]
+        inferred[column] = np.interp(missing, known_x, known_y)
+    import pandas as pd  # Ya cargado por quien pasa el DataFrame; diferido para no encarecer el import del módulo
+    inferred = pd.DataFrame(inferred)
+    inferred[label_column] = inferred[score_columns].idxmax(axis=1)
+    return pd.concat([computed, inferred], ignore_index=True).sort_values(name_column)
@@ -0,0 +1,231 @@
+import os
+import sys
+import glob
+import time
+import struct
+import argparse
+import threading
+from collections import OrderedDict
+
+# ===============================================================
+# --- ALMACÉN DE FRAMES MAPEADO EN MEMORIA ---
+# ===============================================================
+# Alternativa a la carpeta con miles de PNG: un único frames.store con todos los frames de la
+# sesión en crudo (BGR, tamaño fijo), que el analizador lee como vistas de NumPy sobre un mmap,
+# sin abrir ni decodificar un archivo por frame (lo más caro al cruzar /mnt/c desde WSL2).
+#
+#   cabecera (64 bytes): magic 'FSTR' | versión (uint16) | flags (uint16) | alto | ancho | canales
+#                        | tamaño de registro | nº de frames (uint32 cada uno) | relleno
+#   registro:            nº de frame (uint32) | nombre (28 bytes, p. ej. frame_0042.png) | píxeles (alto x ancho x canales)
+#
+# Cada frame ocupa lo mismo que un PNG sin comprimir; el ahorro está en el acceso, no en el espacio.
+# Si la captura se interrumpe, el nº de frames se deduce del tamaño del archivo.
+#
+# Los frames se identifican con rutas virtuales "<ruta>/frames.store/<nombre>", de modo que
+# os.path.basename sigue dando el nombre del frame y el resto del analizador no cambia.
+#
+#   python3 frame_store.py convert --input /ruta/a/frames     (PNG/JPG -> frames.store)
+#   python3 frame_store.py bench --input /ruta/a/frames       (velocidad de carga PNG vs. store)
+
+STORE_FILENAME = 'frames.store'
+STORE_MAGIC = b'FSTR'
+STORE_VERSION = 1
+STORE_HEADER = struct.Struct('<4sHHIIIII')
+STORE_HEADER_SIZE = 64
+NAME_SIZE = 28
+
+def record_dtype(height, width, channels=3):
+    # NumPy y OpenCV se importan al usarlos: el analizador importa este módulo para listar frames
+    import numpy as np
+    return np.dtype([('frame_no', '<u4'), ('name', f'S{NAME_SIZE}'), ('pixels', 'u1', (height, width, channels))])
+
+class FrameStoreWriter:
+    """Añade frames al final del almacén con escrituras secuenciales; el tamaño lo fija el primer frame."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'wb')
+        self.dtype = None
+        self.count = 0
+
+    def append(self, frame, frame_no, name=None):
+        if self._file is None:
+            return
+        if self.dtype is None:
+            height, width = frame.shape[:2]
+            channels = frame.shape[2] if frame.ndim == 3 else 1
+            self.dtype = record_dtype(height, width, channels)
+            self._write_header()
+        import numpy as np
+        record = np.empty((), dtype=self.dtype)
+        record['frame_no'] = frame_no
+        record['name'] = (name or f"frame_{frame_no:04d}.png").encode()[:NAME_SIZE]
+        record['pixels'] = frame.reshape(self.dtype['pixels'].shape)
+        self._file.write(record.tobytes())
+        self.count += 1
+
+    def _write_header(self):
+        height, width, channels = self.dtype['pixels'].shape
+        header = STORE_HEADER.pack(STORE_MAGIC, STORE_VERSION, 0, height, width, channels, self.dtype.itemsize, self.count)
+        self._file.seek(0)
+        self._file.write(header.ljust(STORE_HEADER_SIZE, b'\0'))
+        self._file.seek(0, os.SEEK_END)
+
+    def close(self):
+        if self._file is None:
+            return
+        if self.dtype is not None:
+            self._write_header()
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self._file = None
+
+class FrameStore:
+    """Almacén abierto en solo lectura. `store[i]` es una vista (alto, ancho, canales) sin copias."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            header = f.read(STORE_HEADER_SIZE)
+        if len(header) < STORE_HEADER.size:
+            raise ValueError("Almacén de frames demasiado corto.")
+        magic, version, _, height, width, channels, record_size, _ = STORE_HEADER.unpack_from(header)
+        if magic != STORE_MAGIC or version != STORE_VERSION:
+            raise ValueError(f"{path} no es un almacén de frames reconocido.")
+        self.dtype = record_dtype(height, width, channels)
+        if self.dtype.itemsize != record_size:
+            raise ValueError("Tamaño de registro inconsistente en el almacén de frames.")
+        count = (os.path.getsize(path) - STORE_HEADER_SIZE) // record_size
+        import numpy as np
+        if count > 0:
+            self.records = np.memmap(path, dtype=self.dtype, mode='r', offset=STORE_HEADER_SIZE, shape=(count,))
+        else:
+            self.records = np.empty(0, dtype=self.dtype)
+        self.frames = self.records['pixels']
+        self.names = [n.decode() for n in self.records['name']]
+        self._positions = {name: i for i, name in enumerate(self.names)}
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, i):
+        return self.frames[i]
+
+    def by_name(self, name):
+        return self.frames[self._positions[name]]
+
+    def refs(self):
+        """Rutas virtuales de todos los frames, en orden (ver la cabecera del módulo)."""
+        return [os.path.join(self.path, name) for name in self.names]
+
+# ===============================================================
+# --- ACCESO UNIFICADO A FRAMES (ARCHIVO O ALMACÉN) ---
+# ===============================================================
+# Almacenes abiertos, del menos al más usado. Se limitan porque el servicio de análisis vive horas y pasa por
+# muchas sesiones: el mmap de un almacén expulsado se libera cuando nadie conserva vistas de sus frames.
+OPEN_STORES_MAX = 8
+_open_stores = OrderedDict()
+_open_stores_lock = threading.Lock()
+
+def store_path(input_dir):
+    return os.path.join(input_dir, STORE_FILENAME)
+
+def open_store(path):
+    """Abre (una vez por proceso) el almacén; los procesos del analizador comparten las páginas del mmap."""
+    with _open_stores_lock:
+        store = _open_stores.get(path)
+        if store is None or len(store) * store.dtype.itemsize + STORE_HEADER_SIZE < os.path.getsize(path):
+            store = _open_stores[path] = FrameStore(path)
+        _open_stores.move_to_end(path)
+        while len(_open_stores) > OPEN_STORES_MAX:
+            _open_stores.popitem(last=False)
+    return store
+
+def is_store_ref(ref):
+    return os.path.basename(os.path.dirname(ref)) == STORE_FILENAME
+
+def load_frame(ref):
+    """Frame BGR de una ruta normal (se decodifica) o de una ruta virtual del almacén (vista sin copia)."""
+    if is_store_ref(ref):
+        return open_store(os.path.dirname(ref)).by_name(os.path.basename(ref))
+    import cv2
+    return cv2.imread(ref)
+
+# ===============================================================
+# --- CONVERSIÓN Y BENCHMARK ---
+# ===============================================================
+def list_image_files(input_dir):
+    files = glob.glob(os.path.join(input_dir, '*.jpg'))
+    return sorted(files or glob.glob(os.path.join(input_dir, '*.png')))
+
+def convert_folder(input_dir, output_path=None):
+    """Convierte una carpeta de PNG/JPG en un frames.store (los frames conservan su nombre de archivo)."""
+    import cv2
+    files = list_image_files(input_dir)
+    output_path = output_path or store_path(input_dir)
+    writer = FrameStoreWriter(output_path)
+    shape = None
+    for n, path in enumerate(files):
+        frame = cv2.imread(path)
+        if frame is None:
+            print(f"⚠️ No se pudo leer {path}; se omite.")
+            continue
+        if shape is None:
+            shape = frame.shape
+        elif frame.shape != shape:
+            print(f"⚠️ {os.path.basename(path)} tiene otro tamaño {frame.shape} != {shape}; se omite.")
+            continue
+        writer.append(frame, n, os.path.basename(path))
+    writer.close()
+    return output_path, writer.count
+
+def bench_load(input_dir, limit=None):
+    """Frames/s al cargar la sesión desde los archivos de imagen y desde el almacén (si existen)."""
+    import cv2
+    import numpy as np
+    result = {}
+    files = list_image_files(input_dir)[:limit]
+    if files:
+        t0 = time.perf_counter()
+        for path in files:
+            frame = cv2.imread(path)
+        elapsed = time.perf_counter() - t0
+        result['images'] = {'frames': len(files), 'seconds': round(elapsed, 3), 'fps': round(len(files) / elapsed, 1)}
+    path = store_path(input_dir)
+    if os.path.exists(path):
+        t0 = time.perf_counter()
+        store = FrameStore(path)
+        total = len(store) if limit is None else min(limit, len(store))
+        buffer = np.empty(store.frames.shape[1:], dtype=np.uint8)
+        for i in range(total):
+            # Se copia el frame entero para forzar la lectura real de todas sus páginas del mmap
+            np.copyto(buffer, store[i])
+        elapsed = time.perf_counter() - t0
+        result['store'] = {'frames': total, 'seconds': round(elapsed, 3), 'fps': round(total / elapsed, 1) if elapsed > 0 else None}
+    return result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Almacén de frames mapeado en memoria (conversión y benchmark de carga).")
+    parser.add_argument("mode", choices=["convert", "bench"], help="'convert' crea frames.store a partir de las imágenes; 'bench' mide la carga.")
+    parser.add_argument("--input", required=True, help="Carpeta de frames de la sesión.")
+    parser.add_argument("--limit", type=int, default=None, help="Modo 'bench': número máximo de frames a cargar.")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.input):
+        print(f"❌ Error: El directorio de entrada no existe: {args.input}")
+        sys.exit(1)
+    if args.mode == "convert":
+        t0 = time.monotonic()
+        path, count = convert_folder(args.input)
+        print(f"✅ {count} frames convertidos a {path} en {time.monotonic() - t0:.1f} s "
+              f"({os.path.getsize(path) / 1e6:.1f} MB).")
+    else:
+        result = bench_load(args.input, args.limit)
+        if not result:
+            print("🤷 No hay imágenes ni frames.store en la carpeta.")
+            sys.exit(1)
+        for source, r in result.items():
+            print(f"📊 {source}: {r['frames']} frames en {r['seconds']} s ({r['fps']} frames/s)")
+        if len(result) == 2:
+            print(f"⚡ El almacén carga {result['store']['fps'] / result['images']['fps']:.1f}x más rápido.")
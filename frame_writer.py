@@ -0,0 +1,161 @@
+import os
+import json
+import time
+import queue
+import threading
+from frame_store import FrameStoreWriter, STORE_FILENAME
+
+# ===============================================================
+# --- ESCRITURA ASÍNCRONA DE FRAMES ---
+# ===============================================================
+# El bucle de captura solo lee de la cámara y encola el frame; la codificación y la escritura
+# a disco se hacen en hilos aparte (cv2 libera el GIL mientras codifica). Si el disco no da
+# abasto, la cola se llena y los frames nuevos se descartan y se cuentan, en lugar de frenar
+# la captura y desajustar el ritmo respecto al audio.
+#
+#   'png':   un PNG por frame (sin pérdida; --png-compression 0-9)
+#   'jpg':   un JPEG por frame con la calidad indicada (mucho más pequeño)
+#   'video': un único contenedor (frames.mp4); un solo hilo, los frames deben llegar en orden
+#   'store': un único frames.store en crudo (ver frame_store.py); un solo hilo
+#
+# analizar_emocion.py trabaja con las carpetas de .png/.jpg o con frames.store; el vídeo es para archivo.
+# Cada imagen se escribe con un nombre oculto y se renombra al terminar, así quien lea la carpeta
+# durante la captura (análisis en streaming) nunca ve un archivo a medias. Al cerrar la captura se
+# deja CAPTURE_DONE_FILENAME con las estadísticas para indicar que no llegarán más frames.
+
+FRAME_FORMATS = ('png', 'jpg', 'video', 'store')
+DEFAULT_FORMAT = 'png'
+DEFAULT_JPEG_QUALITY = 90
+DEFAULT_PNG_COMPRESSION = 1   # 0 escribe PNG sin comprimir (enorme); 1 ya reduce mucho el tamaño y es rápido
+DEFAULT_QUEUE_SIZE = 64       # Frames en vuelo como máximo (~2.7 MB cada uno a 1280x720)
+DEFAULT_WORKERS = 2
+VIDEO_FILENAME = 'frames.mp4'
+VIDEO_FOURCC = 'mp4v'
+CAPTURE_DONE_FILENAME = 'capture_done.json'
+
+class AsyncFrameWriter:
+    """Cola acotada + hilos de escritura. `submit` nunca bloquea: devuelve False si el frame se descarta."""
+
+    def __init__(self, output_dir, fmt=DEFAULT_FORMAT, fps=30.0, jpeg_quality=DEFAULT_JPEG_QUALITY,
+                 png_compression=DEFAULT_PNG_COMPRESSION, queue_size=DEFAULT_QUEUE_SIZE, workers=DEFAULT_WORKERS,
+                 prefix='frame_'):
+        if fmt not in FRAME_FORMATS:
+            raise ValueError(f"Formato de frames desconocido: {fmt} (usa {', '.join(FRAME_FORMATS)})")
+        os.makedirs(output_dir, exist_ok=True)
+        self.output_dir = output_dir
+        self.fmt = fmt
+        self.fps = fps
+        self.prefix = prefix
+        # OpenCV se importa al crear el escritor: quien solo usa mark_capture_done no lo carga
+        import cv2
+        if fmt == 'jpg':
+            self.extension, self.params = '.jpg', [cv2.IMWRITE_JPEG_QUALITY, int(jpeg_quality)]
+        else:
+            self.extension, self.params = '.png', [cv2.IMWRITE_PNG_COMPRESSION, int(png_compression)]
+        self.video = None
+        self.store = None
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.submitted = 0
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+        self.first_submit = None
+        self.last_submit = None
+        self._lock = threading.Lock()
+        # VideoWriter y el almacén no son seguros entre hilos y necesitan los frames en orden
+        sequential = fmt in ('video', 'store')
+        self.workers = [threading.Thread(target=self._run, daemon=True) for _ in range(1 if sequential else max(1, workers))]
+        for worker in self.workers:
+            worker.start()
+
+    def submit(self, frame, frame_no=None):
+        """Encola un frame para escribir. El frame no debe modificarse después de encolarlo."""
+        now = time.monotonic()
+        if self.first_submit is None:
+            self.first_submit = now
+        self.last_submit = now
+        if frame_no is None:
+            frame_no = self.submitted
+        self.submitted += 1
+        try:
+            self.queue.put_nowait((frame_no, frame))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def frame_path(self, frame_no):
+        return os.path.join(self.output_dir, f"{self.prefix}{frame_no:04d}{self.extension}")
+
+    def _write(self, frame_no, frame):
+        import cv2
+        if self.fmt == 'store':
+            if self.store is None:
+                self.store = FrameStoreWriter(os.path.join(self.output_dir, STORE_FILENAME))
+            self.store.append(frame, frame_no, os.path.basename(self.frame_path(frame_no)))
+            return True
+        if self.fmt != 'video':
+            path = self.frame_path(frame_no)
+            partial = os.path.join(self.output_dir, '.' + os.path.basename(path))
+            if not cv2.imwrite(partial, frame, self.params):
+                return False
+            os.replace(partial, path)
+            return True
+        if self.video is None:
+            height, width = frame.shape[:2]
+            self.video = cv2.VideoWriter(os.path.join(self.output_dir, VIDEO_FILENAME),
+                                         cv2.VideoWriter_fourcc(*VIDEO_FOURCC), self.fps, (width, height))
+        self.video.write(frame)
+        return True
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            try:
+                ok = self._write(*item)
+            except Exception as e:
+                print(f"❌ Error al escribir el frame {item[0]}: {e}")
+                ok = False
+            with self._lock:
+                if ok:
+                    self.written += 1
+                else:
+                    self.errors += 1
+
+    def close(self):
+        """Espera a que se escriban los frames encolados y devuelve las estadísticas."""
+        for _ in self.workers:
+            self.queue.put(None)
+        for worker in self.workers:
+            worker.join()
+        if self.video is not None:
+            self.video.release()
+            self.video = None
+        if self.store is not None:
+            self.store.close()
+            self.store = None
+        return self.stats()
+
+    def stats(self, requested_fps=None):
+        span = (self.last_submit - self.first_submit) if self.submitted > 1 else 0
+        achieved = (self.submitted - 1) / span if span > 0 else 0.0
+        return {
+            'format': self.fmt,
+            'submitted': self.submitted,
+            'written': self.written,
+            'dropped': self.dropped,
+            'errors': self.errors,
+            'requested_fps': requested_fps if requested_fps is not None else self.fps,
+            'achieved_fps': round(achieved, 2),
+        }
+
+def mark_capture_done(output_dir, stats=None):
+    """Indica a los lectores de la carpeta que la captura ha terminado (se llama después de close())."""
+    with open(os.path.join(output_dir, CAPTURE_DONE_FILENAME), 'w') as f:
+        json.dump(stats or {}, f)
+
+def format_stats(stats):
+    return (f"{stats['written']} frames escritos ({stats['format']}), {stats['dropped']} descartados, "
+            f"{stats['errors']} errores | FPS conseguidos {stats['achieved_fps']:.1f} de {stats['requested_fps']:.1f} pedidos")
@@ -0,0 +1,205 @@
+import os
+import re
+import sys
+import time
+import hashlib
+import argparse
+import numpy as np
+import pandas as pd
+from frame_index import load_session_index
+from frame_sampling import DEFAULT_CAPTURE_FPS
+import session_catalog
+
+# ===============================================================
+# --- FUSIÓN TEMPORAL DE EMOCIÓN FACIAL Y BIOSEÑALES ---
+# ===============================================================
+# Une, para cada sesión, el _emotions_analysis.csv (una fila por frame) con el biomedidas.csv
+# (una fila por segundo, timestamp NTP en epoch) en una única tabla sobre una línea de tiempo común:
+#
+#   1. Hora de cada frame: la de frame_index.bin (leída de la cámara, misma referencia epoch que las
+#      biomedidas); en capturas antiguas sin índice, la hora de la subcarpeta de captura + nº de frame / FPS.
+#   2. Biomedidas: los huecos 'ND' de cada canal se interpolan en el tiempo (solo entre dos lecturas válidas).
+#   3. Emociones: puntuaciones medias de los frames de cada paso de `step_s` segundos; la emoción
+#      dominante es la de mayor puntuación media.
+#   4. Unión as-of (la lectura de biomedidas más cercana, con tolerancia) sobre la línea de tiempo.
+#
+# Las tablas fusionadas se guardan en FUSION_CACHE_DIR con una clave que es el hash del contenido de
+# los archivos de entrada y de los parámetros: si no cambian, se cargan de disco sin recalcular.
+
+FUSION_VERSION = 1
+FUSION_CACHE_DIR = os.environ.get('TESIS_FUSION_CACHE', '/home/alvar/.cache/tesis_fusion')
+EMOTION_COLUMNS = ['angry', 'disgust', 'fear', 'happy', 'sad', 'surprise', 'neutral']
+BIOSIGNAL_COLUMNS = ['hr', 'temp', 'gsr', 'spo2']
+DEFAULT_STEP_S = 1.0
+DEFAULT_TOLERANCE_S = 2.0   # Distancia máxima a la lectura de biomedidas más cercana
+CAPTURE_SUBDIR_FORMAT = '%Y-%m-%d_%H-%M-%S'
+FRAME_NUMBER = re.compile(r'(\d+)(?!.*\d)')
+
+# ===============================================================
+# --- CARGA DE ENTRADAS ---
+# ===============================================================
+_hash_memo = {}
+
+def file_hash(path):
+    """Hash del contenido del archivo (memorizado por ruta, tamaño y mtime dentro del proceso)."""
+    st = os.stat(path)
+    key = (path, st.st_size, st.st_mtime_ns)
+    digest = _hash_memo.get(key)
+    if digest is None:
+        h = hashlib.blake2b(digest_size=16)
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                h.update(block)
+        digest = _hash_memo[key] = h.hexdigest()
+    return digest
+
+def load_biomedidas(path):
+    """biomedidas.csv ordenado por tiempo, con 'ND' interpolado por canal entre lecturas válidas."""
+    raw = pd.read_csv(path, sep=';', na_values=['ND'])
+    t = pd.to_numeric(raw['timestamp'], errors='coerce').to_numpy(dtype=np.float64)
+    order = np.argsort(t, kind='stable')
+    t = t[order]
+    # Sin NaN y sin timestamps repetidos (se queda la última lectura de cada segundo)
+    keep = ~np.isnan(t)
+    keep[:-1] &= t[:-1] != t[1:]
+    bio = {'timestamp': t[keep]}
+    for c in BIOSIGNAL_COLUMNS:
+        if c not in raw.columns:
+            continue
+        v = pd.to_numeric(raw[c], errors='coerce').to_numpy(dtype=np.float64)[order][keep]
+        valid = ~np.isnan(v)
+        if valid.sum() >= 2:
+            tv = bio['timestamp'][valid]
+            gaps = ~valid & (bio['timestamp'] > tv[0]) & (bio['timestamp'] < tv[-1])
+            v[gaps] = np.interp(bio['timestamp'][gaps], tv, v[valid])
+        bio[c] = v
+    return pd.DataFrame(bio)
+
+def frame_times(frames_dir, frame_numbers, capture_fps=DEFAULT_CAPTURE_FPS):
+    """Hora (epoch, s) de cada nº de frame y la fuente usada ('indice' o 'estimada')."""
+    index = load_session_index(frames_dir)
+    if index is not None and len(index):
+        # Búsqueda vectorizada de cada nº de frame en el índice ordenado, en lugar de un dict
+        order = np.argsort(index['frame_no'], kind='stable')
+        numbers, walls = index['frame_no'][order].astype(np.int64), index['wall'][order]
+        pos = np.searchsorted(numbers, frame_numbers).clip(0, len(numbers) - 1)
+        times = np.where(numbers[pos] == frame_numbers, walls[pos], np.nan)
+        return times, 'indice'
+    try:
+        start = time.mktime(time.strptime(os.path.basename(os.path.normpath(frames_dir)), CAPTURE_SUBDIR_FORMAT))
+    except ValueError:
+        start = os.path.getmtime(frames_dir)
+    return start + np.asarray(frame_numbers, dtype=np.float64) / capture_fps, 'estimada'
+
+def load_emotions(path, capture_fps=DEFAULT_CAPTURE_FPS):
+    """_emotions_analysis.csv con la hora de cada frame (columna 'timestamp', epoch s)."""
+    emotions = pd.read_csv(path, sep=';')
+    numbers = emotions['archivo'].astype(str).str.extract(FRAME_NUMBER, expand=False).astype(np.int64).to_numpy()
+    times, source = frame_times(os.path.dirname(os.path.abspath(path)), numbers, capture_fps)
+    emotions['timestamp'] = times
+    emotions = emotions.dropna(subset=['timestamp']).sort_values('timestamp').reset_index(drop=True)
+    emotions.attrs['time_source'] = source
+    return emotions
+
+# ===============================================================
+# --- FUSIÓN ---
+# ===============================================================
+def align(emotions, bio, step_s=DEFAULT_STEP_S, tolerance_s=DEFAULT_TOLERANCE_S):
+    """Tabla fusionada: una fila por paso de `step_s` segundos del tramo con frames analizados."""
+    scores = [c for c in EMOTION_COLUMNS if c in emotions.columns]
+    t0 = np.floor(emotions['timestamp'].iloc[0])
+    bins = ((emotions['timestamp'].to_numpy() - t0) // step_s).astype(np.int64)
+    # Medias por paso con np.bincount (una pasada por columna); solo se conservan los pasos con frames
+    counts = np.bincount(bins)
+    used = np.flatnonzero(counts)
+    fused = {'timestamp': t0 + used * step_s + step_s / 2, 't_rel': used * step_s}
+    for c in scores:
+        fused[c] = np.bincount(bins, weights=emotions[c].to_numpy(dtype=np.float64))[used] / counts[used]
+    fused['frames'] = counts[used]
+    if 'origen' in emotions.columns:
+        fused['frames_inferidos'] = np.bincount(bins, weights=(emotions['origen'] == 'inferido').to_numpy())[used].astype(np.int64)
+    fused['emocion_dominante'] = np.array(scores)[np.argmax(np.column_stack([fused[c] for c in scores]), axis=1)]
+    fused = pd.DataFrame(fused)
+    if bio.empty:
+        for c in BIOSIGNAL_COLUMNS:
+            fused[c] = np.nan
+        return fused
+    return pd.merge_asof(fused, bio, on='timestamp', direction='nearest', tolerance=tolerance_s)
+
+def fuse_files(emotions_csv, biomedidas_csv, step_s=DEFAULT_STEP_S, tolerance_s=DEFAULT_TOLERANCE_S,
+               capture_fps=DEFAULT_CAPTURE_FPS, cache_dir=FUSION_CACHE_DIR):
+    """Fusiona una sesión, usando la caché en disco si las entradas no han cambiado. Devuelve (tabla, desde_caché)."""
+    frames_dir = os.path.dirname(os.path.abspath(emotions_csv))
+    inputs = [emotions_csv, biomedidas_csv, os.path.join(frames_dir, 'frame_index.bin')]
+    key = hashlib.blake2b(repr((FUSION_VERSION, step_s, tolerance_s, capture_fps,
+                                [file_hash(p) if p and os.path.exists(p) else None for p in inputs])).encode(), digest_size=16).hexdigest()
+    cache_path = os.path.join(cache_dir, f"{key}.pkl") if cache_dir else None
+    if cache_path and os.path.exists(cache_path):
+        return pd.read_pickle(cache_path), True
+    emotions = load_emotions(emotions_csv, capture_fps)
+    if emotions.empty:
+        raise ValueError(f"No hay frames con hora en {emotions_csv}.")
+    bio = load_biomedidas(biomedidas_csv) if biomedidas_csv and os.path.exists(biomedidas_csv) else pd.DataFrame()
+    fused = align(emotions, bio, step_s, tolerance_s)
+    fused.attrs['time_source'] = emotions.attrs['time_source']
+    if cache_path:
+        os.makedirs(cache_dir, exist_ok=True)
+        partial = cache_path + '.tmp'
+        fused.to_pickle(partial)
+        os.replace(partial, cache_path)
+    return fused, False
+
+def fuse_session(session_id, catalog=None, **kwargs):
+    """Fusiona una sesión del catálogo (necesita su CSV de emociones; biomedidas si las hay)."""
+    catalog = catalog or session_catalog.get_catalog()
+    emotions_csv = catalog.artifact(session_id, 'emotions')
+    if not emotions_csv or not os.path.exists(emotions_csv):
+        raise ValueError(f"La sesión '{session_id}' no tiene análisis emocional en el catálogo.")
+    return fuse_files(emotions_csv, catalog.artifact(session_id, 'biomedidas'), **kwargs)
+
+def fuse_sessions(session_ids, catalog=None, **kwargs):
+    """Fusiona un lote de sesiones. Devuelve ({sesión: tabla}, {sesión: error}, nº servidas desde la caché)."""
+    results, errors, cached = {}, {}, 0
+    for session_id in session_ids:
+        try:
+            results[session_id], hit = fuse_session(session_id, catalog, **kwargs)
+            cached += hit
+        except Exception as e:
+            errors[session_id] = str(e)
+    return results, errors, cached
+
+def summarize(fused):
+    """Resumen legible: reparto de la emoción dominante y bioseñales medias con cada emoción."""
+    lines = [f"{len(fused)} s fusionados ({int(fused['frames'].sum())} frames; hora de los frames: {fused.attrs.get('time_source', '?')})."]
+    channels = [c for c in BIOSIGNAL_COLUMNS if c in fused.columns and fused[c].notna().any()]
+    by_emotion = fused.groupby('emocion_dominante')
+    share = by_emotion.size().sort_values(ascending=False) / len(fused) * 100
+    means = by_emotion[channels].mean() if channels else None
+    for emotion, pct in share.items():
+        extra = ", ".join(f"{c} {means.loc[emotion, c]:.1f}" for c in channels if pd.notna(means.loc[emotion, c])) if channels else ""
+        lines.append(f" - {emotion}: {pct:.0f}% del tiempo" + (f" ({extra})" if extra else ""))
+    if not channels:
+        lines.append("⚠️ Sin biomedidas que coincidan en el tiempo con los frames.")
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fusión temporal de emoción facial y bioseñales por sesión.")
+    parser.add_argument("sessions", nargs="*", help="IDs de sesión del catálogo (por defecto, todas las que tienen análisis emocional).")
+    parser.add_argument("--step", type=float, default=DEFAULT_STEP_S, help="Paso de la línea de tiempo común (s).")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE_S, help="Distancia máxima a la lectura de biomedidas más cercana (s).")
+    parser.add_argument("--output", help="Carpeta donde guardar un CSV fusionado por sesión.")
+    args = parser.parse_args()
+
+    catalog = session_catalog.get_catalog()
+    session_ids = args.sessions or catalog.list_sessions('emotions')
+    t0 = time.monotonic()
+    results, errors, cached = fuse_sessions(session_ids, catalog, step_s=args.step, tolerance_s=args.tolerance)
+    elapsed = time.monotonic() - t0
+    for session_id, error in errors.items():
+        print(f"❌ {session_id}: {error}")
+    if args.output:
+        os.makedirs(args.output, exist_ok=True)
+        for session_id, fused in results.items():
+            fused.to_csv(os.path.join(args.output, f"{session_id}_fusion.csv"), sep=';', index=False)
+    print(f"✅ {len(results)} sesiones fusionadas en {elapsed:.2f} s ({cached} desde la caché, {len(errors)} con error).")
+    sys.exit(1 if errors and not results else 0)
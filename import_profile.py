@@ -0,0 +1,107 @@
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+# ===============================================================
+# --- PERFIL DEL TIEMPO DE IMPORTACIÓN ---
+# ===============================================================
+# Mide en un proceso nuevo (arranque en frío) cuánto cuesta importar cada módulo del proyecto con
+# 'python -X importtime' y lista sus importaciones directas más caras. Con --save se guarda una
+# referencia y con --baseline se compara contra ella: si un módulo tarda más de un TOLERANCE por
+# encima de la referencia, o aparece una importación directa nueva de más de NEW_IMPORT_MS, el
+# script termina con código 1 (regresión de arranque).
+#
+#   python3 import_profile.py                                   (módulos por defecto)
+#   python3 import_profile.py app_tesis --save perfil.json
+#   python3 import_profile.py --baseline perfil.json
+
+DEFAULT_MODULES = ('app_tesis', 'analizar_emocion', 'receptor_controlado', 'orquestador', 'fusion')
+DEFAULT_TOP = 10
+TOLERANCE = 0.25        # Aumento relativo del tiempo total que se considera regresión
+MIN_REGRESSION_MS = 50  # ...siempre que además supere estos milisegundos (evita ruido en módulos ligeros)
+NEW_IMPORT_MS = 20      # Importación directa nueva que se considera regresión
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def parse_importtime(stderr, module):
+    """(total_ms del módulo, {importación directa: ms acumulados}) a partir de la salida de -X importtime."""
+    direct, total = {}, None
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        try:
+            _, cumulative, name = line[len("import time:"):].split("|", 2)
+            cumulative = int(cumulative) / 1000
+        except ValueError:
+            continue
+        name = name[1:]
+        depth = (len(name) - len(name.lstrip())) // 2
+        name = name.strip()
+        if depth == 0:
+            if name == module:
+                total = cumulative
+                break
+            direct = {}
+        elif depth == 1:
+            direct[name] = cumulative
+    return total, direct
+
+def profile_module(module):
+    """Importa `module` en un intérprete nuevo y devuelve {'total_ms', 'imports'} o {'error'}."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=PROJECT_DIR,
+                          capture_output=True, text=True, encoding='utf-8', errors='replace')
+    total, direct = parse_importtime(proc.stderr, module)
+    if proc.returncode != 0 or total is None:
+        error = [l for l in proc.stderr.splitlines() if not l.startswith("import time:")]
+        return {'error': (error[-1] if error else f"código {proc.returncode}")}
+    return {'total_ms': round(total, 1), 'imports': {k: round(v, 1) for k, v in direct.items()}}
+
+def regressions(profile, baseline):
+    """Lista de avisos comparando con una referencia guardada con --save."""
+    found = []
+    for module, current in profile.items():
+        ref = baseline.get(module)
+        if not ref or 'total_ms' not in ref or 'total_ms' not in current:
+            continue
+        growth = current['total_ms'] - ref['total_ms']
+        if growth > MIN_REGRESSION_MS and growth > TOLERANCE * ref['total_ms']:
+            found.append(f"{module}: {ref['total_ms']:.0f} ms -> {current['total_ms']:.0f} ms")
+        for name, ms in current['imports'].items():
+            if name not in ref['imports'] and ms > NEW_IMPORT_MS:
+                found.append(f"{module}: nueva importación '{name}' ({ms:.0f} ms)")
+    return found
+
+def format_profile(profile, top=DEFAULT_TOP):
+    lines = []
+    for module, result in profile.items():
+        if 'error' in result:
+            lines.append(f"❌ {module}: no se pudo importar ({result['error']})")
+            continue
+        lines.append(f"📦 {module}: {result['total_ms']:.0f} ms")
+        for name, ms in sorted(result['imports'].items(), key=lambda kv: -kv[1])[:top]:
+            lines.append(f"   {ms:>8.1f} ms  {name}")
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Perfil del tiempo de importación (arranque en frío) de los módulos del proyecto.")
+    parser.add_argument("modules", nargs="*", default=list(DEFAULT_MODULES))
+    parser.add_argument("--top", type=int, default=DEFAULT_TOP, help="Importaciones directas que se listan por módulo.")
+    parser.add_argument("--save", help="Guarda el perfil en este JSON (referencia para --baseline).")
+    parser.add_argument("--baseline", help="Compara con un perfil guardado y termina con código 1 si hay regresiones.")
+    args = parser.parse_args()
+
+    profile = {m: profile_module(m) for m in args.modules}
+    print(format_profile(profile, args.top))
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(profile, f, indent=1, ensure_ascii=False)
+        print(f"💾 Perfil guardado en {args.save}")
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            found = regressions(profile, json.load(f))
+        for warning in found:
+            print(f"⚠️ Regresión de arranque: {warning}")
+        if found:
+            sys.exit(1)
+        print("✅ Sin regresiones respecto a la referencia.")
@@ -0,0 +1,88 @@
+import json
+import time
+import threading
+import numpy as np
+from biopayload import is_binary_payload, decode_payload
+
+# ===============================================================
+# --- BUFFER EN MEMORIA DE BIOSEÑALES EN DIRECTO ---
+# ===============================================================
+# El hilo MQTT de app_tesis.py escribe cada muestra recibida en arrays de NumPy preasignados
+# (uno por canal) de capacidad fija, y el panel en directo lee las últimas muestras a ritmo fijo.
+# La memoria y el coste de dibujar no crecen con la duración de la sesión: al llenarse, las
+# muestras nuevas sobrescriben las más antiguas. Las lecturas "ND" se guardan como NaN.
+
+LIVE_CHANNELS = ('hr', 'temp', 'gsr', 'spo2')
+DEFAULT_CAPACITY = 36000   # Muestras por canal (1 h a 10 Hz; ~1.4 MB en total)
+
+class LiveSignalBuffer:
+    """Buffer circular de capacidad fija con un array float64 por canal más el timestamp (epoch, s)."""
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, channels=LIVE_CHANNELS):
+        self.capacity = int(capacity)
+        self.channels = tuple(channels)
+        self.timestamp = np.full(self.capacity, np.nan)
+        self.data = {c: np.full(self.capacity, np.nan) for c in self.channels}
+        self.total = 0  # Muestras escritas desde el inicio (posición absoluta)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+    def append(self, timestamp, **columns):
+        """Añade n muestras (arrays de igual longitud); los canales que no vienen quedan en NaN."""
+        timestamp = np.asarray(timestamp, dtype=np.float64).ravel()
+        n = len(timestamp)
+        if n == 0:
+            return
+        with self._lock:
+            skip = max(0, n - self.capacity)
+            positions = (self.total + skip + np.arange(n - skip)) % self.capacity
+            self.timestamp[positions] = timestamp[skip:]
+            for c in self.channels:
+                values = columns.get(c)
+                self.data[c][positions] = np.nan if values is None else np.asarray(values, dtype=np.float64).ravel()[skip:]
+            self.total += n
+
+    def append_record(self, record):
+        """Añade una muestra JSON del ESP32 (dict); 'ND' y los valores no numéricos pasan a NaN."""
+        def value(key):
+            try:
+                return float(record.get(key))
+            except (TypeError, ValueError):
+                return np.nan
+        timestamp = value('timestamp')
+        # Sin timestamp NTP en la trama se usa la hora de recepción
+        self.append([timestamp if np.isfinite(timestamp) else time.time()], **{c: [value(c)] for c in self.channels})
+
+    def append_payload(self, payload):
+        """Añade una trama de biomedidas (JSON o binaria) y devuelve el nº de muestras añadidas."""
+        if is_binary_payload(payload):
+            samples = decode_payload(payload)
+            self.append(samples['timestamp'], **{c: samples[c] for c in self.channels})
+            return len(samples)
+        record = json.loads(payload.decode('utf-8'))
+        if not isinstance(record, dict):
+            raise ValueError("La trama de datos no es un objeto JSON.")
+        self.append_record(record)
+        return 1
+
+    def latest(self, n=None, seconds=None):
+        """Copia de las últimas muestras en orden cronológico: {'timestamp': ..., canal: ...}.
+        Con `seconds` se limita a las recibidas en los últimos `seconds` segundos de timestamp."""
+        with self._lock:
+            count = len(self) if n is None else min(int(n), len(self))
+            positions = (self.total - count + np.arange(count)) % self.capacity
+            result = {'timestamp': self.timestamp[positions]}
+            result.update({c: self.data[c][positions] for c in self.channels})
+        if seconds is not None and count and np.isfinite(result['timestamp']).any():
+            keep = result['timestamp'] >= np.nanmax(result['timestamp']) - seconds
+            result = {k: v[keep] for k, v in result.items()}
+        return result
+
+    def clear(self):
+        with self._lock:
+            self.total = 0
+            self.timestamp[:] = np.nan
+            for c in self.channels:
+                self.data[c][:] = np.nan
@@ -0,0 +1,447 @@
+import os
+import sys
+import time
+import queue
+import shutil
+import sqlite3
+import hashlib
+import argparse
+import threading
+import subprocess
+from watchdog.observers import Observer
+from watchdog.events import FileSystemEventHandler
+import emotion_service
+import session_catalog
+import tracing
+import control_client
+
+# ===============================================================
+# --- CONFIGURACIÓN ---
+# ===============================================================
+WATCH_DIR = "/home/alvar/ACE-Step/outputs"
+DEST_DIR = "/mnt/c/Users/alvar/Desktop/DOCTORADO/PROGRAMAS/musica_generada"
+FRAMES_DIR = "/mnt/c/Users/alvar/Desktop/DOCTORADO/PROGRAMAS/frames"
+ANALYZER_SCRIPT = "/home/alvar/analizar_emocion.py"
+CAPTURE_SCRIPT_WIN = "C:\\Users\\alvar\\Desktop\\DOCTORADO\\PROGRAMAS\\capture_10s.py"
+FRAMES_DIR_WIN = "C:\\Users\\alvar\\Desktop\\DOCTORADO\\PROGRAMAS\\frames"
+MUSIC_DIR_WIN = "C:\\Users\\alvar\\Desktop\\DOCTORADO\\PROGRAMAS\\musica_generada"
+POWERSHELL_PATH = "/mnt/c/Windows/System32/WindowsPowerShell/v1.0/powershell.exe"
+CAPTURE_ARGS = "--camera_index 1 --delay 3"
+JOBS_DB = os.environ.get('TESIS_JOBS', '/home/alvar/tesis_trabajos.db')
+AUDIO_EXTENSIONS = ('.wav',)
+QUIET_S = 2.0            # Sin eventos de escritura durante este tiempo, el archivo se da por terminado
+MAX_QUIET_CHECKS = 5     # Si la cabecera WAV nunca cuadra, se acepta tras este nº de periodos sin crecer
+ANALYSIS_WORKERS = 1     # Análisis simultáneos (el servicio residente los atiende de uno en uno)
+
+# ===============================================================
+# --- ORQUESTADOR DE SESIONES ---
+# ===============================================================
+# Sustituye al bucle de script_global.sh: cada canción nueva de ACE-Step es un trabajo que pasa por
+#
+#   copia -> captura (con START/STOP al receptor) -> análisis -> hecho
+#
+# Cada etapa tiene su cola y su hilo: la captura es una sola (hay una cámara), pero la copia de la
+# canción siguiente y el análisis de la anterior se solapan con ella. Todo se dispara por eventos:
+#
+#   - canción nueva: eventos de watchdog (creación, escritura, cierre, renombrado) y un temporizador
+#     que se rearma con cada escritura; el archivo se acepta cuando deja de crecer y, si es WAV, su
+#     cabecera RIFF ya declara el tamaño final
+#   - inicio de la captura y carpeta de frames: líneas 'EVENTO ...' que capture_10s.py escribe en su
+#     salida (se lee la tubería del proceso; sin sondear start_signal.txt ni la carpeta de frames)
+#   - fin de la captura: fin del proceso
+#   - START/STOP al receptor: por la conexión persistente de control_client.py, que espera su acuse
+#
+# Si el servicio de análisis está en marcha, la sesión se analiza en streaming durante la propia
+# captura y la etapa de análisis solo recoge el resultado (o analiza la sesión completa si falló).
+#
+# Los trabajos se guardan en SQLite (JOBS_DB): tras un reinicio se reanudan en la etapa en la que
+# estaban, y una canción con el mismo contenido (hash) que otra ya procesada se descarta.
+#
+#   python3 orquestador.py watch                    (vigila WATCH_DIR; Ctrl+C para salir)
+#   python3 orquestador.py add cancion.wav [...]    (procesa las canciones indicadas y termina)
+#   python3 orquestador.py status
+
+STAGES = ('copia', 'captura', 'analisis', 'hecho')
+EVENT_PREFIX = "EVENTO "
+
+def log(message):
+    # Una sola escritura por línea: los hilos de las etapas escriben a la vez
+    sys.stdout.write(f"[{time.strftime('%H:%M:%S')}] {message}\n")
+    sys.stdout.flush()
+
+def content_hash(path):
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+def wav_complete(path):
+    """True si no es un WAV o si la cabecera RIFF declara exactamente el tamaño actual del archivo."""
+    try:
+        with open(path, 'rb') as f:
+            header = f.read(12)
+        size = os.path.getsize(path)
+    except OSError:
+        return False
+    if len(header) < 12 or header[:4] != b'RIFF' or header[8:12] != b'WAVE':
+        return not path.lower().endswith('.wav') and size > 0
+    return int.from_bytes(header[4:8], 'little') + 8 == size
+
+def windows_to_wsl(path):
+    """C:\\ruta\\a -> /mnt/c/ruta/a"""
+    drive, rest = path[0].lower(), path[2:].replace('\\', '/')
+    return f"/mnt/{drive}{rest}"
+
+# ===============================================================
+# --- DETECCIÓN DE ARCHIVOS TERMINADOS ---
+# ===============================================================
+class StableFileWatcher(FileSystemEventHandler):
+    """Llama a `callback(ruta)` una vez por archivo nuevo, cuando ha terminado de escribirse."""
+
+    def __init__(self, callback, extensions=AUDIO_EXTENSIONS, quiet_s=QUIET_S):
+        self.callback = callback
+        self.extensions = extensions
+        self.quiet_s = quiet_s
+        self._timers = {}
+        self._sizes = {}
+        self._quiet_checks = {}
+        self._delivered = set()
+        self._lock = threading.Lock()
+
+    def _wanted(self, path):
+        return path.lower().endswith(self.extensions) and not os.path.basename(path).startswith('.')
+
+    def _touch(self, path):
+        if not self._wanted(path):
+            return
+        with self._lock:
+            if path in self._delivered:
+                return
+            timer = self._timers.pop(path, None)
+            if timer is not None:
+                timer.cancel()
+            try:
+                self._sizes[path] = os.path.getsize(path)
+            except OSError:
+                return
+            timer = self._timers[path] = threading.Timer(self.quiet_s, self._check, args=(path,))
+            timer.daemon = True
+            timer.start()
+
+    def _check(self, path):
+        with self._lock:
+            self._timers.pop(path, None)
+            if path in self._delivered:
+                return
+            try:
+                grew = os.path.getsize(path) != self._sizes.get(path)
+            except OSError:
+                return
+            quiet = 0 if grew else self._quiet_checks.get(path, 0) + 1
+            self._quiet_checks[path] = quiet
+            ready = quiet > 0 and (wav_complete(path) or quiet >= MAX_QUIET_CHECKS)
+            if ready:
+                if not wav_complete(path):
+                    log(f"⚠️ {os.path.basename(path)} no crece desde hace {quiet * self.quiet_s:.0f} s pero su cabecera WAV no cuadra; se acepta igualmente.")
+                self._delivered.add(path)
+        if ready:
+            self.callback(path)
+        else:
+            self._touch(path)
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self._touch(event.src_path)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self._touch(event.src_path)
+
+    def on_moved(self, event):
+        if not event.is_directory:
+            self._touch(event.dest_path)
+
+    def on_closed(self, event):
+        # Cierre tras escribir (inotify IN_CLOSE_WRITE): se comprueba ya, sin esperar al temporizador
+        if not event.is_directory and self._wanted(event.src_path):
+            with self._lock:
+                timer = self._timers.pop(event.src_path, None)
+                if timer is not None:
+                    timer.cancel()
+            self._check(event.src_path)
+
+# ===============================================================
+# --- COLA PERSISTENTE DE TRABAJOS ---
+# ===============================================================
+class JobStore:
+    """Trabajos en SQLite: una fila por canción (clave: hash del contenido) con su etapa actual."""
+
+    def __init__(self, path=JOBS_DB):
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""CREATE TABLE IF NOT EXISTS jobs (
+                hash TEXT PRIMARY KEY, source TEXT NOT NULL, session_id TEXT NOT NULL UNIQUE,
+                stage TEXT NOT NULL, error TEXT, frames_dir TEXT, created REAL NOT NULL, updated REAL NOT NULL)""")
+
+    def add(self, source, digest):
+        """Crea el trabajo y devuelve su ID de sesión, o None si esa canción (mismo contenido) ya existe."""
+        session_id = os.path.splitext(os.path.basename(source))[0]
+        now = time.time()
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM jobs WHERE hash = ?", (digest,)).fetchone():
+                return None
+            if self._conn.execute("SELECT 1 FROM jobs WHERE session_id = ?", (session_id,)).fetchone():
+                # Mismo nombre con otro contenido: se distingue la sesión con el inicio del hash
+                session_id = f"{session_id}_{digest[:8]}"
+            self._conn.execute("INSERT INTO jobs (hash, source, session_id, stage, created, updated) VALUES (?, ?, ?, ?, ?, ?)",
+                               (digest, source, session_id, STAGES[0], now, now))
+        return session_id
+
+    def update(self, session_id, **fields):
+        fields['updated'] = time.time()
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {', '.join(f'{k} = ?' for k in fields)} WHERE session_id = ?",
+                               (*fields.values(), session_id))
+
+    def get(self, session_id):
+        with self._lock:
+            cursor = self._conn.execute("SELECT * FROM jobs WHERE session_id = ?", (session_id,))
+            row = cursor.fetchone()
+            return dict(zip([d[0] for d in cursor.description], row)) if row else None
+
+    def unfinished(self):
+        with self._lock:
+            cursor = self._conn.execute("SELECT * FROM jobs WHERE stage != 'hecho' ORDER BY created")
+            return [dict(zip([d[0] for d in cursor.description], row)) for row in cursor.fetchall()]
+
+    def all(self):
+        with self._lock:
+            cursor = self._conn.execute("SELECT * FROM jobs ORDER BY created")
+            return [dict(zip([d[0] for d in cursor.description], row)) for row in cursor.fetchall()]
+
+# ===============================================================
+# --- ETAPAS ---
+# ===============================================================
+class Orchestrator:
+    """Una cola y un hilo por etapa; la captura tiene un único hilo (una cámara)."""
+
+    def __init__(self, jobs, analysis_workers=ANALYSIS_WORKERS):
+        self.jobs = jobs
+        self.queues = {stage: queue.Queue() for stage in STAGES[:-1]}
+        self.idle = threading.Condition()
+        self.active = 0
+        self.stream_jobs = {}
+        workers = {'copia': 1, 'captura': 1, 'analisis': max(1, analysis_workers)}
+        self.threads = [threading.Thread(target=self._run, args=(stage,), daemon=True)
+                        for stage, n in workers.items() for _ in range(n)]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, path):
+        """Registra una canción nueva; devuelve su ID de sesión o None si es un duplicado."""
+        try:
+            digest = content_hash(path)
+        except OSError as e:
+            log(f"❌ No se pudo leer {path}: {e}")
+            return None
+        session_id = self.jobs.add(os.path.abspath(path), digest)
+        if session_id is None:
+            log(f"♻️ {os.path.basename(path)} ya se procesó (mismo contenido); se descarta.")
+            return None
+        log(f"🎵 Nueva canción: {os.path.basename(path)} -> sesión '{session_id}'.")
+        self._enqueue(STAGES[0], session_id)
+        return session_id
+
+    def resume(self):
+        """Vuelve a encolar los trabajos que quedaron a medias (en la etapa en la que estaban)."""
+        pending = self.jobs.unfinished()
+        for job in pending:
+            log(f"⏩ Reanudando la sesión '{job['session_id']}' en la etapa '{job['stage']}'.")
+            self._enqueue(job['stage'], job['session_id'])
+        return len(pending)
+
+    def _enqueue(self, stage, session_id):
+        with self.idle:
+            self.active += 1
+        self.queues[stage].put(session_id)
+
+    def wait_idle(self):
+        with self.idle:
+            self.idle.wait_for(lambda: self.active == 0)
+
+    def _run(self, stage):
+        handler = {'copia': self.copy, 'captura': self.capture, 'analisis': self.analyze}[stage]
+        next_stage = STAGES[STAGES.index(stage) + 1]
+        while True:
+            session_id = self.queues[stage].get()
+            job = self.jobs.get(session_id)
+            t0 = time.monotonic()
+            try:
+                handler(job)
+            except Exception as e:
+                tracing.record(session_id, stage, time.monotonic() - t0, ok=False)
+                log(f"❌ Sesión '{session_id}': falló la etapa '{stage}': {e}")
+                self.jobs.update(session_id, error=f"{stage}: {e}")
+                with self.idle:
+                    self.active -= 1
+                    self.idle.notify_all()
+                continue
+            session_catalog.safe_record_timing(session_id, stage, time.monotonic() - t0)
+            tracing.record(session_id, stage, time.monotonic() - t0)
+            self.jobs.update(session_id, stage=next_stage, error=None)
+            if next_stage in self.queues:
+                self.queues[next_stage].put(session_id)
+            else:
+                log(f"🎉 Sesión '{session_id}' completada.")
+                with self.idle:
+                    self.active -= 1
+                    self.idle.notify_all()
+
+    def copy(self, job):
+        dest = os.path.join(DEST_DIR, os.path.basename(job['source']))
+        if job['session_id'] != os.path.splitext(os.path.basename(job['source']))[0]:
+            dest = os.path.join(DEST_DIR, job['session_id'] + os.path.splitext(job['source'])[1])
+        partial = os.path.join(DEST_DIR, '.' + os.path.basename(dest))
+        shutil.copyfile(job['source'], partial)
+        os.replace(partial, dest)
+        session_catalog.safe_register(job['session_id'], 'audio', dest)
+        log(f"📁 '{job['session_id']}': canción copiada a {dest}.")
+
+    def capture(self, job):
+        session_id = job['session_id']
+        audio_win = MUSIC_DIR_WIN + "\\" + os.path.basename(session_catalog.find_audio(session_id, DEST_DIR) or job['source'])
+        command = (f"python -u '{CAPTURE_SCRIPT_WIN}' --output '{FRAMES_DIR_WIN}\\{session_id}' --audio '{audio_win}' "
+                   f"{CAPTURE_ARGS} --session_id '{session_id}'")
+        if emotion_service.is_available():
+            self.start_stream_analysis(session_id)
+        log(f"🎥 '{session_id}': lanzando la captura en Windows...")
+        process = subprocess.Popen([POWERSHELL_PATH, "-Command", command], stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                   text=True, encoding='utf-8', errors='replace', bufsize=1)
+        launched, started = time.monotonic(), False
+        first_line = True
+        try:
+            for line in process.stdout:
+                line = line.rstrip()
+                if first_line:
+                    # Primera salida del script: PowerShell y Python de Windows ya arrancados
+                    tracing.record(session_id, 'arranque_powershell', time.monotonic() - launched)
+                    first_line = False
+                if not line.startswith(EVENT_PREFIX):
+                    print(f"   [captura] {line}", flush=True)
+                    continue
+                event, _, value = line[len(EVENT_PREFIX):].partition(' ')
+                if event == 'frames_dir':
+                    frames_dir = windows_to_wsl(value.strip())
+                    self.jobs.update(session_id, frames_dir=frames_dir)
+                    session_catalog.safe_register(session_id, 'frames', frames_dir)
+                elif event == 'captura_iniciada':
+                    tracing.record(session_id, 'lanzamiento_a_captura', time.monotonic() - launched)
+                    started = True
+                    result = self.send_control("start", session_id)
+                    if result is not None:
+                        status = "▶️" if control_client.confirmed(result) else "⚠️"
+                        log(f"{status} '{session_id}': captura iniciada; {control_client.format_result(result)}.")
+            process.wait()
+        finally:
+            # Si algo falla a mitad, la captura no queda huérfana ni bloqueada con la salida sin leer
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            if started:
+                result = self.send_control("stop", session_id)
+                if result is not None:
+                    log(f"⏹️ '{session_id}': captura terminada; {control_client.format_result(result)}.")
+        if process.returncode != 0:
+            raise RuntimeError(f"la captura terminó con código {process.returncode}")
+        if not self.jobs.get(session_id)['frames_dir']:
+            raise RuntimeError("la captura no indicó su carpeta de frames")
+
+    def send_control(self, command, session_id):
+        """START/STOP al receptor; el resultado es informativo, así que un fallo del bróker se registra y la captura sigue."""
+        try:
+            return control_client.get_control_client().send(command, session_id)
+        except (ConnectionError, OSError) as e:
+            log(f"⚠️ '{session_id}': no se pudo enviar {command.upper()} al receptor: {e}")
+            return None
+
+    def start_stream_analysis(self, session_id):
+        stream = {'result': None, 'error': None}
+        def run():
+            try:
+                stream['result'] = emotion_service.analyze_via_service(os.path.join(FRAMES_DIR, session_id), mode='stream')
+            except OSError as e:
+                stream['error'] = e
+        stream['thread'] = threading.Thread(target=run, daemon=True)
+        stream['thread'].start()
+        self.stream_jobs[session_id] = stream
+        log(f"📡 '{session_id}': análisis en streaming iniciado.")
+
+    def analyze(self, job):
+        frames_dir = job['frames_dir']
+        stream = self.stream_jobs.pop(job['session_id'], None)
+        if stream is not None:
+            stream['thread'].join(emotion_service.CLIENT_TIMEOUT_S)
+            if stream['thread'].is_alive():
+                # El servicio sigue con el streaming de esta carpeta: un segundo análisis competiría por el mismo CSV
+                raise RuntimeError(f"el análisis en streaming no terminó en {emotion_service.CLIENT_TIMEOUT_S} s")
+            if stream['result'] is not None and stream['result'].get('ok'):
+                log(f"📡 '{job['session_id']}': análisis en streaming completado.")
+                return
+            log(f"⚠️ '{job['session_id']}': el streaming no terminó bien ({stream['error'] or (stream['result'] or {}).get('error', 'sin resultados')}); análisis completo.")
+        log(f"📊 '{job['session_id']}': análisis emocional de {frames_dir}...")
+        # Servicio residente (modelos ya cargados); si no está en marcha, el analizador en un subproceso
+        try:
+            response = emotion_service.analyze_via_service(frames_dir)
+        except OSError:
+            result = subprocess.run([sys.executable, ANALYZER_SCRIPT, "--input", frames_dir], capture_output=True, text=True)
+            if result.returncode != 0:
+                raise RuntimeError(result.stderr.strip()[-500:] or f"el analizador terminó con código {result.returncode}")
+            return
+        if not response.get('ok'):
+            raise RuntimeError(response.get('error', 'el servicio no devolvió resultados'))
+
+def main():
+    parser = argparse.ArgumentParser(description="Orquestador de sesiones: copia, captura y análisis de las canciones de ACE-Step.")
+    parser.add_argument("--db", default=JOBS_DB, help="Base de datos de trabajos.")
+    sub = parser.add_subparsers(dest="mode", required=True)
+    p = sub.add_parser("watch", help="Vigila la carpeta de ACE-Step y procesa cada canción nueva.")
+    p.add_argument("--dir", default=WATCH_DIR)
+    p = sub.add_parser("add", help="Procesa las canciones indicadas y termina.")
+    p.add_argument("files", nargs="+")
+    sub.add_parser("status", help="Muestra los trabajos y su etapa.")
+    args = parser.parse_args()
+
+    jobs = JobStore(args.db)
+    if args.mode == "status":
+        for job in jobs.all():
+            error = f" ❌ {job['error']}" if job['error'] else ""
+            print(f"{job['session_id']}: {job['stage']}{error}")
+        return
+    orchestrator = Orchestrator(jobs)
+    orchestrator.resume()
+    if args.mode == "add":
+        for path in args.files:
+            if not os.path.isfile(path):
+                log(f"❌ El archivo '{path}' no existe.")
+                continue
+            orchestrator.submit(path)
+        orchestrator.wait_idle()
+        return
+    observer = Observer()
+    observer.schedule(StableFileWatcher(orchestrator.submit), args.dir, recursive=False)
+    observer.start()
+    log(f"👀 Vigilando {args.dir}. Ctrl+C para salir.")
+    try:
+        while observer.is_alive():
+            observer.join(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        observer.stop()
+        observer.join()
+
+if __name__ == "__main__":
+    main()
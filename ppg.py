@@ -0,0 +1,241 @@
+import os
+import struct
+import threading
+import numpy as np
+
+# ===============================================================
+# --- BLOQUES DE PPG EN BRUTO ---
+# ===============================================================
+# En modo PPG en bruto el ESP32 publica en tesis/<device_id>/ppg cada bloque de
+# SAMPLES_BUFFER_SIZE lecturas IR/rojo del MAX30105, sin procesar:
+#
+#   cabecera (16 bytes): magic 'PG' | versión (uint8) | flags (uint8) | nº de muestras (uint16)
+#                        | frecuencia de muestreo en Hz (uint16) | epoch NTP (uint32) | millis() (uint32)
+#   datos:               IR (uint32 x N) seguido de rojo (uint32 x N)
+#
+# El receptor guarda los bloques tal cual (ppg_raw.bin) y estima HR, SpO2 e
+# intervalos entre latidos por ventanas con NumPy/SciPy.
+
+PPG_MAGIC = b'PG'
+PPG_VERSION = 1
+PPG_HEADER = struct.Struct('<2sBBHHII')
+PPG_ESTIMATE_FIELDS = ['timestamp', 'hr', 'spo2', 'ibi_ms', 'ibi_sd_ms', 'beats', 'quality']
+
+DEFAULT_WINDOW_S = 8.0      # Longitud de la ventana de estimación
+DEFAULT_HOP_S = 1.0         # Cada cuánto se emite una estimación
+DEFAULT_BUFFER_S = 60.0     # Historia guardada por dispositivo en el buffer circular
+MIN_FINGER_DC = 50000       # Por debajo de este nivel de IR no hay dedo sobre el sensor
+
+def encode_ppg_block(ir, red, sample_rate, epoch, millis=0):
+    """Codifica un bloque IR/rojo como lo publica el ESP32 (útil para pruebas y reproducción)."""
+    ir = np.asarray(ir, dtype='<u4')
+    red = np.asarray(red, dtype='<u4')
+    if len(ir) != len(red):
+        raise ValueError("IR y rojo deben tener la misma longitud.")
+    return PPG_HEADER.pack(PPG_MAGIC, PPG_VERSION, 0, len(ir), int(sample_rate), int(epoch), int(millis)) + ir.tobytes() + red.tobytes()
+
+def decode_ppg_block(payload, offset=0):
+    """
+    Decodifica un bloque. Devuelve (cabecera, ir, rojo, tamaño_en_bytes); ir y rojo son vistas
+    sobre el buffer recibido, sin copias.
+    """
+    if len(payload) - offset < PPG_HEADER.size:
+        raise ValueError("Bloque PPG demasiado corto.")
+    magic, version, flags, count, sample_rate, epoch, millis = PPG_HEADER.unpack_from(payload, offset)
+    if magic != PPG_MAGIC or version != PPG_VERSION:
+        raise ValueError("Bloque PPG no reconocido.")
+    size = PPG_HEADER.size + 8 * count
+    if len(payload) - offset < size:
+        raise ValueError(f"Bloque PPG truncado: se esperaban {size} bytes.")
+    start = offset + PPG_HEADER.size
+    ir = np.frombuffer(payload, dtype='<u4', count=count, offset=start)
+    red = np.frombuffer(payload, dtype='<u4', count=count, offset=start + 4 * count)
+    header = {'count': count, 'sample_rate': sample_rate, 'epoch': epoch, 'millis': millis}
+    return header, ir, red, size
+
+def read_ppg_raw_log(path):
+    """Lee un ppg_raw.bin completo. Devuelve (ir, rojo, frecuencia, lista de cabeceras)."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    headers, irs, reds = [], [], []
+    offset = 0
+    while offset < len(data):
+        try:
+            header, ir, red, size = decode_ppg_block(data, offset)
+        except ValueError:
+            break  # Bloque final incompleto
+        headers.append(header); irs.append(ir); reds.append(red)
+        offset += size
+    sample_rate = headers[0]['sample_rate'] if headers else 0
+    empty = np.empty(0, dtype='<u4')
+    return (np.concatenate(irs) if irs else empty), (np.concatenate(reds) if reds else empty), sample_rate, headers
+
+class PpgRawLog:
+    """Log de solo anexado con los bloques PPG tal y como llegan; se sincroniza con disco al cerrar."""
+
+    def __init__(self, data_dir, basename='ppg_raw'):
+        self.path = os.path.join(data_dir, basename + '.bin')
+        self._file = open(self.path, 'ab')
+        self._lock = threading.Lock()
+
+    def write(self, payload):
+        with self._lock:
+            if self._file is not None:
+                self._file.write(payload)
+
+    def flush(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+
+# ===============================================================
+# --- BUFFER CIRCULAR ---
+# ===============================================================
+class PpgRingBuffer:
+    """Buffer circular de capacidad fija para IR y rojo (dos arrays uint32 preasignados)."""
+
+    def __init__(self, capacity):
+        self.capacity = int(capacity)
+        self.ir = np.zeros(self.capacity, dtype=np.uint32)
+        self.red = np.zeros(self.capacity, dtype=np.uint32)
+        self.total = 0  # Muestras escritas desde el inicio (posición absoluta)
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+    def append(self, ir, red):
+        n = len(ir)
+        if n >= self.capacity:
+            ir, red, n_skip = ir[-self.capacity:], red[-self.capacity:], n - self.capacity
+            self.total += n_skip
+            n = self.capacity
+        start = self.total % self.capacity
+        first = min(n, self.capacity - start)
+        self.ir[start:start + first] = ir[:first]
+        self.red[start:start + first] = red[:first]
+        if first < n:
+            self.ir[:n - first] = ir[first:]
+            self.red[:n - first] = red[first:]
+        self.total += n
+
+    def latest(self, n):
+        """Últimas `n` muestras en orden cronológico (copia contigua solo si la ventana da la vuelta)."""
+        n = min(n, len(self))
+        end = self.total % self.capacity
+        if end >= n:
+            return self.ir[end - n:end], self.red[end - n:end]
+        return (np.concatenate((self.ir[end - n:], self.ir[:end])),
+                np.concatenate((self.red[end - n:], self.red[:end])))
+
+# ===============================================================
+# --- ESTIMACIÓN DE HR / SpO2 ---
+# ===============================================================
+def estimate_window(ir, red, sample_rate):
+    """
+    Estima HR, SpO2 e intervalos entre latidos de una ventana IR/rojo.
+    HR: picos de la señal IR filtrada (0.5-4 Hz). SpO2: cociente de cocientes AC/DC con la
+    misma curva de calibración que el algoritmo de Maxim del firmware.
+    Devuelve un dict con NaN en los valores que no se pueden estimar.
+    """
+    from scipy.signal import butter, sosfiltfilt, find_peaks
+
+    nan = float('nan')
+    result = {'hr': nan, 'spo2': nan, 'ibi_ms': nan, 'ibi_sd_ms': nan, 'beats': 0, 'quality': 0.0}
+    ir = np.asarray(ir, dtype=np.float64)
+    red = np.asarray(red, dtype=np.float64)
+    if len(ir) < 3 * sample_rate or ir.mean() < MIN_FINGER_DC:
+        return result
+
+    sos = butter(2, [0.5, 4.0], btype='bandpass', fs=sample_rate, output='sos')
+    # El PPG tiene los latidos como mínimos de absorción: se invierte para buscar máximos
+    ir_ac = -sosfiltfilt(sos, ir)
+    red_ac = -sosfiltfilt(sos, red)
+
+    # Distancia mínima entre latidos equivalente a 200 lpm
+    peaks, props = find_peaks(ir_ac, distance=max(1, int(sample_rate * 60 / 200)), prominence=0.3 * np.std(ir_ac))
+    if len(peaks) >= 3:
+        ibis = np.diff(peaks) / sample_rate
+        valid = (ibis > 60 / 200) & (ibis < 60 / 40)
+        if valid.sum() >= 2:
+            ibis = ibis[valid]
+            result['ibi_ms'] = float(np.median(ibis) * 1000)
+            result['ibi_sd_ms'] = float(np.std(ibis) * 1000)
+            result['hr'] = float(60.0 / np.median(ibis))
+            result['beats'] = int(len(peaks))
+            result['quality'] = float(valid.mean())
+
+    ac_ir, ac_red = np.std(ir_ac), np.std(red_ac)
+    dc_ir, dc_red = ir.mean(), red.mean()
+    if ac_ir > 0 and dc_red > 0:
+        ratio = (ac_red / dc_red) / (ac_ir / dc_ir)
+        spo2 = -45.060 * ratio ** 2 + 30.354 * ratio + 94.845
+        if 70 <= spo2 <= 100:
+            result['spo2'] = float(spo2)
+    return result
+
+def format_estimate(estimate):
+    """Estimación lista para el CSV: valores redondeados y "ND" donde no se pudo estimar (como el ESP32)."""
+    def fmt(value, digits):
+        return 'ND' if value != value else round(value, digits)
+    return {
+        'timestamp': estimate['timestamp'],
+        'hr': fmt(estimate['hr'], 1),
+        'spo2': fmt(estimate['spo2'], 1),
+        'ibi_ms': fmt(estimate['ibi_ms'], 1),
+        'ibi_sd_ms': fmt(estimate['ibi_sd_ms'], 1),
+        'beats': estimate['beats'],
+        'quality': round(estimate['quality'], 2),
+    }
+
+class PpgEstimator:
+    """Estimación por ventanas para un dispositivo: acumula bloques y emite una estimación cada `hop_s`."""
+
+    def __init__(self, sample_rate, window_s=DEFAULT_WINDOW_S, hop_s=DEFAULT_HOP_S, buffer_s=DEFAULT_BUFFER_S):
+        self.sample_rate = sample_rate
+        self.window = int(window_s * sample_rate)
+        self.hop = int(hop_s * sample_rate)
+        self.buffer = PpgRingBuffer(max(self.window, int(buffer_s * sample_rate)))
+        self._next_at = self.window
+        self._epoch_at_total = None
+
+    def add_block(self, header, ir, red):
+        """Añade un bloque y devuelve las estimaciones nuevas (lista de dicts con PPG_ESTIMATE_FIELDS)."""
+        if header['sample_rate'] != self.sample_rate:
+            raise ValueError(f"Frecuencia de muestreo distinta: {header['sample_rate']} Hz != {self.sample_rate} Hz")
+        # Referencia temporal: epoch del inicio del bloque en la posición absoluta actual
+        self._epoch_at_total = (header['epoch'], self.buffer.total)
+        self.buffer.append(ir, red)
+        results = []
+        while self.buffer.total >= self._next_at:
+            lag = self.buffer.total - self._next_at
+            ir_w, red_w = self.buffer.latest(self.window + lag)
+            estimate = estimate_window(ir_w[:self.window], red_w[:self.window], self.sample_rate)
+            epoch, at_total = self._epoch_at_total
+            estimate['timestamp'] = round(epoch + (self._next_at - at_total) / self.sample_rate, 3)
+            results.append(estimate)
+            self._next_at += self.hop
+        return results
+
+def synthetic_ppg(duration_s, sample_rate=100, hr=72.0, spo2=97.0, noise=0.002, dc=120000, seed=0):
+    """
+    PPG sintético IR/rojo con el ritmo y la saturación indicados (para probar el estimador sin el sensor).
+    La amplitud relativa del rojo se ajusta invirtiendo la curva de calibración de SpO2.
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(duration_s * sample_rate)) / sample_rate
+    phase = 2 * np.pi * hr / 60 * t
+    pulse = np.sin(phase) + 0.4 * np.sin(2 * phase + 0.5)
+    # Raíz de -45.060 R^2 + 30.354 R + 94.845 = spo2 en el rango fisiológico
+    ratio = np.max(np.roots([-45.060, 30.354, 94.845 - spo2]).real)
+    ir = dc * (1 - 0.01 * pulse) + rng.normal(0, noise * dc, len(t))
+    red = 0.8 * dc * (1 - 0.01 * ratio * pulse) + rng.normal(0, noise * dc, len(t))
+    return ir.astype(np.uint32), red.astype(np.uint32)
@@ -1,121 +1,595 @@
 import paho.mqtt.client as mqtt
 import json
 import os
-import pandas as pd
+import numpy as np
+import re
+import time
+import queue
+import threading
+from collections import deque
 from datetime import datetime
-import csv
+from session_writer import open_session_writer, CsvSessionWriter
+from biopayload import is_binary_payload, decode_payload
+from ppg import PPG_ESTIMATE_FIELDS, PpgEstimator, PpgRawLog, decode_ppg_block, format_estimate
+from session_catalog import safe_register, safe_record_timing
+import tracing
 
 # ===============================================================
 # --- CONFIGURACIÓN ---
 # ===============================================================
 BROKER_ADDRESS = "localhost"
 TOPIC = "tesis/biomedidas"
+# Un tópico por dispositivo: tesis/<device_id>/biomedidas (varios ESP32 contra el mismo bróker)
+DEVICE_TOPIC = "tesis/+/biomedidas"
 CONTROL_TOPIC = "tesis/control"
+# Acuses de los comandos con "id" (ver control_client.py): el receptor confirma START/STOP ya ejecutados
+ACK_TOPIC = "tesis/control/ack"
+# Bloques IR/rojo en bruto del MAX30105 (modo PPG en bruto del firmware): tesis/<device_id>/ppg
+PPG_TOPIC = "tesis/+/ppg"
+# Estimación de HR/SpO2 en el servidor: ventana analizada y cada cuánto se emite una estimación
+PPG_WINDOW_S = 8.0
+PPG_HOP_S = 1.0
+# Dispositivo al que se asignan el tópico heredado y los comandos sin 'device_id'
+DEFAULT_DEVICE_ID = "esp32"
 # Directorio base para guardar los datos.
 DATA_DIR_BASE = "/home/alvar/biomedidas"
+# Formatos de salida por sesión: 'csv' (biomedidas.csv) y/o 'bin' (log binario biomedidas.bin)
+OUTPUT_FORMATS = ["csv", "bin"]
+# Escritura por lotes: se vuelca a disco cada BATCH_SIZE muestras o cada FLUSH_INTERVAL_S segundos
+BATCH_SIZE = 200
+FLUSH_INTERVAL_S = 1.0
+# Cada cuántos segundos se imprime el resumen de muestras recibidas (en lugar de un print por muestra)
+STATUS_INTERVAL_S = 5.0
+# Solo se imprime uno de cada N errores repetidos de un mismo dispositivo
+ERROR_LOG_EVERY = 100
+# Cola de ingesta entre el hilo de red de MQTT y el hilo de ingesta. Si se llena, se descartan
+# tramas de datos (nunca comandos) y se contabilizan en las métricas.
+INGEST_QUEUE_SIZE = 20000
+# Comandos que llegan con la cola de ingesta llena: esperan aparte (el hilo de red nunca se bloquea)
+CONTROL_OVERFLOW_SIZE = 100
+# Máximo de tramas que el hilo de ingesta decodifica y reparte de una vez
+INGEST_BATCH = 500
+# Cola de escritura de cada sesión (segmentos ya decodificados). Si el disco de una sesión se atasca,
+# se llena solo la suya: se descartan sus segmentos y las demás sesiones siguen escribiendo.
+SESSION_QUEUE_SIZE = 2000
+# Tópico donde se publican periódicamente las métricas de ingesta (JSON)
+METRICS_TOPIC = "tesis/receptor/metricas"
+# Aviso cuando la cola supera esta fracción de su capacidad
+QUEUE_WARN_FRACTION = 0.5
+
+VALID_ID = re.compile(r'^[A-Za-z0-9_.-]+$')
+
+# ===============================================================
+# --- REGISTRO DE SESIONES ---
+# ===============================================================
+class RecordingSession:
+    """
+    Una grabación activa de un dispositivo, con su propio escritor y su propio hilo de escritura.
+    El hilo de ingesta solo encola segmentos decodificados (submit); escribir, volcar y cerrar
+    ocurren en el hilo de la sesión, así que un disco lento o un fsync atascado no frena a las demás.
+    """
+
+    def __init__(self, device_id, session_id):
+        self.device_id = device_id
+        self.session_id = session_id
+        data_dir_path = os.path.join(DATA_DIR_BASE, session_id)
+        if not os.path.exists(data_dir_path):
+            os.makedirs(data_dir_path, exist_ok=True)
+            print(f"📂 Creado directorio de salida: {data_dir_path}")
+        # El dispositivo por defecto conserva el nombre de siempre (biomedidas.csv)
+        basename = "biomedidas" if device_id == DEFAULT_DEVICE_ID else f"biomedidas_{device_id}"
+        # Abre los archivos en modo 'append' (la cabecera del CSV solo se escribe si es nuevo)
+        self.writer = open_session_writer(data_dir_path, formats=OUTPUT_FORMATS, basename=basename, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL_S)
+        self.data_dir_path = data_dir_path
+        self.suffix = "" if device_id == DEFAULT_DEVICE_ID else f"_{device_id}"
+        # Salidas del modo PPG en bruto; se abren con el primer bloque recibido
+        self.ppg_raw = None
+        self.ppg_writer = None
+        self.failed = False
+        self.last_status_count = 0
+        self.started = time.monotonic()
+        self.first_sample = False
+        self.dropped = 0
+        self.queue = queue.Queue(maxsize=SESSION_QUEUE_SIZE)
+        self.closing = threading.Event()
+        self.thread = threading.Thread(target=self._run, name=f"writer_{device_id}_{session_id}", daemon=True)
+        self.thread.start()
+
+    def submit(self, method, *args, received=()):
+        """Encola una escritura (write o write_ppg) sin bloquear; si la cola de la sesión está llena se descarta."""
+        try:
+            self.queue.put_nowait((method, args, received))
+        except queue.Full:
+            self.dropped += 1
+            metrics.session_dropped += 1
+            report_device_error(self.device_id, f"Cola de escritura de la sesión '{self.session_id}' llena; se descartan datos")
+
+    def _run(self):
+        """Hilo de la sesión: escribe lo encolado, vuelca los lotes que vencen y cierra al detenerse."""
+        while True:
+            try:
+                item = self.queue.get(timeout=FLUSH_INTERVAL_S / 2)
+            except queue.Empty:
+                if self.closing.is_set():
+                    break
+                self._flush_if_due()
+                continue
+            if item is None:
+                break
+            method, args, received = item
+            method(*args)
+            if received:
+                now = time.monotonic()
+                metrics.latencies.extend(now - t for t in received)
+            self._flush_if_due()
+        self._close()
+
+    def write(self, biomedidas):
+        """
+        Escribe un lote de muestras (lista de dicts o array columnar de una trama binaria).
+        Un fallo de disco desactiva solo esta sesión, no las demás.
+        """
+        if self.failed:
+            return
+        try:
+            if isinstance(biomedidas, list):
+                self.writer.write_many(biomedidas)
+            else:
+                self.writer.write_columns(biomedidas)
+            if not self.first_sample:
+                self.first_sample = True
+                tracing.record(self.session_id, 'primera_muestra', time.monotonic() - self.started, device=self.device_id)
+        except Exception as e:
+            self.failed = True
+            print(f"❌ Error escribiendo la sesión '{self.session_id}' ({self.device_id}); se descartan sus muestras: {e}")
+
+    def write_ppg(self, blocks, estimates):
+        """Guarda los bloques PPG en bruto (ppg_raw.bin) y las estimaciones (ppg_estimaciones.csv)."""
+        if self.failed:
+            return
+        try:
+            if self.ppg_raw is None:
+                self.ppg_raw = PpgRawLog(self.data_dir_path, basename=f"ppg_raw{self.suffix}")
+                self.ppg_writer = CsvSessionWriter(self.data_dir_path, basename=f"ppg_estimaciones{self.suffix}",
+                                                   batch_size=1, flush_interval=FLUSH_INTERVAL_S, fields=PPG_ESTIMATE_FIELDS)
+            for block in blocks:
+                self.ppg_raw.write(block)
+            if estimates:
+                self.ppg_writer.write_many(estimates)
+        except Exception as e:
+            self.failed = True
+            print(f"❌ Error escribiendo el PPG de la sesión '{self.session_id}' ({self.device_id}); se descartan sus muestras: {e}")
+
+    def _flush_if_due(self):
+        if self.failed:
+            return
+        try:
+            self.writer.flush_if_due()
+            if self.ppg_raw is not None:
+                self.ppg_raw.flush()
+                self.ppg_writer.flush_if_due()
+        except Exception as e:
+            self.failed = True
+            print(f"❌ Error volcando la sesión '{self.session_id}' ({self.device_id}): {e}")
+
+    def _close(self):
+        try:
+            self.writer.close()
+            if self.ppg_raw is not None:
+                self.ppg_raw.close()
+                self.ppg_writer.close()
+        except Exception as e:
+            print(f"❌ Error cerrando la sesión '{self.session_id}' ({self.device_id}): {e}")
+        elapsed = time.monotonic() - self.started
+        dropped = f" ({self.dropped} segmentos descartados por cola llena)" if self.dropped else ""
+        print(f"⏹️  Sesión '{self.session_id}' ({self.device_id}) detenida: "
+              f"{self.writer.samples_written} muestras guardadas en '{self.writer.path}'{dropped}.")
+        safe_record_timing(self.session_id, 'biomedidas', elapsed, device=self.device_id, samples=self.writer.samples_written)
+        tracing.record(self.session_id, 'biomedidas', elapsed, device=self.device_id, samples=self.writer.samples_written)
+
+    def close(self):
+        """Pide el cierre: se escribe todo lo ya encolado, se vuelca y se sincroniza en el hilo de la sesión."""
+        self.closing.set()
+        try:
+            self.queue.put_nowait(None)
+        except queue.Full:
+            pass  # El hilo ve `closing` en cuanto vacíe la cola
+
+    def join(self, timeout=None):
+        """Espera a que la sesión termine de cerrar; True si lo ha hecho."""
+        self.thread.join(timeout)
+        return not self.thread.is_alive()
+
+class IngestMetrics:
+    """Contadores de la cola de ingesta y latencia desde la recepción hasta el escritor de sesión."""
+
+    def __init__(self):
+        # 'received', 'enqueued' y 'dropped' solo los modifica el hilo de red; 'processed' y 'session_dropped',
+        # el de ingesta; las latencias, los hilos de las sesiones
+        self.received = 0
+        self.enqueued = 0
+        self.dropped = 0
+        self.session_dropped = 0
+        self.processed = 0
+        self.max_depth = 0
+        self.latencies = deque(maxlen=10000)
+
+    def snapshot(self, queue_depth):
+        self.max_depth = max(self.max_depth, queue_depth)
+        latencies = sorted(self.latencies)
+
+        def percentile(p):
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 2) if latencies else None
+
+        return {
+            'queue_depth': queue_depth,
+            'queue_max_depth': self.max_depth,
+            'queue_capacity': INGEST_QUEUE_SIZE,
+            'received': self.received,
+            'processed': self.processed,
+            'dropped': self.dropped,
+            'session_dropped': self.session_dropped,
+            'latency_ms_p50': percentile(0.50),
+            'latency_ms_p95': percentile(0.95),
+            'latency_ms_max': round(latencies[-1] * 1000, 2) if latencies else None,
+        }
 
 # ===============================================================
 # --- VARIABLES GLOBALES ---
 # ===============================================================
-is_recording = False
-session_id = ""
-output_file_path = ""
-csv_writer = None
-output_file = None
+ingest_queue = queue.Queue(maxsize=INGEST_QUEUE_SIZE)
+# (nº de tramas encoladas antes que el comando, trama) para los comandos que no cupieron en la cola
+control_overflow = deque()
+metrics = IngestMetrics()
+# (device_id, session_id) -> RecordingSession
+sessions = {}
+sessions_lock = threading.Lock()
+# Sesiones detenidas cuyo hilo aún está cerrando (ver drain_sessions)
+closing_sessions = []
+# device_id -> nº de tramas inválidas recibidas
+device_errors = {}
+# device_id -> PpgEstimator (estado de la estimación por ventanas de cada dispositivo)
+ppg_estimators = {}
+
 # ===============================================================
 # --- FUNCIONES AUXILIARES ---
 # ===============================================================
+def parse_data_topic(topic):
+    """Devuelve (device_id, tipo) de un tópico de datos; tipo es 'biomedidas' o 'ppg'. (None, None) si no lo es."""
+    if topic == TOPIC:
+        return DEFAULT_DEVICE_ID, 'biomedidas'
+    parts = topic.split('/')
+    if len(parts) == 3 and parts[0] == 'tesis' and parts[2] in ('biomedidas', 'ppg') and VALID_ID.match(parts[1]):
+        return parts[1], parts[2]
+    return None, None
+
+def report_device_error(device_id, message):
+    """Cuenta los errores por dispositivo e imprime solo algunos para no saturar la terminal."""
+    count = device_errors.get(device_id, 0) + 1
+    device_errors[device_id] = count
+    if count == 1 or count % ERROR_LOG_EVERY == 0:
+        print(f"⚠️ [{device_id}] {message} (errores acumulados: {count})")
+
+def start_session(device_id, session_id):
+    """Abre la grabación; devuelve None si se inició o el motivo por el que no."""
+    key = (device_id, session_id)
+    with sessions_lock:
+        if key in sessions:
+            print(f"⚠️  Comando START ignorado. La sesión '{session_id}' ya se está grabando para '{device_id}'.")
+            return "la sesión ya se está grabando"
+        try:
+            sessions[key] = RecordingSession(device_id, session_id)
+        except Exception as e:
+            print(f"❌ No se pudo iniciar la sesión '{session_id}' ({device_id}): {e}")
+            return f"no se pudo iniciar: {e}"
+    print(f"▶️  Comando START recibido. Iniciando grabación de la sesión '{session_id}' ({device_id}).")
+    tracing.record(session_id, 'receptor_start', device=device_id)
+    # El catálogo recoge el biomedidas.csv de la sesión (el del dispositivo por defecto, el que muestra la interfaz)
+    if device_id == DEFAULT_DEVICE_ID:
+        safe_register(session_id, 'biomedidas', os.path.join(DATA_DIR_BASE, session_id, 'biomedidas.csv'))
+    return None
+
+def stop_sessions(device_id=None, session_id=None):
+    """
+    Detiene las sesiones que coinciden con el filtro (sin filtro, todas) y las devuelve.
+    No espera al cierre: cada sesión vuelca y sincroniza en su hilo (ver RecordingSession.join).
+    """
+    with sessions_lock:
+        keys = [k for k in sessions
+                if (device_id is None or k[0] == device_id) and (session_id is None or k[1] == session_id)]
+        stopped = [sessions.pop(k) for k in keys]
+        closing_sessions[:] = [s for s in closing_sessions if s.thread.is_alive()] + stopped
+    if not stopped:
+        print("⚠️  Comando STOP ignorado. No hay ninguna grabación en curso que coincida.")
+        return stopped
+    for session in stopped:
+        print(f"⏹️  Comando STOP recibido. Cerrando la sesión '{session.session_id}' ({session.device_id})...")
+        session.close()
+    return stopped
+
+def drain_sessions(timeout=None):
+    """Detiene las sesiones activas y espera a que todas (también las ya detenidas) terminen de escribir."""
+    with sessions_lock:
+        active = list(sessions.values())
+        sessions.clear()
+        pending = closing_sessions + active
+        closing_sessions.clear()
+    for session in active:
+        session.close()
+    deadline = None if timeout is None else time.monotonic() + timeout
+    for session in pending:
+        if not session.join(None if deadline is None else max(0.0, deadline - time.monotonic())):
+            print(f"⚠️ La sesión '{session.session_id}' ({session.device_id}) no terminó de cerrar a tiempo.")
+
 def on_connect(client, userdata, flags, rc):
     """Callback que se ejecuta cuando el cliente se conecta."""
     if rc == 0:
         print("✅ Conectado al bróker MQTT.")
-        client.subscribe(TOPIC)
-        client.subscribe(CONTROL_TOPIC)
-        print(f"👂 Suscrito a los tópicos: '{TOPIC}' y '{CONTROL_TOPIC}'")
+        client.subscribe([(TOPIC, 0), (DEVICE_TOPIC, 0), (PPG_TOPIC, 0), (CONTROL_TOPIC, 0)])
+        print(f"👂 Suscrito a los tópicos: '{TOPIC}', '{DEVICE_TOPIC}', '{PPG_TOPIC}' y '{CONTROL_TOPIC}'")
     else:
         print(f"❌ Fallo en la conexión, código de retorno: {rc}")
 
-def on_message(client, userdata, msg):
-    """Callback que se ejecuta cuando se recibe un mensaje."""
-    global is_recording, session_id, output_file_path, csv_writer, output_file
-    
-    if msg.topic == CONTROL_TOPIC:
+# Cliente MQTT con el que se publican los acuses (lo fija main; None en pruebas sin bróker)
+ack_client = None
+
+def publish_ack(command, **fields):
+    """Confirma un comando con "id" una vez ejecutado (ok, error y la hora del receptor)."""
+    if ack_client is None or not command.get("id"):
+        return
+    ack = {"id": command["id"], "source": "receptor", "command": command.get("command"), "ts": time.time()}
+    ack.update(fields)
+    try:
+        ack_client.publish(ACK_TOPIC, json.dumps(ack), qos=1)
+    except Exception as e:
+        print(f"⚠️ No se pudo publicar el acuse del comando {command.get('id')}: {e}")
+
+def handle_control(payload):
+    try:
+        command = json.loads(payload.decode())
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        print(f"⚠️ Error al decodificar JSON de control: {payload}")
+        return
+    if not isinstance(command, dict):
+        print(f"⚠️ Comando de control no válido: {payload}")
+        return
+
+    device_id = command.get("device_id")
+    session_id = command.get("session_id")
+    for value in (device_id, session_id):
+        if value is not None and not VALID_ID.match(str(value)):
+            print(f"⚠️ Identificador no válido en el comando de control: {value!r}")
+            publish_ack(command, ok=False, error="identificador no válido")
+            return
+
+    if command.get("command") == "start":
+        session_id = session_id or datetime.now().strftime("%Y%m%d_%H%M%S")
+        error = start_session(device_id or DEFAULT_DEVICE_ID, session_id)
+        publish_ack(command, ok=error is None, session_id=session_id, **({'error': error} if error else {}))
+    elif command.get("command") == "stop":
+        stopped = stop_sessions(device_id, session_id)
+        if not stopped:
+            publish_ack(command, ok=False, session_id=session_id, samples=0, error="ninguna grabación en curso coincide")
+        elif ack_client is not None and command.get("id"):
+            # El acuse sale cuando los datos están en disco, sin frenar la ingesta mientras se cierra
+            threading.Thread(target=confirm_stop, args=(command, session_id, stopped), daemon=True).start()
+
+def confirm_stop(command, session_id, stopped):
+    for session in stopped:
+        session.join()
+    publish_ack(command, ok=True, session_id=session_id, samples=sum(s.writer.samples_written for s in stopped))
+
+def decode_items(device_id, items):
+    """
+    Decodifica las tramas de un dispositivo en segmentos ordenados: listas de dicts (JSON)
+    o arrays de NumPy (formato binario de biopayload), que se escriben sin pasar por dicts.
+    """
+    segments = []
+    for payload, _ in items:
+        if is_binary_payload(payload):
+            try:
+                samples = decode_payload(payload)
+            except ValueError as e:
+                report_device_error(device_id, f"Trama binaria no válida: {e}")
+                continue
+            # Las tramas binarias consecutivas se agrupan (tupla de arrays) para escribirlas de una vez
+            if segments and isinstance(segments[-1], tuple):
+                segments[-1] += (samples,)
+            else:
+                segments.append((samples,))
+            continue
         try:
-            command = json.loads(msg.payload.decode())
-            if command.get("command") == "start":
-                # Si ya estamos grabando, lo ignoramos.
-                if is_recording:
-                    print("⚠️  Comando START ignorado. Ya hay una grabación en curso.")
-                    return
-                
-                session_id = command.get("session_id", datetime.now().strftime("%Y%m%d_%H%M%S"))
-                
-                # Prepara el directorio y el archivo de salida
-                data_dir_path = os.path.join(DATA_DIR_BASE, session_id)
-                if not os.path.exists(data_dir_path):
-                    os.makedirs(data_dir_path)
-                    print(f"📂 Creado directorio de salida: {data_dir_path}")
-
-                output_file_path = os.path.join(data_dir_path, "biomedidas.csv")
-
-                # Abre el archivo en modo 'append' para no sobreescribir y añade la cabecera si es nuevo
-                output_file = open(output_file_path, 'a', newline='')
-                csv_writer = csv.DictWriter(output_file, fieldnames=['timestamp', 'gsr', 'temp', 'hr', 'spo2'], delimiter=';')
-                
-                # Solo escribe la cabecera si el archivo no existía previamente
-                if output_file.tell() == 0:
-                    csv_writer.writeheader()
-
-                is_recording = True
-                print(f"▶️  Comando START recibido. Iniciando grabación de la sesión '{session_id}'.")
-                
-            elif command.get("command") == "stop":
-                if not is_recording:
-                    print("⚠️  Comando STOP ignorado. No hay ninguna grabación en curso.")
-                    return
-
-                is_recording = False
-                
-                # Cierra el archivo de grabación
-                if output_file:
-                    output_file.close()
-                    output_file = None
-                    csv_writer = None
-                    print(f"⏹️  Comando STOP recibido. Grabación detenida y datos guardados en '{output_file_path}'.")
-                
-        except json.JSONDecodeError:
-            print(f"⚠️ Error al decodificar JSON de control: {msg.payload}")
-    
-    elif msg.topic == TOPIC and is_recording:
+            biomedida = json.loads(payload.decode())
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            report_device_error(device_id, f"Error al decodificar JSON de datos: {payload[:80]}")
+            continue
+        if not isinstance(biomedida, dict):
+            report_device_error(device_id, f"Trama de datos no válida: {payload[:80]}")
+            continue
+        if segments and isinstance(segments[-1], list):
+            segments[-1].append(biomedida)
+        else:
+            segments.append([biomedida])
+    return [np.concatenate(s) if isinstance(s, tuple) else s for s in segments]
+
+def handle_data(device_id, items):
+    """Decodifica un grupo de tramas (payload, t_recepción) de un dispositivo y las reparte entre sus sesiones."""
+    with sessions_lock:
+        targets = [s for (dev, _), s in sessions.items() if dev == device_id]
+    if not targets:
+        metrics.processed += len(items)
+        return
+    # Encola las muestras en cada sesión del dispositivo; su hilo escribe y decide cuándo volcar a disco
+    segments = decode_items(device_id, items)
+    received = [received_at for _, received_at in items]
+    for session in targets:
+        for n, segment in enumerate(segments):
+            session.submit(session.write, segment, received=received if n == len(segments) - 1 else ())
+    metrics.processed += len(items)
+
+def handle_ppg(device_id, items):
+    """Añade los bloques PPG al buffer circular del dispositivo y guarda bloques y estimaciones en sus sesiones."""
+    with sessions_lock:
+        targets = [s for (dev, _), s in sessions.items() if dev == device_id]
+    if targets:
+        blocks, estimates = [], []
+        for payload, _ in items:
+            try:
+                header, ir, red, size = decode_ppg_block(payload)
+            except ValueError as e:
+                report_device_error(device_id, f"Bloque PPG no válido: {e}")
+                continue
+            # El bloque en bruto se guarda aunque la estimación lo rechace (p. ej. un salto de secuencia)
+            blocks.append(payload[:size])
+            try:
+                estimator = ppg_estimators.get(device_id)
+                if estimator is None or estimator.sample_rate != header['sample_rate']:
+                    estimator = ppg_estimators[device_id] = PpgEstimator(header['sample_rate'], PPG_WINDOW_S, PPG_HOP_S)
+                estimates.extend(format_estimate(e) for e in estimator.add_block(header, ir, red))
+            except ValueError as e:
+                report_device_error(device_id, f"Bloque PPG no usado en la estimación: {e}")
+        received = [received_at for _, received_at in items]
+        for session in targets:
+            session.submit(session.write_ppg, blocks, estimates, received=received)
+    metrics.processed += len(items)
+
+def process_batch(batch):
+    """Procesa un lote de la cola respetando el orden relativo entre comandos y datos."""
+    pending = {}
+
+    def deliver():
+        for (device_id, kind), items in pending.items():
+            (handle_ppg if kind == 'ppg' else handle_data)(device_id, items)
+
+    for topic, payload, received_at in batch:
+        if topic == CONTROL_TOPIC:
+            # Los datos anteriores al comando se entregan antes de ejecutarlo
+            deliver()
+            pending = {}
+            handle_control(payload)
+            metrics.processed += 1
+            continue
+        device_id, kind = parse_data_topic(topic)
+        if device_id is None:
+            metrics.processed += 1
+            continue
+        pending.setdefault((device_id, kind), []).append((payload, received_at))
+    deliver()
+
+def take_overflow_controls(batch, dequeued):
+    """Añade al lote los comandos desbordados cuyo turno ya ha llegado (tras las tramas recibidas antes que ellos)."""
+    while control_overflow and control_overflow[0][0] <= dequeued:
+        batch.append(control_overflow.popleft()[1])
+
+def ingest_worker():
+    """Hilo de ingesta: saca tramas de la cola por lotes, las decodifica y las reparte entre las sesiones."""
+    dequeued = 0
+    while True:
+        item = ingest_queue.get()
+        # Profundidad justo antes de sacar la primera trama del lote
+        metrics.max_depth = max(metrics.max_depth, min(ingest_queue.qsize() + 1, ingest_queue.maxsize))
+        batch = []
+        stop = False
+        while True:
+            # None es la señal de parada: se procesa todo lo anterior y se termina
+            if item is None:
+                stop = True
+                take_overflow_controls(batch, float('inf'))
+                break
+            batch.append(item)
+            dequeued += 1
+            take_overflow_controls(batch, dequeued)
+            if len(batch) >= INGEST_BATCH:
+                break
+            try:
+                item = ingest_queue.get_nowait()
+            except queue.Empty:
+                break
         try:
-            biomedida = json.loads(msg.payload.decode())
-            
-            # Escribe la muestra directamente al archivo CSV
-            if csv_writer:
-                csv_writer.writerow(biomedida)
-                print(f"➡️ Recibido y guardado dato para la sesión '{session_id}': {biomedida}")
-        except json.JSONDecodeError:
-            print(f"⚠️ Error al decodificar JSON de datos: {msg.payload}")
+            process_batch(batch)
+        except Exception as e:
+            print(f"❌ Error procesando un lote de {len(batch)} tramas: {e}")
+        if stop:
+            return
+
+def on_message(client, userdata, msg):
+    """Callback del hilo de red de paho: solo encola la trama cruda, sin decodificar ni escribir."""
+    item = (msg.topic, msg.payload, time.monotonic())
+    try:
+        ingest_queue.put_nowait(item)
+    except queue.Full:
+        if msg.topic != CONTROL_TOPIC:
+            metrics.dropped += 1
+            return
+        # Con la cola llena el comando espera aparte, sin bloquear el hilo de red (keepalive y acuses siguen saliendo);
+        # el hilo de ingesta lo ejecuta justo después de las tramas que llegaron antes que él
+        if len(control_overflow) >= CONTROL_OVERFLOW_SIZE:
+            print(f"❌ Cola de ingesta llena y {CONTROL_OVERFLOW_SIZE} comandos en espera: se descarta un comando.")
+            return
+        control_overflow.append((metrics.enqueued, item))
+    else:
+        metrics.enqueued += 1
+    metrics.received += 1
+
+def report_metrics(client):
+    """Imprime y publica en METRICS_TOPIC el estado de la cola de ingesta."""
+    snapshot = metrics.snapshot(ingest_queue.qsize())
+    warn = "⚠️ " if snapshot['queue_depth'] >= QUEUE_WARN_FRACTION * INGEST_QUEUE_SIZE or snapshot['dropped'] or snapshot['session_dropped'] else ""
+    print(f"{warn}📊 Ingesta: cola {snapshot['queue_depth']}/{INGEST_QUEUE_SIZE} (máx. {snapshot['queue_max_depth']}), "
+          f"recibidas {snapshot['received']}, descartadas {snapshot['dropped']} (+{snapshot['session_dropped']} segmentos en colas de sesión), "
+          f"latencia p50 {snapshot['latency_ms_p50']} ms / p95 {snapshot['latency_ms_p95']} ms / máx. {snapshot['latency_ms_max']} ms")
+    try:
+        client.publish(METRICS_TOPIC, json.dumps(snapshot))
+    except Exception as e:
+        print(f"⚠️ No se pudieron publicar las métricas: {e}")
+
+def housekeeping_loop(client):
+    """Imprime un resumen periódico (los volcados por tiempo los hace el hilo de cada sesión)."""
+    last_status = time.monotonic()
+    while True:
+        time.sleep(STATUS_INTERVAL_S / 2)
+        with sessions_lock:
+            active = list(sessions.values())
+        now = time.monotonic()
+        if now - last_status >= STATUS_INTERVAL_S:
+            for session in active:
+                count = session.writer.samples_written
+                print(f"📈 Sesión '{session.session_id}' ({session.device_id}): {count} muestras guardadas "
+                      f"({(count - session.last_status_count) / (now - last_status):.1f} muestras/s).")
+                session.last_status_count = count
+            report_metrics(client)
+            last_status = now
 
 # ===============================================================
 # --- FUNCIÓN PRINCIPAL ---
 # ===============================================================
 def main():
     """Función principal del script."""
+    global ack_client
     print("\n--- Receptor MQTT de Bioseñales ---")
     
     client = mqtt.Client(client_id=f"receptor_biomedidas_{os.getpid()}")
     client.on_connect = on_connect
     client.on_message = on_message
+    ack_client = client
+
+    worker = threading.Thread(target=ingest_worker, name="ingest_worker", daemon=True)
+    worker.start()
 
     try:
         client.connect(BROKER_ADDRESS, 1883, 60)
-        client.loop_forever()
+        client.loop_start()
+        housekeeping_loop(client)
+    except KeyboardInterrupt:
+        pass
     except Exception as e:
         print(f"❌ No se pudo conectar al bróker MQTT: {e}")
     finally:
-        if output_file:
-            output_file.close()
+        client.loop_stop()
+        # Se vacía la cola antes de cerrar las sesiones para no perder lo ya recibido
+        ingest_queue.put(None)
+        worker.join(timeout=30)
+        drain_sessions(timeout=30)
         client.disconnect()
         print("🔌 Conexión MQTT cerrada.")
 
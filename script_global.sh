@@ -4,18 +4,10 @@
 # --- CONFIGURACIÓN ---
 # =================================================================
 WATCH_DIR="/home/alvar/ACE-Step/outputs"
-DEST_DIR="/mnt/c/Users/alvar/Desktop/DOCTORADO/PROGRAMAS/musica_generada"
-FRAMES_DIR="/mnt/c/Users/alvar/Desktop/DOCTORADO/PROGRAMAS/frames"
-ANALYZER_SCRIPT="/home/alvar/analizar_emocion.py"
-CAPTURE_SCRIPT="C:\\Users\\alvar\\Desktop\\DOCTORADO\\PROGRAMAS\\capture_10s.py"
+EMOTION_SERVICE_SCRIPT="/home/alvar/emotion_service.py"
 RECEPTOR_SCRIPT="/home/alvar/mqtt/receptor_controlado.py"
-
-# --- Configuración MQTT ---
-MQTT_BROKER="localhost"
-MQTT_CONTROL_TOPIC="tesis/control"
-
-# Ruta compartida para el archivo de señal
-SHARED_DATA_DIR="/mnt/c/Users/alvar/Desktop/DOCTORADO/PROGRAMAS/shared_data"
+# Copia, captura y análisis de cada canción: las rutas de Windows y MQTT se configuran en orquestador.py
+ORCHESTRATOR_SCRIPT="/home/alvar/orquestador.py"
 
 # =================================================================
 # --- ARRANQUE Y LIMPIEZA AUTOMÁTICA ---
@@ -28,6 +20,10 @@ cleanup() {
        echo "Deteniendo el receptor de biométricas (PID: $RECEPTOR_PID)..."
        kill $RECEPTOR_PID
     fi
+    if ps -p $EMOTION_SERVICE_PID > /dev/null; then
+       echo "Deteniendo el servicio de análisis emocional (PID: $EMOTION_SERVICE_PID)..."
+       kill $EMOTION_SERVICE_PID
+    fi
     echo "Limpieza completada. ¡Adiós!"
 }
 
@@ -39,55 +35,12 @@ python3 "$RECEPTOR_SCRIPT" &
 RECEPTOR_PID=$!
 echo "Receptor iniciado con PID: $RECEPTOR_PID."
 
-sleep 2
-
-# =================================================================
-# --- FUNCIÓN DE PROCESAMIENTO ---
-# =================================================================
-process_song() {
-    local NEW_FILE="$1"
-    local FILENAME=$(basename "$NEW_FILE")
-    local BASE_NAME="${FILENAME%.*}"
-
-    echo "----------------------------------------------------"
-    echo "Procesando Sesión: $BASE_NAME"
-    echo "----------------------------------------------------"
-
-    echo "1. Copiando '$FILENAME' a '$DEST_DIR/'..."
-    cp "$NEW_FILE" "$DEST_DIR/"
-
-    echo "2. Lanzando captura de frames y audio en Windows..."
-    
-    /mnt/c/Windows/System32/WindowsPowerShell/v1.0/powershell.exe -Command \
-      "python \"$CAPTURE_SCRIPT\" --output \"C:\\Users\\alvar\\Desktop\\DOCTORADO\\PROGRAMAS\\frames\\$BASE_NAME\" --audio \"C:\\Users\\alvar\\Desktop\\DOCTORADO\\PROGRAMAS\\musica_generada\\$FILENAME\" --camera_index 1 --delay 3 --session_id \"$BASE_NAME\""
+echo "--- Iniciando el servicio de análisis emocional en segundo plano (carga los modelos una vez)... ---"
+python3 "$EMOTION_SERVICE_SCRIPT" serve &
+EMOTION_SERVICE_PID=$!
+echo "Servicio de análisis iniciado con PID: $EMOTION_SERVICE_PID."
 
-    # Esperamos el archivo de señal de Windows en la ruta compartida
-    local SIGNAL_FILE_PATH="$SHARED_DATA_DIR/$BASE_NAME/start_signal.txt"
-    echo "3. Esperando señal de inicio de grabación desde Windows..."
-    while [ ! -f "$SIGNAL_FILE_PATH" ]; do
-        sleep 0.2
-    done
-    rm "$SIGNAL_FILE_PATH"
-
-    echo "4. Señal recibida. Enviando comando START al receptor..."
-    START_PAYLOAD="{\"command\": \"start\", \"session_id\": \"$BASE_NAME\"}"
-    mosquitto_pub -h "$MQTT_BROKER" -t "$MQTT_CONTROL_TOPIC" -m "$START_PAYLOAD"
-
-    echo "5. Esperando carpeta de frames..."
-    while [ ! -d "$FRAMES_DIR/$BASE_NAME" ]; do sleep 1; done
-    LATEST_SUBDIR=$(find "$FRAMES_DIR/$BASE_NAME" -mindepth 1 -maxdepth 1 -type d | sort | tail -n 1)
-    if [ -z "$LATEST_SUBDIR" ]; then echo "ERROR: No se encontró subcarpeta."; return 1; fi
-
-    echo "6. Enviando comando STOP al receptor..."
-    STOP_PAYLOAD="{\"command\": \"stop\"}"
-    mosquitto_pub -h "$MQTT_BROKER" -t "$MQTT_CONTROL_TOPIC" -m "$STOP_PAYLOAD"
-
-    echo "7. Ejecutando análisis emocional sobre: $LATEST_SUBDIR"
-    python3 "$ANALYZER_SCRIPT" --input "$LATEST_SUBDIR"
-
-    echo "Proceso finalizado para la sesión: $BASE_NAME"
-    echo "----------------------------------------------------"
-}
+sleep 2
 
 # =================================================================
 # --- MENÚ DE OPCIONES Y BUCLE PRINCIPAL ---
@@ -107,51 +60,17 @@ while true; do
             read -p "Ingresa el nombre del archivo de la canción (ej: cancion.wav): " manual_file
             FULL_PATH_FILE="$WATCH_DIR/$manual_file"
             if [ -f "$FULL_PATH_FILE" ]; then
-                process_song "$FULL_PATH_FILE"
+                # Copia, captura, START/STOP al receptor y análisis (ver orquestador.py)
+                python3 "$ORCHESTRATOR_SCRIPT" add "$FULL_PATH_FILE"
             else
                 echo "ERROR: El archivo '$manual_file' no existe en '$WATCH_DIR'."
             fi
             ;;
         2)
             echo "--- MODO MONITOR ACTIVADO ---"
-            echo "Vigilando la carpeta: $WATCH_DIR"
-            
-            existing_files=()
-            for file in "$WATCH_DIR"/*; do
-                if [ -f "$file" ]; then
-                    existing_files+=("$(basename "$file")")
-                fi
-            done
-            echo "Ignorando ${#existing_files[@]} archivos existentes. Presiona Ctrl+C para detener."
-            
-            if ! command -v inotifywait &> /dev/null; then
-                echo "ERROR: inotifywait no está instalado. Ejecuta 'sudo apt-get install inotify-tools'."
-                exit 1
-            fi
-
-            while inotifywait -e create -q "$WATCH_DIR"; do
-                for new_file in "$WATCH_DIR"/*; do
-                    if [ -f "$new_file" ]; then
-                        filename=$(basename "$new_file")
-                        is_new=true
-                        for existing in "${existing_files[@]}"; do
-                            if [[ "$filename" == "$existing" ]]; then
-                                is_new=false
-                                break
-                            fi
-                        done
-                        
-                        if [ "$is_new" = true ]; then
-                            echo "----------------------------------------------------"
-                            echo "🎵 Procesando Nueva Canción: $filename"
-                            process_song "$new_file"
-                            echo "----------------------------------------------------"
-                            existing_files+=("$filename")
-                        fi
-                    fi
-                done
-                echo "--- Vigilando de nuevo... ---"
-            done
+            # El orquestador detecta cada canción nueva cuando ACE-Step termina de escribirla, descarta
+            # duplicados y encadena las etapas; los trabajos pendientes se reanudan si se reinicia.
+            python3 "$ORCHESTRATOR_SCRIPT" watch --dir "$WATCH_DIR"
             ;;
         q)
             echo "Saliendo del programa."
@@ -0,0 +1,288 @@
+import os
+import re
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import threading
+
+# ===============================================================
+# --- CATÁLOGO DE SESIONES (SQLite) ---
+# ===============================================================
+# Índice de las sesiones y de sus artefactos, para no recorrer carpetas en /mnt/c (lento con
+# cientos de sesiones) cada vez que la interfaz lista sesiones o busca el audio de una sesión.
+# Cada productor registra lo que genera en cuanto lo genera:
+#
+#   app_tesis.py / script_global.sh   'audio' (al crear la sesión) y 'frames' (carpeta de la captura)
+#   receptor_controlado.py            'biomedidas' (al iniciar la grabación; muestras y duración al pararla)
+#   analizar_emocion.py               'frames', 'frame_store' y 'emotions' (CSV de resultados)
+#
+# además de los tiempos de cada etapa (tabla timings). Las consultas van por clave primaria o
+# índice (O(log n)). La base de datos vive en el disco de Linux (no en /mnt/c) y usa modo WAL,
+# así que varios procesos pueden leer y escribir a la vez.
+#
+#   python3 session_catalog.py list [--kind biomedidas]
+#   python3 session_catalog.py get <sesión> <tipo>               (imprime la ruta; código 1 si no existe)
+#   python3 session_catalog.py register <sesión> <tipo> <ruta>
+#   python3 session_catalog.py frames <sesión> <carpeta de la sesión>   (registra e imprime la subcarpeta más reciente)
+#   python3 session_catalog.py show <sesión>
+#   python3 session_catalog.py rebuild --biomedidas DIR --frames DIR --audio DIR   (indexa sesiones antiguas)
+
+CATALOG_PATH = os.environ.get('TESIS_CATALOG', '/home/alvar/tesis_sesiones.db')
+ARTIFACT_KINDS = ('audio', 'frames', 'frame_store', 'biomedidas', 'emotions')
+AUDIO_EXTENSIONS = ('.wav', '.mp3', '.flac', '.ogg')
+# Resultado de analizar_emocion.py, en la carpeta de frames analizada (la de la sesión o una subcarpeta de captura)
+EMOTIONS_FILENAME = '_emotions_analysis.csv'
+# Subcarpetas que crea capture_10s.py dentro de la carpeta de frames de la sesión
+CAPTURE_SUBDIR_PATTERN = re.compile(r'^\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2}$')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated);
+CREATE TABLE IF NOT EXISTS artifacts (
+    session_id TEXT NOT NULL REFERENCES sessions (session_id),
+    kind TEXT NOT NULL,
+    path TEXT NOT NULL,
+    updated REAL NOT NULL,
+    info TEXT,
+    PRIMARY KEY (session_id, kind)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS artifacts_kind ON artifacts (kind, session_id);
+CREATE TABLE IF NOT EXISTS timings (
+    session_id TEXT NOT NULL REFERENCES sessions (session_id),
+    stage TEXT NOT NULL,
+    seconds REAL NOT NULL,
+    recorded REAL NOT NULL,
+    info TEXT
+);
+CREATE INDEX IF NOT EXISTS timings_session ON timings (session_id, stage);
+"""
+
+class SessionCatalog:
+    """Acceso al catálogo; una conexión compartida por los hilos del proceso, protegida con un lock."""
+
+    def __init__(self, path=CATALOG_PATH):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _write(self, statements):
+        """Ejecuta varias sentencias en una transacción."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for sql, params in statements:
+                    self._conn.execute(sql, params)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    @staticmethod
+    def _touch(session_id, now):
+        return ("INSERT INTO sessions (session_id, created, updated) VALUES (?, ?, ?) "
+                "ON CONFLICT (session_id) DO UPDATE SET updated = excluded.updated", (session_id, now, now))
+
+    def add_session(self, session_id):
+        self._write([self._touch(session_id, time.time())])
+
+    def register(self, session_id, kind, path, **info):
+        """Registra (o sustituye) el artefacto `kind` de la sesión; crea la sesión si no existe."""
+        now = time.time()
+        self._write([self._touch(session_id, now),
+                     ("INSERT OR REPLACE INTO artifacts (session_id, kind, path, updated, info) VALUES (?, ?, ?, ?, ?)",
+                      (session_id, kind, os.path.abspath(path), now, json.dumps(info) if info else None))])
+
+    def record_timing(self, session_id, stage, seconds, **info):
+        now = time.time()
+        self._write([self._touch(session_id, now),
+                     ("INSERT INTO timings (session_id, stage, seconds, recorded, info) VALUES (?, ?, ?, ?, ?)",
+                      (session_id, stage, float(seconds), now, json.dumps(info) if info else None))])
+
+    def artifact(self, session_id, kind):
+        """Ruta registrada del artefacto, o None."""
+        rows = self._query("SELECT path FROM artifacts WHERE session_id = ? AND kind = ?", (session_id, kind))
+        return rows[0][0] if rows else None
+
+    def list_sessions(self, kind=None):
+        """IDs de sesión ordenados; con `kind`, solo las que tienen ese artefacto."""
+        if kind is None:
+            return [r[0] for r in self._query("SELECT session_id FROM sessions ORDER BY session_id")]
+        return [r[0] for r in self._query("SELECT session_id FROM artifacts WHERE kind = ? ORDER BY session_id", (kind,))]
+
+    def session(self, session_id):
+        """Sesión con sus artefactos y tiempos, o None si no está en el catálogo."""
+        rows = self._query("SELECT created, updated FROM sessions WHERE session_id = ?", (session_id,))
+        if not rows:
+            return None
+        artifacts = {kind: {'path': path, 'updated': updated, **(json.loads(info) if info else {})}
+                     for kind, path, updated, info in self._query(
+                         "SELECT kind, path, updated, info FROM artifacts WHERE session_id = ?", (session_id,))}
+        timings = [{'stage': stage, 'seconds': seconds, 'recorded': recorded, **(json.loads(info) if info else {})}
+                   for stage, seconds, recorded, info in self._query(
+                       "SELECT stage, seconds, recorded, info FROM timings WHERE session_id = ? ORDER BY recorded", (session_id,))]
+        return {'session_id': session_id, 'created': rows[0][0], 'updated': rows[0][1], 'artifacts': artifacts, 'timings': timings}
+
+    def __len__(self):
+        return self._query("SELECT COUNT(*) FROM sessions")[0][0]
+
+    def rebuild(self, biomedidas_dir=None, frames_dir=None, audio_dir=None):
+        """Indexa las sesiones que ya existen en disco (una única pasada por cada carpeta). Devuelve cuántas hay."""
+        now = time.time()
+        statements = []
+        def add(session_id, kind, path):
+            # Sin tocar 'updated' de las sesiones ya conocidas: se puede reindexar en cada arranque
+            statements.append(("INSERT OR IGNORE INTO sessions (session_id, created, updated) VALUES (?, ?, ?)", (session_id, now, now)))
+            statements.append(("INSERT OR IGNORE INTO artifacts (session_id, kind, path, updated) VALUES (?, ?, ?, ?)",
+                               (session_id, kind, os.path.abspath(path), now)))
+        if biomedidas_dir and os.path.isdir(biomedidas_dir):
+            for entry in os.scandir(biomedidas_dir):
+                csv_path = os.path.join(entry.path, 'biomedidas.csv')
+                if entry.is_dir() and os.path.exists(csv_path):
+                    add(entry.name, 'biomedidas', csv_path)
+        if frames_dir and os.path.isdir(frames_dir):
+            for entry in os.scandir(frames_dir):
+                if entry.is_dir():
+                    add(entry.name, 'frames', latest_capture_dir(entry.path))
+                    emotions_path = latest_emotions_csv(entry.path)
+                    if emotions_path:
+                        add(entry.name, 'emotions', emotions_path)
+        if audio_dir and os.path.isdir(audio_dir):
+            for entry in os.scandir(audio_dir):
+                stem, ext = os.path.splitext(entry.name)
+                if entry.is_file() and ext.lower() in AUDIO_EXTENSIONS:
+                    add(stem, 'audio', entry.path)
+        self._write(statements)
+        return len(self)
+
+# ===============================================================
+# --- UTILIDADES PARA LOS PRODUCTORES ---
+# ===============================================================
+_default_catalog = None
+_default_lock = threading.Lock()
+
+def get_catalog():
+    """Catálogo por defecto del proceso (se abre la primera vez que se usa)."""
+    global _default_catalog
+    with _default_lock:
+        if _default_catalog is None:
+            _default_catalog = SessionCatalog()
+        return _default_catalog
+
+def safe_register(session_id, kind, path, **info):
+    """Registra un artefacto sin interrumpir al productor si el catálogo no está disponible."""
+    try:
+        get_catalog().register(session_id, kind, path, **info)
+    except Exception as e:
+        print(f"⚠️ No se pudo registrar '{kind}' de la sesión '{session_id}' en el catálogo: {e}")
+
+def safe_record_timing(session_id, stage, seconds, **info):
+    try:
+        get_catalog().record_timing(session_id, stage, seconds, **info)
+    except Exception as e:
+        print(f"⚠️ No se pudo registrar el tiempo de '{stage}' de la sesión '{session_id}' en el catálogo: {e}")
+
+def latest_capture_dir(session_frames_dir):
+    """Subcarpeta más reciente de la captura (capture_10s.py crea una por grabación) o la propia carpeta."""
+    try:
+        subdirs = sorted(e.name for e in os.scandir(session_frames_dir) if e.is_dir() and not e.name.startswith('.'))
+    except OSError:
+        return session_frames_dir
+    return os.path.join(session_frames_dir, subdirs[-1]) if subdirs else session_frames_dir
+
+def latest_emotions_csv(session_frames_dir):
+    """CSV de emociones más reciente de la sesión (en la captura más reciente que lo tenga o en la propia carpeta), o None."""
+    try:
+        subdirs = sorted(e.path for e in os.scandir(session_frames_dir) if e.is_dir() and not e.name.startswith('.'))
+    except OSError:
+        return None
+    for folder in reversed([session_frames_dir] + subdirs):
+        path = os.path.join(folder, EMOTIONS_FILENAME)
+        if os.path.exists(path):
+            return path
+    return None
+
+def session_id_from_frames_dir(frames_dir):
+    """ID de sesión de una carpeta de frames: la carpeta de la sesión, o su padre si es una subcarpeta de captura."""
+    frames_dir = os.path.normpath(os.path.abspath(frames_dir))
+    name = os.path.basename(frames_dir)
+    return os.path.basename(os.path.dirname(frames_dir)) if CAPTURE_SUBDIR_PATTERN.match(name) else name
+
+def find_audio(session_id, audio_dir, catalog=None):
+    """Audio de la sesión: el registrado en el catálogo o, si no, el archivo cuyo nombre (sin extensión) es exactamente el ID."""
+    try:
+        path = (catalog or get_catalog()).artifact(session_id, 'audio')
+        if path and os.path.exists(path):
+            return path
+    except Exception as e:
+        print(f"⚠️ Catálogo no disponible ({e}); se busca el audio en la carpeta.")
+    for ext in AUDIO_EXTENSIONS:
+        path = os.path.join(audio_dir, session_id + ext)
+        if os.path.exists(path):
+            return path
+    return None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Catálogo de sesiones (SQLite).")
+    parser.add_argument("--db", default=CATALOG_PATH, help="Ruta de la base de datos del catálogo.")
+    sub = parser.add_subparsers(dest="mode", required=True)
+    p = sub.add_parser("list", help="Lista las sesiones.")
+    p.add_argument("--kind", choices=ARTIFACT_KINDS, help="Solo las sesiones con este artefacto.")
+    p = sub.add_parser("get", help="Imprime la ruta de un artefacto.")
+    p.add_argument("session_id"); p.add_argument("kind", choices=ARTIFACT_KINDS)
+    p = sub.add_parser("register", help="Registra un artefacto.")
+    p.add_argument("session_id"); p.add_argument("kind", choices=ARTIFACT_KINDS); p.add_argument("path")
+    p = sub.add_parser("frames", help="Registra e imprime la carpeta de frames más reciente de la sesión.")
+    p.add_argument("session_id"); p.add_argument("session_frames_dir")
+    p = sub.add_parser("show", help="Muestra una sesión con sus artefactos y tiempos (JSON).")
+    p.add_argument("session_id")
+    p = sub.add_parser("rebuild", help="Indexa las sesiones que ya existen en disco.")
+    p.add_argument("--biomedidas"); p.add_argument("--frames"); p.add_argument("--audio")
+    args = parser.parse_args()
+
+    catalog = SessionCatalog(args.db)
+    if args.mode == "list":
+        print("\n".join(catalog.list_sessions(args.kind)))
+    elif args.mode == "get":
+        path = catalog.artifact(args.session_id, args.kind)
+        if path is None:
+            sys.exit(1)
+        print(path)
+    elif args.mode == "register":
+        catalog.register(args.session_id, args.kind, args.path)
+    elif args.mode == "frames":
+        if not os.path.isdir(args.session_frames_dir):
+            print(f"❌ Error: La carpeta de frames no existe: {args.session_frames_dir}", file=sys.stderr)
+            sys.exit(1)
+        path = latest_capture_dir(args.session_frames_dir)
+        catalog.register(args.session_id, 'frames', path)
+        print(path)
+    elif args.mode == "show":
+        session = catalog.session(args.session_id)
+        if session is None:
+            print(f"🤷 La sesión '{args.session_id}' no está en el catálogo.", file=sys.stderr)
+            sys.exit(1)
+        print(json.dumps(session, indent=2, ensure_ascii=False))
+    else:
+        t0 = time.monotonic()
+        total = catalog.rebuild(args.biomedidas, args.frames, args.audio)
+        print(f"✅ Catálogo reconstruido: {total} sesiones en {time.monotonic() - t0:.1f} s ({args.db}).")
@@ -0,0 +1,363 @@
+import os
+import re
+import csv
+import sys
+import json
+import time
+import shutil
+import argparse
+import threading
+import subprocess
+import numpy as np
+import session_catalog
+import tracing
+from biopayload import encode_samples, MAX_SAMPLES_PER_PAYLOAD
+from session_writer import BIOMEDIDAS_FIELDS, read_binary_log, to_float
+from frame_index import FrameIndexWriter, load_session_index
+from frame_store import FrameStoreWriter, STORE_FILENAME, store_path, open_store, list_image_files
+from frame_writer import mark_capture_done
+from frame_sampling import DEFAULT_CAPTURE_FPS
+
+# ===============================================================
+# --- REPRODUCCIÓN DE SESIONES GRABADAS ---
+# ===============================================================
+# Vuelve a pasar una sesión ya grabada por el flujo en directo, sin ESP32 ni cámara:
+#
+#   - bioseñales: las muestras de biomedidas.bin (o biomedidas.csv) se publican en tesis/<dispositivo>/biomedidas
+#     como tramas binarias de biopayload (o JSON, como el firmware) con su ritmo original
+#   - frames: se copian uno a uno a una carpeta de captura nueva (<FRAMES_DIR>/<sesión nueva>/<fecha_hora>),
+#     con su frame_index.bin y el capture_done.json final, igual que capture_10s.py; el análisis en
+#     streaming los procesa a medida que aparecen
+#   - control: START/STOP al receptor por control_client.py con un dispositivo propio (el ESP32 real,
+#     si está conectado, ignora los comandos dirigidos a otro dispositivo)
+#
+# Los tiempos se conservan: cada evento sale en su instante original dividido por --speed (1 = tiempo
+# real, 4 = cuatro veces más rápido, 0 = lo más rápido posible). Los timestamps de las muestras y la hora
+# de los frames se desplazan en bloque al momento de la reproducción, así que bioseñales y frames siguen
+# alineados entre sí (fusion.py) y con las trazas de la sesión nueva. Varias sesiones (o --copies copias
+# de una) se reproducen a la vez, cada una en su hilo, para pruebas de carga del receptor, la interfaz
+# y el analizador. Con el servicio de análisis los trabajos de streaming también corren a la vez, pero
+# la inferencia del modelo único es serializada: el informe indica cuánto esperó cada copia por ella.
+#
+#   python3 session_replay.py cancion_triste_01                          (1x, con análisis si se pide --analyze)
+#   python3 session_replay.py s1 s2 s3 --speed 0 --no-frames             (solo bioseñales, lo más rápido posible)
+#   python3 session_replay.py s1 --copies 8 --speed 2 --analyze          (carga: 8 sesiones simultáneas)
+
+BIOMEDIDAS_DIR = "/home/alvar/biomedidas"
+FRAMES_DIR = "/mnt/c/Users/alvar/Desktop/DOCTORADO/PROGRAMAS/frames"
+AUDIO_DIR = "/mnt/c/Users/alvar/Desktop/DOCTORADO/PROGRAMAS/musica_generada"
+ANALYZER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "analizar_emocion.py")
+DEVICE_PREFIX = "replay"   # Dispositivo de cada reproducción: replay, replay1, replay2...
+BATCH_SIZE = 10            # Muestras por trama binaria (BINARY_BATCH_SIZE del firmware)
+FRAME_NUMBER = re.compile(r'(\d+)')
+
+# ===============================================================
+# --- CARGA DE LA SESIÓN ORIGINAL ---
+# ===============================================================
+def load_biomedidas(path):
+    """Columnas float64 de la sesión ({campo: array}); acepta el log binario o el CSV (';' y 'ND')."""
+    if path.endswith('.bin'):
+        records = read_binary_log(path)
+        return {f: records[f].astype(np.float64) for f in BIOMEDIDAS_FIELDS}
+    with open(path, newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f, delimiter=';'))
+    return {field: np.array([to_float(r.get(field)) for r in rows], dtype=np.float64) for field in BIOMEDIDAS_FIELDS}
+
+def spread_timestamps(timestamps):
+    """Instante de cada muestra: las que comparten el mismo segundo (timestamp NTP entero) se reparten
+    uniformemente dentro de él, como llegaron del ESP32, en lugar de salir todas de golpe."""
+    t = np.asarray(timestamps, dtype=np.float64)
+    if len(t) == 0 or not np.all(t == np.floor(t)):
+        return t
+    starts = np.r_[0, np.flatnonzero(np.diff(t)) + 1]
+    counts = np.diff(np.r_[starts, len(t)])
+    position = np.arange(len(t)) - np.repeat(starts, counts)
+    return t + position / np.repeat(counts, counts)
+
+def load_frames(frames_dir):
+    """(tipo 'store' o 'files', referencias en orden, hora de reloj de cada frame o None si no hay índice)."""
+    if os.path.exists(store_path(frames_dir)):
+        store = open_store(store_path(frames_dir))
+        kind, names = 'store', store.names
+        refs = list(range(len(store)))
+    else:
+        kind = 'files'
+        refs = list_image_files(frames_dir)
+        names = [os.path.basename(r) for r in refs]
+    index = load_session_index(frames_dir)
+    if index is None or len(index) == 0:
+        return kind, refs, names, None
+    wall_by_frame = dict(zip(index['frame_no'].tolist(), index['wall'].tolist()))
+    numbers = [FRAME_NUMBER.findall(n) for n in names]
+    walls = np.array([wall_by_frame.get(int(n[-1]), np.nan) if n else np.nan for n in numbers])
+    return kind, refs, names, (walls if np.isfinite(walls).all() else None)
+
+def resolve_session(session_id, catalog=None):
+    """Rutas de la sesión original (biomedidas, carpeta de frames, audio) según el catálogo; None si faltan."""
+    catalog = catalog or session_catalog.get_catalog()
+    biomedidas = catalog.artifact(session_id, 'biomedidas')
+    if biomedidas:
+        binary = os.path.splitext(biomedidas)[0] + '.bin'
+        biomedidas = binary if os.path.exists(binary) else biomedidas
+    frames = catalog.artifact(session_id, 'frames')
+    if frames:
+        frames = session_catalog.latest_capture_dir(frames)
+    return {'biomedidas': biomedidas if biomedidas and os.path.exists(biomedidas) else None,
+            'frames': frames if frames and os.path.isdir(frames) else None,
+            'audio': session_catalog.find_audio(session_id, AUDIO_DIR, catalog)}
+
+# ===============================================================
+# --- REPRODUCCIÓN ---
+# ===============================================================
+class SessionReplay:
+    """Reproduce una sesión en su hilo: plan de eventos (tramas y frames) ordenado y emitido a su ritmo."""
+
+    def __init__(self, source_id, replay_id, device_id, paths, publisher, speed=1.0, batch_size=BATCH_SIZE,
+                 json_payload=False, frames=True, control=True, analyze=False, frames_root=FRAMES_DIR):
+        self.source_id = source_id
+        self.replay_id = replay_id
+        self.device_id = device_id
+        self.paths = paths
+        self.publisher = publisher
+        self.speed = speed
+        self.batch_size = max(1, min(int(batch_size), MAX_SAMPLES_PER_PAYLOAD))
+        self.json_payload = json_payload
+        self.frames = frames and paths.get('frames') is not None
+        self.control = control
+        self.analyze = analyze and self.frames
+        self.session_dir = os.path.join(frames_root, replay_id)
+        self.stats = {'session': replay_id, 'source': source_id, 'samples': 0, 'payloads': 0, 'frames': 0,
+                      'max_lag_s': 0.0, 'duration_s': None, 'error': None}
+        self.thread = threading.Thread(target=self._run_safe, name=f"replay_{replay_id}", daemon=True)
+
+    # --- Plan ---
+    def plan(self):
+        """Eventos (instante relativo, tipo, datos) y el instante original del inicio de la sesión."""
+        events, starts = [], []
+        self.bio = None
+        if self.paths.get('biomedidas'):
+            bio = load_biomedidas(self.paths['biomedidas'])
+            keep = np.isfinite(bio['timestamp'])
+            self.bio = {k: v[keep] for k, v in bio.items()}
+            self.bio_times = spread_timestamps(self.bio['timestamp'])
+            if len(self.bio_times):
+                starts.append(self.bio_times[0])
+        if self.frames:
+            self.frame_kind, self.frame_refs, self.frame_names, walls = load_frames(self.paths['frames'])
+            if walls is None:
+                # Capturas sin frame_index.bin: ritmo nominal desde el inicio de las bioseñales
+                base = starts[0] if starts else time.time()
+                walls = base + np.arange(len(self.frame_refs)) / DEFAULT_CAPTURE_FPS
+            self.frame_walls = walls
+            if len(walls):
+                starts.append(walls[0])
+        t0 = min(starts) if starts else 0.0
+        if self.bio is not None:
+            n = len(self.bio_times)
+            step = 1 if self.json_payload else self.batch_size
+            # Una trama sale cuando se completa (instante de su última muestra), como en el firmware
+            for first in range(0, n, step):
+                last = min(first + step, n) - 1
+                events.append((self.bio_times[last] - t0, 0, (first, last + 1)))
+        if self.frames:
+            events.extend((w - t0, 1, i) for i, w in enumerate(self.frame_walls))
+        events.sort(key=lambda e: (e[0], e[1]))
+        return events, t0
+
+    # --- Emisión ---
+    def emit_samples(self, first, end, shift):
+        ts = np.round(self.bio['timestamp'][first:end] + shift)
+        topic = f"tesis/{self.device_id}/biomedidas"
+        if self.json_payload:
+            value = lambda v, fmt: "ND" if not np.isfinite(v) else fmt % v
+            doc = {'timestamp': int(ts[0]), 'gsr': int(self.bio['gsr'][first]) if np.isfinite(self.bio['gsr'][first]) else "ND",
+                   'temp': value(self.bio['temp'][first], '%.2f'), 'hr': value(self.bio['hr'][first], '%.1f'),
+                   'spo2': value(self.bio['spo2'][first], '%.1f')}
+            payload = json.dumps(doc)
+        else:
+            gsr = np.nan_to_num(self.bio['gsr'][first:end], nan=0).clip(0, 0xFFFF)
+            payload = encode_samples(ts, gsr, self.bio['temp'][first:end], self.bio['hr'][first:end], self.bio['spo2'][first:end])
+        self.publisher.publish(topic, payload)
+        self.stats['samples'] += end - first
+        self.stats['payloads'] += 1
+
+    def emit_frame(self, i, shift):
+        name = self.frame_names[i]
+        if self.frame_kind == 'store':
+            frame = open_store(store_path(self.paths['frames']))[self.frame_refs[i]]
+            if self.store_writer is None:
+                self.store_writer = FrameStoreWriter(os.path.join(self.capture_dir, STORE_FILENAME))
+            self.store_writer.append(frame, i, name)
+        else:
+            # Copia a un nombre temporal y renombrado: el analizador nunca ve un frame a medias
+            partial = os.path.join(self.capture_dir, '.' + name)
+            shutil.copyfile(self.frame_refs[i], partial)
+            os.replace(partial, os.path.join(self.capture_dir, name))
+        numbers = FRAME_NUMBER.findall(name)
+        self.frame_index.append(int(numbers[-1]) if numbers else i, time.monotonic(), self.frame_walls[i] + shift)
+        if self.stats['frames'] == 0:
+            tracing.record(self.replay_id, 'primer_frame', device=self.device_id)
+        self.stats['frames'] += 1
+
+    # --- Ciclo de vida ---
+    def start(self):
+        self.thread.start()
+
+    def join(self):
+        self.thread.join()
+        return self.stats
+
+    def _run_safe(self):
+        try:
+            with tracing.span(self.replay_id, 'reproduccion', source=self.source_id, speed=self.speed):
+                self.run()
+        except Exception as e:
+            self.stats['error'] = str(e)
+            print(f"❌ [{self.replay_id}] La reproducción falló: {e}")
+
+    def run(self):
+        events, t0 = self.plan()
+        if not events:
+            raise ValueError(f"la sesión '{self.source_id}' no tiene biomedidas ni frames que reproducir")
+        import control_client
+        if self.paths.get('audio'):
+            session_catalog.safe_register(self.replay_id, 'audio', self.paths['audio'])
+        analysis = None
+        if self.frames:
+            os.makedirs(self.session_dir, exist_ok=True)
+            session_catalog.safe_register(self.replay_id, 'frames', self.session_dir)
+            if self.analyze:
+                # Como en el flujo en directo, el análisis arranca antes que la captura y espera sus frames
+                analysis = self.start_analysis()
+            self.capture_dir = os.path.join(self.session_dir, time.strftime("%Y-%m-%d_%H-%M-%S"))
+            os.makedirs(self.capture_dir, exist_ok=True)
+            self.frame_index = FrameIndexWriter(self.capture_dir)
+            self.store_writer = None
+        if self.control and self.bio is not None:
+            result = control_client.get_control_client().send("start", self.replay_id, device_id=self.device_id, expect=('receptor',), optional=())
+            print(f"▶️ [{self.replay_id}] {control_client.format_result(result)}")
+            if self.device_id != 'esp32':
+                # El receptor solo cataloga el CSV del dispositivo por defecto; el de la reproducción se registra aquí
+                session_catalog.safe_register(self.replay_id, 'biomedidas', os.path.join(BIOMEDIDAS_DIR, self.replay_id, f"biomedidas_{self.device_id}.csv"))
+        print(f"🔁 [{self.replay_id}] Reproduciendo '{self.source_id}': {len(events)} eventos a "
+              f"{'máxima velocidad' if self.speed <= 0 else f'{self.speed:g}x'}.")
+        shift = time.time() - t0
+        started = time.monotonic()
+        try:
+            for t, kind, data in events:
+                if self.speed > 0:
+                    delay = started + t / self.speed - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                    else:
+                        self.stats['max_lag_s'] = max(self.stats['max_lag_s'], -delay)
+                if kind == 0:
+                    self.emit_samples(*data, shift)
+                else:
+                    self.emit_frame(data, shift)
+        finally:
+            self.stats['duration_s'] = round(time.monotonic() - started, 2)
+            if self.frames:
+                if self.store_writer is not None:
+                    self.store_writer.close()
+                self.frame_index.close()
+                mark_capture_done(self.capture_dir, {'written': self.stats['frames'], 'replay_of': self.source_id})
+            if self.control and self.bio is not None:
+                result = control_client.get_control_client().send("stop", self.replay_id, device_id=self.device_id, expect=('receptor',), optional=())
+                print(f"⏹️ [{self.replay_id}] {control_client.format_result(result)}")
+        if analysis is not None:
+            self.stats['analysis'] = self.wait_analysis(analysis)
+
+    # --- Análisis en streaming de los frames reproducidos ---
+    def start_analysis(self):
+        import emotion_service
+        if emotion_service.is_available():
+            job = {'result': None, 'error': None}
+            def run():
+                try:
+                    job['result'] = emotion_service.analyze_via_service(self.session_dir, mode='stream')
+                except OSError as e:
+                    job['error'] = e
+            job['thread'] = threading.Thread(target=run, daemon=True)
+            job['thread'].start()
+            return job
+        return {'process': subprocess.Popen([sys.executable, ANALYZER_SCRIPT, "--input", self.session_dir, "--stream"],
+                                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)}
+
+    def wait_analysis(self, job):
+        """
+        Resultado del análisis en una línea. Con el servicio, los trabajos de todas las copias corren a la vez
+        pero comparten un único modelo: la inferencia se serializa, y se informa de cuánto esperó cada copia
+        por ella (la carga mide esa cola, no inferencia en paralelo). Los subprocesos cargan cada uno su modelo.
+        """
+        if 'process' in job:
+            _, stderr = job['process'].communicate()
+            status = "ok" if job['process'].returncode == 0 else (stderr.strip()[-300:] or f"código {job['process'].returncode}")
+            return f"{status} (subproceso propio)"
+        import emotion_service
+        job['thread'].join(emotion_service.CLIENT_TIMEOUT_S)
+        if job['thread'].is_alive():
+            return f"sin respuesta del servicio en {emotion_service.CLIENT_TIMEOUT_S} s"
+        result = job['result'] or {}
+        status = "ok" if result.get('ok') else str(job['error'] or result.get('error', 'sin resultados'))
+        if 'inference_wait_s' in result:
+            status += (f" (servicio, inferencia serializada: {result['inference_wait_s']:.1f} s esperando el modelo"
+                       f" de {result.get('run_s', 0):.1f} s)")
+        return status
+
+class MqttPublisher:
+    """Publica las tramas por la conexión persistente del cliente de control (una para todas las sesiones)."""
+
+    def __init__(self):
+        import control_client
+        self.client = control_client.get_control_client().client
+
+    def publish(self, topic, payload):
+        self.client.publish(topic, payload, qos=0)
+
+def format_stats(stats):
+    line = (f"{stats['session']} (de {stats['source']}): {stats['samples']} muestras en {stats['payloads']} tramas, "
+            f"{stats['frames']} frames en {stats['duration_s']} s; retraso máx. {stats['max_lag_s'] * 1000:.0f} ms")
+    if stats.get('analysis'):
+        line += f"; análisis: {stats['analysis']}"
+    return ("❌ " if stats['error'] else "✅ ") + line + (f" ❌ {stats['error']}" if stats['error'] else "")
+
+def replay_sessions(session_ids, copies=1, speed=1.0, device_prefix=DEVICE_PREFIX, publisher=None, suffix=None, **options):
+    """Reproduce las sesiones (cada una `copies` veces) a la vez y devuelve sus estadísticas."""
+    publisher = publisher or MqttPublisher()
+    suffix = suffix or time.strftime("%H%M%S")
+    replays = []
+    for source_id in session_ids:
+        paths = resolve_session(source_id)
+        if not paths['biomedidas'] and not paths['frames']:
+            print(f"⚠️ La sesión '{source_id}' no tiene biomedidas ni frames en el catálogo; se omite.")
+            continue
+        for copy in range(copies):
+            n = len(replays)
+            replay_id = f"{source_id}_rep{suffix}" + (f"_{copy + 1}" if copies > 1 else "")
+            device_id = device_prefix + (str(n) if n else "")
+            replays.append(SessionReplay(source_id, replay_id, device_id, paths, publisher, speed=speed, **options))
+    for replay in replays:
+        replay.start()
+    return [replay.join() for replay in replays]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reproduce sesiones grabadas (bioseñales por MQTT y frames) con su ritmo original.")
+    parser.add_argument("sessions", nargs="+", help="IDs de las sesiones del catálogo.")
+    parser.add_argument("--speed", type=float, default=1.0, help="Velocidad: 1 = tiempo real, N = N veces más rápido, 0 = lo más rápido posible.")
+    parser.add_argument("--copies", type=int, default=1, help="Copias simultáneas de cada sesión (pruebas de carga).")
+    parser.add_argument("--device-prefix", default=DEVICE_PREFIX, help="Prefijo del dispositivo de cada reproducción.")
+    parser.add_argument("--batch", type=int, default=BATCH_SIZE, help="Muestras por trama binaria.")
+    parser.add_argument("--json", action="store_true", help="Publica una trama JSON por muestra (formato original del firmware).")
+    parser.add_argument("--no-frames", action="store_true", help="Solo bioseñales.")
+    parser.add_argument("--no-control", action="store_true", help="No envía START/STOP al receptor.")
+    parser.add_argument("--analyze", action="store_true", help="Analiza en streaming los frames reproducidos (servicio o analizar_emocion.py --stream).")
+    parser.add_argument("--frames-dir", default=FRAMES_DIR, help="Carpeta donde se crean las sesiones reproducidas.")
+    args = parser.parse_args()
+
+    results = replay_sessions(args.sessions, copies=max(1, args.copies), speed=max(0.0, args.speed), device_prefix=args.device_prefix,
+                              batch_size=args.batch, json_payload=args.json, frames=not args.no_frames,
+                              control=not args.no_control, analyze=args.analyze, frames_root=args.frames_dir)
+    for stats in results:
+        print(format_stats(stats))
+    sys.exit(1 if not results or any(s['error'] for s in results) else 0)
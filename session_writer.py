@@ -0,0 +1,272 @@
+import os
+import csv
+import math
+import time
+import struct
+import threading
+
+# ===============================================================
+# --- CONFIGURACIÓN ---
+# ===============================================================
+BIOMEDIDAS_FIELDS = ['timestamp', 'gsr', 'temp', 'hr', 'spo2']
+
+# Formato del log binario: cabecera (magic, versión, tamaño de registro)
+# seguida de registros de ancho fijo. Los valores "ND" se guardan como NaN.
+BINARY_LOG_MAGIC = b'BIOL'
+BINARY_LOG_VERSION = 1
+BINARY_LOG_HEADER = struct.Struct('<4sHH')
+BINARY_LOG_RECORD = struct.Struct('<dffff')  # timestamp, gsr, temp, hr, spo2
+BINARY_LOG_DTYPE = [('timestamp', '<f8'), ('gsr', '<f4'), ('temp', '<f4'), ('hr', '<f4'), ('spo2', '<f4')]
+
+DEFAULT_BATCH_SIZE = 200        # Muestras acumuladas antes de volcar a disco
+DEFAULT_FLUSH_INTERVAL = 1.0    # Segundos máximos que una muestra espera en memoria
+
+# ===============================================================
+# --- FUNCIONES AUXILIARES ---
+# ===============================================================
+def to_float(value):
+    """Convierte un valor de la trama ("36.50", 72, "ND", None) a float; NaN si no es numérico."""
+    if value == 'ND':
+        return math.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+def read_binary_log(path):
+    """Carga un log binario completo como array estructurado de NumPy (una sola lectura)."""
+    import numpy as np
+    dtype = np.dtype(BINARY_LOG_DTYPE)
+    with open(path, 'rb') as f:
+        magic, version, record_size = BINARY_LOG_HEADER.unpack(f.read(BINARY_LOG_HEADER.size))
+        if magic != BINARY_LOG_MAGIC or version != BINARY_LOG_VERSION or record_size != dtype.itemsize:
+            raise ValueError(f"Log binario no reconocido: {path}")
+        data = f.read()
+    # Un registro incompleto al final (corte de luz) se descarta
+    usable = len(data) - len(data) % record_size
+    return np.frombuffer(data[:usable], dtype=dtype)
+
+# ===============================================================
+# --- ESCRITORES DE SESIÓN ---
+# ===============================================================
+class SessionWriter:
+    """
+    Escritor de sesión con escritura por lotes.
+
+    Las muestras se acumulan en memoria y se vuelcan cuando el lote alcanza
+    `batch_size` o cuando la muestra más antigua supera `flush_interval` segundos.
+    Garantía de durabilidad: cuando `close()` retorna, todas las muestras recibidas
+    con `write()` antes de la llamada están escritas y sincronizadas (fsync) en disco.
+    Las muestras que llegan después de `close()` no se aceptan: se descartan y se cuentan en `samples_dropped`.
+    """
+    extension = ''
+
+    def __init__(self, data_dir, basename='biomedidas', batch_size=DEFAULT_BATCH_SIZE, flush_interval=DEFAULT_FLUSH_INTERVAL, fields=BIOMEDIDAS_FIELDS):
+        self.path = os.path.join(data_dir, basename + self.extension)
+        self.fields = fields
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.samples_written = 0
+        self.samples_dropped = 0
+        self._batch = []
+        self._pending = 0
+        self._oldest = None
+        self._lock = threading.Lock()
+        self._file = self._open()
+
+    def _open(self):
+        raise NotImplementedError
+
+    def _write_batch(self, batch):
+        raise NotImplementedError
+
+    def _write_columns(self, columns):
+        raise NotImplementedError
+
+    def write(self, sample):
+        """Añade una muestra (dict con las claves de BIOMEDIDAS_FIELDS) al lote actual."""
+        with self._lock:
+            if self._file is None:
+                self.samples_dropped += 1
+                return
+            self._mark_pending(1)
+            self._batch.append(sample)
+            self._flush_if_full_locked()
+
+    def write_many(self, samples):
+        """Añade varias muestras de una vez (una sola adquisición del lock)."""
+        with self._lock:
+            if self._file is None:
+                self.samples_dropped += len(samples)
+                return
+            self._mark_pending(len(samples))
+            self._batch.extend(samples)
+            self._flush_if_full_locked()
+
+    def write_columns(self, columns):
+        """
+        Añade un bloque de muestras en forma columnar (array estructurado de NumPy o dict de arrays
+        con las claves de BIOMEDIDAS_FIELDS; NaN para lecturas no disponibles) sin crear un dict por muestra.
+        """
+        count = len(columns['timestamp'])
+        if count == 0:
+            return
+        with self._lock:
+            if self._file is None:
+                self.samples_dropped += count
+                return
+            # Se respeta el orden con las muestras en dict que estuvieran pendientes
+            if self._batch:
+                self._write_batch(self._batch)
+                self._batch = []
+            self._write_columns(columns)
+            self._mark_pending(count)
+            self._flush_if_full_locked()
+
+    def flush_if_due(self):
+        """Vuelca el lote si ha superado el intervalo máximo. Pensado para un temporizador externo."""
+        with self._lock:
+            if self._pending and time.monotonic() - self._oldest >= self.flush_interval:
+                self._flush_locked()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _mark_pending(self, count):
+        if not self._pending:
+            self._oldest = time.monotonic()
+        self._pending += count
+
+    def _flush_if_full_locked(self):
+        if self._pending >= self.batch_size or time.monotonic() - self._oldest >= self.flush_interval:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if self._file is None:
+            return
+        if self._batch:
+            self._write_batch(self._batch)
+            self._batch = []
+        self.samples_written += self._pending
+        self._pending = 0
+        self._file.flush()
+
+    def close(self):
+        """Vuelca lo pendiente, sincroniza con disco y cierra el archivo."""
+        with self._lock:
+            if self._file is None:
+                return
+            try:
+                self._flush_locked()
+                os.fsync(self._file.fileno())
+            finally:
+                self._file.close()
+                self._file = None
+
+class CsvSessionWriter(SessionWriter):
+    """
+    Escribe el `biomedidas.csv` de siempre (separador ';', cabecera solo si el archivo es nuevo).
+    Con `fields` sirve también para otros CSV por sesión (p. ej. las estimaciones de PPG).
+    """
+    extension = '.csv'
+
+    def _open(self):
+        f = open(self.path, 'a', newline='')
+        self._csv_writer = csv.DictWriter(f, fieldnames=self.fields, delimiter=';', extrasaction='ignore')
+        if f.tell() == 0:
+            self._csv_writer.writeheader()
+        return f
+
+    def _write_batch(self, batch):
+        self._csv_writer.writerows(batch)
+
+    def _write_columns(self, columns):
+        # Mismo texto que produce la trama JSON del ESP32: "ND" para lecturas no disponibles (NaN)
+        import numpy as np
+
+        def formatted(values, fmt):
+            return ['ND' if v != v else fmt % v for v in np.asarray(values, dtype=float).tolist()]
+
+        self._csv_writer.writer.writerows(zip(
+            formatted(columns['timestamp'], '%d'), formatted(columns['gsr'], '%d'),
+            formatted(columns['temp'], '%.2f'), formatted(columns['hr'], '%.1f'), formatted(columns['spo2'], '%d'),
+        ))
+
+class BinaryLogSessionWriter(SessionWriter):
+    """Log binario de solo anexado con registros de ancho fijo (24 bytes por muestra)."""
+    extension = '.bin'
+
+    def _open(self):
+        f = open(self.path, 'ab')
+        if f.tell() == 0:
+            f.write(BINARY_LOG_HEADER.pack(BINARY_LOG_MAGIC, BINARY_LOG_VERSION, BINARY_LOG_RECORD.size))
+        return f
+
+    def _write_batch(self, batch):
+        pack = BINARY_LOG_RECORD.pack
+        self._file.write(b''.join(
+            pack(to_float(s.get('timestamp')), to_float(s.get('gsr')), to_float(s.get('temp')), to_float(s.get('hr')), to_float(s.get('spo2')))
+            for s in batch
+        ))
+
+    def _write_columns(self, columns):
+        import numpy as np
+        records = np.empty(len(columns['timestamp']), dtype=BINARY_LOG_DTYPE)
+        for field in BIOMEDIDAS_FIELDS:
+            records[field] = columns[field]
+        self._file.write(records.tobytes())
+
+class MultiSessionWriter:
+    """Reparte cada muestra entre varios escritores (p. ej. CSV + log binario)."""
+
+    def __init__(self, writers):
+        self.writers = writers
+        self.path = writers[0].path if writers else ''
+
+    @property
+    def samples_written(self):
+        return self.writers[0].samples_written if self.writers else 0
+
+    @property
+    def samples_dropped(self):
+        return self.writers[0].samples_dropped if self.writers else 0
+
+    def write(self, sample):
+        for w in self.writers: w.write(sample)
+
+    def write_many(self, samples):
+        for w in self.writers: w.write_many(samples)
+
+    def write_columns(self, columns):
+        for w in self.writers: w.write_columns(columns)
+
+    def flush_if_due(self):
+        for w in self.writers: w.flush_if_due()
+
+    def flush(self):
+        for w in self.writers: w.flush()
+
+    def close(self):
+        # Se cierran todos aunque uno falle (p. ej. fsync con el disco lleno): el resto no pierde su volcado
+        error = None
+        for w in self.writers:
+            try:
+                w.close()
+            except Exception as e:
+                error = error or e
+        if error is not None:
+            raise error
+
+WRITER_FORMATS = {
+    'csv': CsvSessionWriter,
+    'bin': BinaryLogSessionWriter,
+}
+
+def open_session_writer(data_dir, formats=('csv',), basename='biomedidas', **kwargs):
+    """Abre un escritor por cada formato pedido y los agrupa en uno solo."""
+    unknown = [f for f in formats if f not in WRITER_FORMATS]
+    if unknown:
+        raise ValueError(f"Formatos de salida desconocidos: {unknown}. Disponibles: {list(WRITER_FORMATS)}")
+    os.makedirs(data_dir, exist_ok=True)
+    return MultiSessionWriter([WRITER_FORMATS[f](data_dir, basename=basename, **kwargs) for f in formats])
@@ -19,6 +19,7 @@ cleanup() {
     echo "[INFO] Señal de salida recibida. Limpiando procesos en segundo plano..."
     # 'pkill' es una forma segura de matar el proceso usando parte de su nombre
     pkill -f "python3 mqtt/receptor_controlado.py"
+    pkill -f "python3 emotion_service.py serve"
     echo "[INFO] Limpieza completada. Adios."
     exit 0
 }
@@ -30,6 +31,11 @@ trap cleanup INT TERM
 echo "[INFO] Lanzando receptor MQTT en segundo plano..."
 python3 mqtt/receptor_controlado.py &
 
+# Lanzamos el servicio de análisis emocional: carga TensorFlow/DeepFace una sola vez y
+# atiende los análisis de todas las sesiones con los modelos ya en memoria
+echo "[INFO] Lanzando servicio de análisis emocional en segundo plano..."
+python3 emotion_service.py serve &
+
 # Damos un pequeño respiro para que el receptor se inicie correctamente
 sleep 2
 
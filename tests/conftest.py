@@ -0,0 +1,13 @@
+import os
+import sys
+import tempfile
+
+# Los módulos del proyecto están en la raíz del repositorio (se ejecutan como scripts sueltos)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# El catálogo, las trazas y la caché de fusión leen su ruta al importarse: se redirigen a una carpeta
+# temporal para que las pruebas nunca toquen el estado real de /home/alvar
+_STATE_DIR = tempfile.mkdtemp(prefix="tesis_tests_")
+os.environ.setdefault('TESIS_CATALOG', os.path.join(_STATE_DIR, 'sesiones.db'))
+os.environ.setdefault('TESIS_TRACES', os.path.join(_STATE_DIR, 'trazas.jsonl'))
+os.environ.setdefault('TESIS_FUSION_CACHE', os.path.join(_STATE_DIR, 'fusion'))
@@ -0,0 +1,49 @@
+import math
+
+import numpy as np
+import pytest
+
+from biopayload import (PAYLOAD_HEADER, SAMPLE_DTYPE, MAX_SAMPLES_PER_PAYLOAD, decode_payload, decode_payloads,
+                        encode_samples, is_binary_payload)
+
+def make_columns(n, start=1700000000):
+    return (np.arange(start, start + n), np.arange(n) % 4096, np.linspace(33, 37, n), np.full(n, 72.5), np.full(n, 98.0))
+
+def test_round_trip_conserva_las_muestras():
+    columns = make_columns(10)
+    samples = decode_payload(encode_samples(*columns))
+    assert samples.dtype == SAMPLE_DTYPE
+    for field, values in zip(SAMPLE_DTYPE.names, columns):
+        np.testing.assert_allclose(samples[field], values, rtol=1e-6)
+
+def test_nan_representa_lecturas_no_disponibles():
+    samples = decode_payload(encode_samples([1, 2], [10, 20], [math.nan, 36.5], [70.0, math.nan], [math.nan, 97.0]))
+    assert math.isnan(samples['temp'][0]) and math.isnan(samples['hr'][1]) and math.isnan(samples['spo2'][0])
+    assert samples['temp'][1] == pytest.approx(36.5)
+
+def test_trama_vacia():
+    payload = encode_samples([], [], [], [], [])
+    assert len(payload) == PAYLOAD_HEADER.size
+    assert len(decode_payload(payload)) == 0
+
+def test_distingue_binario_de_json():
+    assert is_binary_payload(encode_samples(*make_columns(1)))
+    assert not is_binary_payload(b'{"timestamp": 1}')
+
+def test_rechaza_tramas_truncadas_o_ajenas():
+    payload = encode_samples(*make_columns(3))
+    with pytest.raises(ValueError):
+        decode_payload(payload[:-1])
+    with pytest.raises(ValueError):
+        decode_payload(payload[:3])
+    with pytest.raises(ValueError):
+        decode_payload(b'XX' + payload[2:])
+
+def test_limite_de_muestras_por_trama():
+    with pytest.raises(ValueError):
+        encode_samples(*make_columns(MAX_SAMPLES_PER_PAYLOAD + 1))
+
+def test_decode_payloads_concatena_en_orden():
+    samples = decode_payloads([encode_samples(*make_columns(3, start=100)), encode_samples(*make_columns(2, start=200))])
+    assert samples['timestamp'].tolist() == [100, 101, 102, 200, 201]
+    assert len(decode_payloads([])) == 0
@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import decimation
+
+def test_lttb_conserva_extremos_y_numero_de_puntos():
+    x = np.arange(10000)
+    y = np.sin(x / 100.0)
+    idx = decimation.lttb_indices(x, y, 500)
+    assert len(idx) == 500 and idx[0] == 0 and idx[-1] == len(x) - 1
+    assert np.all(np.diff(idx) > 0)
+
+def test_lttb_no_pierde_un_pico_aislado():
+    y = np.zeros(10000)
+    y[4321] = 100.0
+    xs, ys = decimation.decimate(np.arange(len(y)), y, 200, 'lttb')
+    assert ys.max() == 100.0 and 4321 in xs
+
+def test_minmax_conserva_minimo_y_maximo():
+    rng = np.random.default_rng(0)
+    y = rng.normal(size=5000)
+    idx = decimation.minmax_indices(y, 100)
+    assert len(idx) <= 100
+    assert y.argmax() in idx and y.argmin() in idx
+
+def test_series_cortas_sin_cambios():
+    y = np.array([3.0, 1.0, 2.0])
+    assert decimation.lttb_indices(np.arange(3), y, 1000).tolist() == [0, 1, 2]
+    assert decimation.minmax_indices(y, 1000).tolist() == [0, 1, 2]
+
+def test_decimate_quita_nan_y_valida_el_metodo():
+    y = np.array([1.0, np.nan, 3.0, np.nan])
+    xs, ys = decimation.decimate(np.arange(4), y, 10, 'minmax')
+    assert xs.tolist() == [0, 2] and ys.tolist() == [1.0, 3.0]
+    with pytest.raises(ValueError):
+        decimation.decimate(np.arange(4), y, 10, 'media')
+
+def test_lttb_con_fechas():
+    x = pd.date_range('2025-01-01', periods=2000, freq='s').to_numpy()
+    xs, ys = decimation.decimate(x, np.cos(np.arange(2000) / 50.0), 100, 'lttb')
+    assert len(xs) == 100 and xs.dtype == x.dtype
+
+def test_time_window_y_decimate_frame():
+    df = pd.DataFrame({'timestamp': pd.date_range('2025-01-01', periods=100, freq='s'),
+                       'hr': np.arange(100.0), 'gsr': ['ND'] * 50 + [str(v) for v in range(50)]})
+    window = decimation.time_window(df, 10, 20)
+    assert len(window) == 11 and window['hr'].iloc[0] == 10.0
+    assert decimation.time_window(df, 0, 0) is df
+    series = decimation.decimate_frame(df, ['hr', 'gsr', 'spo2'], 20, 'lttb')
+    assert set(series) == {'hr', 'gsr'}
+    assert len(series['gsr'][0]) == 20
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import frame_sampling
+from frame_sampling import ORIGIN_COMPUTED, ORIGIN_INFERRED
+
+def test_select_rate():
+    selected = frame_sampling.select_rate(41, target_fps=2.0, capture_fps=20.0)
+    assert np.flatnonzero(selected).tolist() == [0, 10, 20, 30, 40]
+    assert frame_sampling.select_rate(0).size == 0
+    assert frame_sampling.select_rate(5, target_fps=100.0, capture_fps=20.0).all()
+
+def test_select_adaptive_detecta_cambios_y_limita_el_hueco():
+    signatures = np.zeros((12, 4, 4), dtype=np.float32)
+    signatures[5:] = 100.0
+    selected = frame_sampling.select_adaptive(signatures, threshold=3.0, max_gap=4)
+    # Primero y último, el cambio brusco (5) y como mucho max_gap frames seguidos sin analizar
+    assert np.flatnonzero(selected).tolist() == [0, 4, 5, 9, 11]
+
+def test_select_adaptive_recoge_derivas_lentas():
+    signatures = np.arange(10, dtype=np.float32)[:, None, None] * np.ones((1, 2, 2), dtype=np.float32)
+    selected = frame_sampling.select_adaptive(signatures, threshold=3.0, max_gap=100)
+    assert np.flatnonzero(selected).tolist() == [0, 3, 6, 9]
+
+@pytest.mark.filterwarnings('ignore:Mean of empty slice')
+def test_select_adaptive_analiza_los_frames_ilegibles():
+    signatures = np.zeros((4, 2, 2), dtype=np.float32)
+    signatures[2] = np.nan
+    selected = frame_sampling.select_adaptive(signatures, max_gap=100)
+    assert selected[2] and selected[3]
+
+def test_select_frames():
+    paths = [f"frame_{i:04d}.jpg" for i in range(21)]
+    assert frame_sampling.select_frames(paths) == paths
+    assert frame_sampling.select_frames(paths, 'rate', target_fps=2.0, capture_fps=20.0) == [paths[0], paths[10], paths[20]]
+    with pytest.raises(ValueError):
+        frame_sampling.select_frames(paths, 'aleatorio')
+
+def test_fill_skipped_interpola_los_frames_no_analizados():
+    frames = [f"/captura/frame_{i:04d}.jpg" for i in range(5)]
+    df = pd.DataFrame({'archivo': ['frame_0000.jpg', 'frame_0004.jpg'], 'emocion_dominante': ['happy', 'sad'],
+                       'happy': [80.0, 0.0], 'sad': [20.0, 100.0]})
+    filled = frame_sampling.fill_skipped(df, frames, ['happy', 'sad'])
+    assert filled['archivo'].tolist() == [f"frame_{i:04d}.jpg" for i in range(5)]
+    assert filled['happy'].tolist() == pytest.approx([80.0, 60.0, 40.0, 20.0, 0.0])
+    assert filled['origen'].tolist() == [ORIGIN_COMPUTED] + [ORIGIN_INFERRED] * 3 + [ORIGIN_COMPUTED]
+    assert filled['emocion_dominante'].tolist() == ['happy', 'happy', 'sad', 'sad', 'sad']
+    assert 'origen' not in df.columns
+
+def test_fill_skipped_sin_filas_calculadas_devuelve_el_original():
+    df = pd.DataFrame({'archivo': [], 'emocion_dominante': [], 'happy': []})
+    assert frame_sampling.fill_skipped(df, ['frame_0000.jpg'], ['happy']) is df
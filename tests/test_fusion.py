@@ -0,0 +1,75 @@
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import fusion
+
+T0 = 1700000000.0
+
+def emotions_frame(times, happy, sad=None, origin=None):
+    df = pd.DataFrame({'timestamp': times, 'happy': happy, 'sad': sad if sad is not None else [0.0] * len(times)})
+    if origin is not None:
+        df['origen'] = origin
+    return df
+
+def test_align_promedia_por_paso():
+    emotions = emotions_frame([T0 + 0.1, T0 + 0.6, T0 + 1.2, T0 + 3.5], [10.0, 30.0, 80.0, 5.0], [50.0, 50.0, 10.0, 90.0],
+                              origin=['calculado', 'inferido', 'calculado', 'calculado'])
+    bio = pd.DataFrame({'timestamp': [T0, T0 + 1, T0 + 2, T0 + 3], 'hr': [70.0, 71.0, 72.0, 73.0]})
+    fused = fusion.align(emotions, bio, step_s=1.0, tolerance_s=2.0)
+    # El paso 2 no tiene frames y no aparece
+    assert fused['t_rel'].tolist() == [0.0, 1.0, 3.0]
+    assert fused['happy'].tolist() == [20.0, 80.0, 5.0]
+    assert fused['frames'].tolist() == [2, 1, 1]
+    assert fused['frames_inferidos'].tolist() == [1, 0, 0]
+    assert fused['emocion_dominante'].tolist() == ['sad', 'happy', 'sad']
+    # Cada paso toma la lectura de biomedidas más cercana a su centro
+    assert fused['timestamp'].tolist() == [T0 + 0.5, T0 + 1.5, T0 + 3.5]
+    assert fused['hr'].tolist() == [70.0, 71.0, 73.0]
+
+def test_align_respeta_la_tolerancia():
+    emotions = emotions_frame([T0, T0 + 10], [1.0, 1.0])
+    bio = pd.DataFrame({'timestamp': [T0], 'hr': [70.0]})
+    fused = fusion.align(emotions, bio, tolerance_s=2.0)
+    assert fused['hr'].iloc[0] == 70.0 and np.isnan(fused['hr'].iloc[1])
+
+def test_align_sin_biomedidas():
+    fused = fusion.align(emotions_frame([T0], [1.0]), pd.DataFrame())
+    assert all(np.isnan(fused[c].iloc[0]) for c in fusion.BIOSIGNAL_COLUMNS)
+
+def test_load_biomedidas_interpola_nd_y_quita_repetidos(tmp_path):
+    path = tmp_path / 'biomedidas.csv'
+    path.write_text("timestamp;gsr;temp;hr;spo2\n"
+                    "1700000002;3;36.2;ND;98\n"
+                    "1700000000;1;36.0;70.0;ND\n"
+                    "1700000001;2;ND;ND;97\n"
+                    "1700000001;2;36.1;ND;97\n"
+                    "1700000003;4;36.3;76.0;99\n")
+    bio = fusion.load_biomedidas(str(path))
+    assert bio['timestamp'].tolist() == [1700000000, 1700000001, 1700000002, 1700000003]
+    assert bio['hr'].tolist() == pytest.approx([70.0, 72.0, 74.0, 76.0])
+    assert bio['temp'].tolist() == pytest.approx([36.0, 36.1, 36.2, 36.3])
+    # Fuera del tramo entre dos lecturas válidas no se inventan valores
+    assert np.isnan(bio['spo2'].iloc[0])
+
+def test_frame_times_sin_indice_usa_la_carpeta_de_captura(tmp_path):
+    capture = tmp_path / '2025-01-01_10-00-00'
+    capture.mkdir()
+    times, source = fusion.frame_times(str(capture), np.array([0, 20, 40]), capture_fps=20.0)
+    start = time.mktime(time.strptime('2025-01-01_10-00-00', fusion.CAPTURE_SUBDIR_FORMAT))
+    assert source == 'estimada'
+    assert times.tolist() == [start, start + 1, start + 2]
+
+def test_fuse_files_usa_la_cache(tmp_path):
+    capture = tmp_path / '2025-01-01_10-00-00'
+    capture.mkdir()
+    emotions_csv = capture / '_emotions_analysis.csv'
+    emotions_csv.write_text("archivo;emocion_dominante;happy;sad\nframe_0000.jpg;happy;90;10\nframe_0020.jpg;sad;10;90\n")
+    cache_dir = tmp_path / 'cache'
+    fused, cached = fusion.fuse_files(str(emotions_csv), None, cache_dir=str(cache_dir))
+    assert not cached and len(fused) == 2
+    again, cached = fusion.fuse_files(str(emotions_csv), None, cache_dir=str(cache_dir))
+    assert cached
+    pd.testing.assert_frame_equal(fused, again)
@@ -0,0 +1,68 @@
+import math
+
+import numpy as np
+import pytest
+
+import ppg
+
+SAMPLE_RATE = 100
+
+def feed(estimator, ir, red, epoch=1700000000, block=SAMPLE_RATE):
+    results = []
+    for start in range(0, len(ir), block):
+        payload = ppg.encode_ppg_block(ir[start:start + block], red[start:start + block], SAMPLE_RATE, epoch + start // SAMPLE_RATE)
+        header, ir_b, red_b, _ = ppg.decode_ppg_block(payload)
+        results.extend(estimator.add_block(header, ir_b, red_b))
+    return results
+
+def test_round_trip_de_bloque():
+    ir, red = np.arange(10, dtype=np.uint32), np.arange(10, 20, dtype=np.uint32)
+    payload = ppg.encode_ppg_block(ir, red, SAMPLE_RATE, 1234, millis=99)
+    header, ir_b, red_b, size = ppg.decode_ppg_block(payload)
+    assert header == {'count': 10, 'sample_rate': SAMPLE_RATE, 'epoch': 1234, 'millis': 99}
+    assert size == len(payload)
+    np.testing.assert_array_equal(ir_b, ir)
+    np.testing.assert_array_equal(red_b, red)
+    with pytest.raises(ValueError):
+        ppg.decode_ppg_block(payload[:-4])
+
+@pytest.mark.parametrize('hr, spo2', [(60.0, 98.0), (90.0, 94.0)])
+def test_estimador_recupera_hr_y_spo2(hr, spo2):
+    ir, red = ppg.synthetic_ppg(20, SAMPLE_RATE, hr=hr, spo2=spo2)
+    estimates = feed(ppg.PpgEstimator(SAMPLE_RATE), ir, red)
+    # Ventana de 8 s y una estimación por segundo a partir de ahí
+    assert len(estimates) == 13
+    last = estimates[-1]
+    assert last['hr'] == pytest.approx(hr, abs=3)
+    assert last['spo2'] == pytest.approx(spo2, abs=2)
+    assert last['quality'] > 0.9
+    assert [e['timestamp'] for e in estimates[:2]] == [1700000008, 1700000009]
+
+def test_sin_dedo_no_hay_estimacion():
+    ir, red = ppg.synthetic_ppg(10, SAMPLE_RATE, dc=1000)
+    estimate = ppg.estimate_window(ir, red, SAMPLE_RATE)
+    assert math.isnan(estimate['hr']) and math.isnan(estimate['spo2']) and estimate['beats'] == 0
+    assert ppg.format_estimate({**estimate, 'timestamp': 1})['hr'] == 'ND'
+
+def test_frecuencia_distinta_se_rechaza():
+    ir, red = ppg.synthetic_ppg(1, 50)
+    header, ir_b, red_b, _ = ppg.decode_ppg_block(ppg.encode_ppg_block(ir, red, 50, 0))
+    with pytest.raises(ValueError):
+        ppg.PpgEstimator(SAMPLE_RATE).add_block(header, ir_b, red_b)
+
+def test_buffer_circular_da_la_vuelta():
+    buffer = ppg.PpgRingBuffer(5)
+    buffer.append(np.arange(4, dtype=np.uint32), np.arange(4, dtype=np.uint32))
+    buffer.append(np.arange(4, 7, dtype=np.uint32), np.arange(4, 7, dtype=np.uint32))
+    ir, _ = buffer.latest(5)
+    assert ir.tolist() == [2, 3, 4, 5, 6] and buffer.total == 7
+
+def test_log_en_bruto_ignora_el_bloque_final_incompleto(tmp_path):
+    log = ppg.PpgRawLog(str(tmp_path))
+    ir, red = ppg.synthetic_ppg(2, SAMPLE_RATE)
+    log.write(ppg.encode_ppg_block(ir[:100], red[:100], SAMPLE_RATE, 1))
+    log.write(ppg.encode_ppg_block(ir[100:], red[100:], SAMPLE_RATE, 2)[:-8])
+    log.close()
+    ir_read, _, sample_rate, headers = ppg.read_ppg_raw_log(log.path)
+    assert sample_rate == SAMPLE_RATE and len(headers) == 1
+    np.testing.assert_array_equal(ir_read, ir[:100])
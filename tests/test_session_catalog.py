@@ -0,0 +1,83 @@
+import os
+
+import pytest
+
+import session_catalog
+from session_catalog import SessionCatalog
+
+@pytest.fixture
+def catalog(tmp_path):
+    catalog = SessionCatalog(str(tmp_path / 'sesiones.db'))
+    yield catalog
+    catalog.close()
+
+def test_register_y_consulta(catalog, tmp_path):
+    catalog.register('s1', 'biomedidas', str(tmp_path / 'bio.csv'), rows=10)
+    catalog.register('s2', 'audio', str(tmp_path / 's2.wav'))
+    catalog.record_timing('s1', 'analisis', 1.5, frames=20)
+    assert catalog.artifact('s1', 'biomedidas') == str(tmp_path / 'bio.csv')
+    assert catalog.artifact('s1', 'audio') is None
+    assert catalog.list_sessions() == ['s1', 's2']
+    assert catalog.list_sessions('audio') == ['s2']
+    session = catalog.session('s1')
+    assert session['timings'][0]['stage'] == 'analisis' and session['timings'][0]['frames'] == 20
+    assert catalog.session('nada') is None
+    assert len(catalog) == 2
+
+def test_register_reemplaza_la_ruta(catalog):
+    catalog.register('s1', 'frames', '/a')
+    catalog.register('s1', 'frames', '/b')
+    assert catalog.artifact('s1', 'frames') == '/b'
+
+def test_rebuild_indexa_lo_que_hay_en_disco(catalog, tmp_path):
+    (tmp_path / 'bio' / 's1').mkdir(parents=True)
+    (tmp_path / 'bio' / 's1' / 'biomedidas.csv').write_text("timestamp\n")
+    (tmp_path / 'bio' / 'sin_datos').mkdir()
+    capture = tmp_path / 'frames' / 's1' / '2025-01-01_10-00-00'
+    capture.mkdir(parents=True)
+    (capture / session_catalog.EMOTIONS_FILENAME).write_text("archivo\n")
+    (tmp_path / 'frames' / 's2').mkdir()
+    (tmp_path / 'frames' / 's2' / session_catalog.EMOTIONS_FILENAME).write_text("archivo\n")
+    (tmp_path / 'audio').mkdir()
+    (tmp_path / 'audio' / 's3.wav').write_bytes(b'')
+    (tmp_path / 'audio' / 'notas.txt').write_text("")
+    catalog.register('s1', 'biomedidas', '/ruta/registrada.csv')
+    total = catalog.rebuild(str(tmp_path / 'bio'), str(tmp_path / 'frames'), str(tmp_path / 'audio'))
+    assert total == 3
+    # Lo que ya estaba registrado no se sobrescribe
+    assert catalog.artifact('s1', 'biomedidas') == '/ruta/registrada.csv'
+    assert catalog.artifact('s1', 'frames') == str(capture)
+    assert catalog.list_sessions('emotions') == ['s1', 's2']
+    assert catalog.artifact('s1', 'emotions') == str(capture / session_catalog.EMOTIONS_FILENAME)
+    assert catalog.list_sessions('audio') == ['s3']
+
+def test_rebuild_no_toca_la_fecha_de_las_sesiones_conocidas(catalog, tmp_path):
+    catalog.register('s1', 'audio', '/a.wav')
+    updated = catalog.session('s1')['updated']
+    (tmp_path / 'bio' / 's1').mkdir(parents=True)
+    (tmp_path / 'bio' / 's1' / 'biomedidas.csv').write_text("timestamp\n")
+    catalog.rebuild(str(tmp_path / 'bio'))
+    assert catalog.session('s1')['updated'] == updated
+
+def test_latest_capture_dir_y_session_id(tmp_path):
+    session_dir = tmp_path / 'sesion'
+    for name in ('2025-01-01_10-00-00', '2025-01-02_09-00-00', '.oculta'):
+        (session_dir / name).mkdir(parents=True)
+    latest = session_catalog.latest_capture_dir(str(session_dir))
+    assert os.path.basename(latest) == '2025-01-02_09-00-00'
+    assert session_catalog.session_id_from_frames_dir(latest) == 'sesion'
+    assert session_catalog.session_id_from_frames_dir(str(session_dir)) == 'sesion'
+    assert session_catalog.latest_capture_dir(str(tmp_path / 'no_existe')) == str(tmp_path / 'no_existe')
+
+def test_find_audio(catalog, tmp_path):
+    (tmp_path / 'cancion_01.wav').write_bytes(b'')
+    (tmp_path / 'cancion_01_bis.wav').write_bytes(b'')
+    assert session_catalog.find_audio('cancion_01', str(tmp_path), catalog) == str(tmp_path / 'cancion_01.wav')
+    (tmp_path / 'musica').mkdir()
+    (tmp_path / 'musica' / 'otra.mp3').write_bytes(b'')
+    catalog.register('otra', 'audio', str(tmp_path / 'musica' / 'otra.mp3'))
+    assert session_catalog.find_audio('otra', str(tmp_path), catalog) == str(tmp_path / 'musica' / 'otra.mp3')
+    # Una ruta registrada que ya no existe no se devuelve
+    catalog.register('borrada', 'audio', '/musica/borrada.mp3')
+    assert session_catalog.find_audio('borrada', str(tmp_path), catalog) is None
+    assert session_catalog.find_audio('cancion', str(tmp_path), catalog) is None
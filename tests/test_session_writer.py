@@ -0,0 +1,101 @@
+import csv
+import math
+import os
+
+import numpy as np
+import pytest
+
+from session_writer import (BINARY_LOG_DTYPE, BinaryLogSessionWriter, CsvSessionWriter, open_session_writer,
+                            read_binary_log, to_float)
+
+SAMPLES = [
+    {'timestamp': 1700000000, 'gsr': 512, 'temp': '36.50', 'hr': '72.0', 'spo2': 98},
+    {'timestamp': 1700000001, 'gsr': 520, 'temp': 'ND', 'hr': '73.5', 'spo2': 'ND'},
+]
+
+def read_csv(path):
+    with open(path, newline='') as f:
+        return list(csv.DictReader(f, delimiter=';'))
+
+def test_to_float():
+    assert to_float("36.50") == 36.5 and to_float(72) == 72.0
+    assert math.isnan(to_float("ND")) and math.isnan(to_float(None)) and math.isnan(to_float("x"))
+
+def test_csv_y_binario_guardan_lo_mismo(tmp_path):
+    writer = open_session_writer(str(tmp_path), formats=('csv', 'bin'))
+    writer.write_many(SAMPLES)
+    writer.close()
+    rows = read_csv(tmp_path / 'biomedidas.csv')
+    assert [r['temp'] for r in rows] == ['36.50', 'ND'] and rows[1]['spo2'] == 'ND'
+    records = read_binary_log(str(tmp_path / 'biomedidas.bin'))
+    assert records['timestamp'].tolist() == [1700000000, 1700000001]
+    assert records['hr'][1] == pytest.approx(73.5)
+    assert math.isnan(records['temp'][1]) and math.isnan(records['spo2'][1])
+    assert writer.samples_written == len(SAMPLES)
+
+def test_columnas_de_trama_binaria(tmp_path):
+    columns = {'timestamp': np.array([10, 11]), 'gsr': np.array([1, 2]), 'temp': np.array([36.0, np.nan]),
+               'hr': np.array([np.nan, 80.0]), 'spo2': np.array([97.0, 96.0])}
+    writer = open_session_writer(str(tmp_path), formats=('csv', 'bin'))
+    writer.write_columns(columns)
+    writer.close()
+    rows = read_csv(tmp_path / 'biomedidas.csv')
+    assert rows[0] == {'timestamp': '10', 'gsr': '1', 'temp': '36.00', 'hr': 'ND', 'spo2': '97'}
+    np.testing.assert_array_equal(read_binary_log(str(tmp_path / 'biomedidas.bin'))['gsr'], [1, 2])
+
+def test_cabecera_csv_solo_en_archivo_nuevo(tmp_path):
+    for sample in SAMPLES:
+        writer = CsvSessionWriter(str(tmp_path))
+        writer.write(sample)
+        writer.close()
+    with open(tmp_path / 'biomedidas.csv') as f:
+        assert sum(line.startswith('timestamp') for line in f) == 1
+    assert len(read_csv(tmp_path / 'biomedidas.csv')) == 2
+
+def test_lote_pendiente_no_llega_a_disco_hasta_el_volcado(tmp_path):
+    writer = CsvSessionWriter(str(tmp_path), batch_size=100, flush_interval=3600)
+    writer.write(SAMPLES[0])
+    assert read_csv(tmp_path / 'biomedidas.csv') == []
+    writer.flush()
+    assert len(read_csv(tmp_path / 'biomedidas.csv')) == 1
+    writer.close()
+
+def test_binario_truncado_descarta_el_registro_incompleto(tmp_path):
+    writer = BinaryLogSessionWriter(str(tmp_path))
+    writer.write_many(SAMPLES)
+    writer.close()
+    path = tmp_path / 'biomedidas.bin'
+    with open(path, 'r+b') as f:
+        f.truncate(os.path.getsize(path) - np.dtype(BINARY_LOG_DTYPE).itemsize // 2)
+    records = read_binary_log(str(path))
+    assert records['timestamp'].tolist() == [1700000000]
+
+def test_binario_ajeno_se_rechaza(tmp_path):
+    path = tmp_path / 'otro.bin'
+    path.write_bytes(b'NOPE' + bytes(20))
+    with pytest.raises(ValueError):
+        read_binary_log(str(path))
+
+def test_tras_cerrar_se_descarta_y_se_cuenta(tmp_path):
+    writer = open_session_writer(str(tmp_path))
+    writer.close()
+    writer.write(SAMPLES[0])
+    assert writer.samples_dropped == 1 and writer.samples_written == 0
+
+def test_un_fallo_al_cerrar_no_impide_cerrar_los_demas(tmp_path):
+    writer = open_session_writer(str(tmp_path), formats=('csv', 'bin'))
+    writer.write_many(SAMPLES)
+
+    class FailingWriter:
+        def close(self):
+            raise OSError(28, "No space left on device")
+
+    writer.writers.insert(0, FailingWriter())
+    with pytest.raises(OSError):
+        writer.close()
+    assert len(read_csv(tmp_path / 'biomedidas.csv')) == 2
+    assert len(read_binary_log(str(tmp_path / 'biomedidas.bin'))) == 2
+
+def test_formato_desconocido(tmp_path):
+    with pytest.raises(ValueError):
+        open_session_writer(str(tmp_path), formats=('parquet',))
@@ -0,0 +1,242 @@
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import threading
+from contextlib import contextmanager
+
+# ===============================================================
+# --- TRAZAS DE TIEMPO POR SESIÓN ---
+# ===============================================================
+# Cada etapa del flujo (copia del audio, arranque de PowerShell, pre-captura, START al receptor,
+# primer frame, primera muestra, análisis...) deja un registro en un log compacto de líneas JSON:
+#
+#   {"s": sesión, "e": etapa, "p": proceso, "w": hora de reloj al empezar (epoch s),
+#    "m": reloj monotónico al empezar (s), "d": duración (s; 0 en eventos puntuales), ...atributos}
+#
+# La duración se mide con el reloj monotónico del proceso; la hora de reloj permite ordenar y comparar
+# etapas de procesos y máquinas distintas (p. ej. el desfase entre el START y el primer frame).
+# En WSL todos los procesos escriben en TRACE_PATH; en Windows, capture_10s.py y camera_server.py
+# escriben TRACE_FILENAME en la carpeta de frames de la sesión, que se lee desde WSL.
+#
+#   python3 tracing.py report [--session ID]     (resumen por etapa: p50 / p95 / máx.)
+#   python3 tracing.py serve                     (endpoint local de métricas, http://127.0.0.1:9105/metrics)
+
+TRACE_PATH = os.environ.get('TESIS_TRACES', '/home/alvar/tesis_trazas.jsonl')
+TRACE_FILENAME = 'trazas.jsonl'
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9105
+START_STAGES = ('mqtt_start', 'orden_grabacion')   # Referencias de inicio para los desfases entre procesos
+PROCESS_NAME = os.path.splitext(os.path.basename(sys.argv[0] or 'python'))[0] or 'python'
+
+class TraceLog:
+    """Log de trazas con una línea por registro; seguro entre hilos y con escrituras atómicas por línea (modo append)."""
+
+    def __init__(self, path=TRACE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+
+    def write(self, record):
+        line = json.dumps(record, separators=(',', ':'), ensure_ascii=False) + "\n"
+        with self._lock:
+            if self._file is None:
+                if os.path.dirname(self.path):
+                    os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                self._file = open(self.path, 'a', encoding='utf-8', buffering=1)
+            self._file.write(line)
+
+    def record(self, session_id, stage, duration_s=0.0, started_wall=None, started_mono=None, **attrs):
+        """Registra una etapa ya medida (o un evento puntual con duración 0). Nunca lanza excepciones."""
+        now_wall, now_mono = time.time(), time.monotonic()
+        record = {'s': session_id, 'e': stage, 'p': PROCESS_NAME,
+                  'w': round(started_wall if started_wall is not None else now_wall - duration_s, 4),
+                  'm': round(started_mono if started_mono is not None else now_mono - duration_s, 4),
+                  'd': round(float(duration_s), 4)}
+        record.update(attrs)
+        try:
+            self.write(record)
+        except Exception as e:
+            print(f"⚠️ No se pudo escribir la traza '{stage}' de '{session_id}': {e}")
+
+    @contextmanager
+    def span(self, session_id, stage, **attrs):
+        """Mide el bloque `with`; el registro incluye ok=False si el bloque lanza una excepción."""
+        wall, mono = time.time(), time.monotonic()
+        try:
+            yield attrs
+        except BaseException:
+            attrs['ok'] = False
+            raise
+        finally:
+            self.record(session_id, stage, time.monotonic() - mono, wall, mono, **attrs)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+_default_log = None
+
+def get_trace_log():
+    """Log de trazas por defecto del proceso (TRACE_PATH)."""
+    global _default_log
+    if _default_log is None:
+        _default_log = TraceLog()
+    return _default_log
+
+def record(session_id, stage, duration_s=0.0, **attrs):
+    get_trace_log().record(session_id, stage, duration_s, **attrs)
+
+def span(session_id, stage, **attrs):
+    return get_trace_log().span(session_id, stage, **attrs)
+
+# ===============================================================
+# --- LECTURA Y RESUMEN ---
+# ===============================================================
+def read_traces(paths):
+    """Registros de uno o varios logs (las líneas incompletas o corruptas se ignoran)."""
+    records = []
+    for path in paths:
+        try:
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        continue
+        except OSError:
+            continue
+    return records
+
+def session_trace_paths(frames_dirs):
+    """Logs de Windows de las sesiones: TRACE_FILENAME en cada carpeta de frames o en su carpeta padre."""
+    paths = set()
+    for frames_dir in frames_dirs:
+        for d in (frames_dir, os.path.dirname(frames_dir)):
+            path = os.path.join(d, TRACE_FILENAME)
+            if os.path.exists(path):
+                paths.add(path)
+    return sorted(paths)
+
+def percentile(values, p):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    k = (len(ordered) - 1) * p / 100
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+def derived_records(records):
+    """Métricas entre procesos calculadas con la hora de reloj: desfase de la orden de inicio (START por MQTT u orden
+    de grabar al servidor de cámara) al primer frame y a la primera muestra (fin de esos registros: w + d)."""
+    firsts, starts = {}, {}
+    for r in records:
+        key = (r.get('s'), r.get('e'))
+        if key not in firsts or r['w'] + r['d'] < firsts[key]:
+            firsts[key] = r['w'] + r['d']
+        if r.get('e') in START_STAGES and (r.get('s') not in starts or r['w'] < starts[r.get('s')]):
+            starts[r.get('s')] = r['w']
+    derived = []
+    for session_id, wall in starts.items():
+        for target, name in (('primer_frame', 'desfase_start_primer_frame'), ('primera_muestra', 'desfase_start_primera_muestra')):
+            other = firsts.get((session_id, target))
+            if other is not None:
+                derived.append({'s': session_id, 'e': name, 'p': 'derivado', 'w': wall, 'd': round(other - wall, 4)})
+    return derived
+
+def stage_summary(records):
+    """{etapa: {n, mean, p50, p95, max}} de las duraciones (s); los eventos puntuales solo cuentan en n."""
+    by_stage = {}
+    for r in records:
+        by_stage.setdefault(r['e'], []).append(r['d'])
+    return {stage: {'n': len(d), 'mean': round(sum(d) / len(d), 4), 'p50': round(percentile(d, 50), 4),
+                    'p95': round(percentile(d, 95), 4), 'max': round(max(d), 4)}
+            for stage, d in sorted(by_stage.items())}
+
+def catalog_frames_dirs():
+    """Carpetas de frames registradas en el catálogo de sesiones (vacío si no está disponible)."""
+    try:
+        import session_catalog
+        catalog = session_catalog.get_catalog()
+        return [d for d in (catalog.artifact(s, 'frames') for s in catalog.list_sessions('frames')) if d]
+    except Exception as e:
+        print(f"⚠️ Catálogo de sesiones no disponible para las trazas: {e}")
+        return []
+
+def load_all(frames_dirs=None):
+    """Trazas de TRACE_PATH, de las carpetas de frames (por defecto, las del catálogo) y las derivadas entre procesos."""
+    if frames_dirs is None:
+        frames_dirs = catalog_frames_dirs()
+    records = read_traces([TRACE_PATH] + session_trace_paths(frames_dirs))
+    return records + derived_records(records)
+
+# ===============================================================
+# --- ENDPOINT LOCAL DE MÉTRICAS ---
+# ===============================================================
+def serve_metrics(load=load_all, host=METRICS_HOST, port=METRICS_PORT):
+    """Sirve /metrics (resumen por etapa) y /metrics/<sesión> (trazas de la sesión) en JSON. Bloquea."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            parts = [p for p in self.path.split('?')[0].split('/') if p]
+            if not parts or parts[0] != 'metrics':
+                self.send_error(404)
+                return
+            records = load()
+            if len(parts) > 1:
+                body = sorted((r for r in records if r.get('s') == parts[1]), key=lambda r: r['w'])
+            else:
+                body = {'generated': time.time(), 'records': len(records), 'stages': stage_summary(records)}
+            data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    ThreadingHTTPServer.allow_reuse_address = True
+    server = ThreadingHTTPServer((host, port), Handler)
+    print(f"📊 Métricas de tiempos en http://{host}:{port}/metrics")
+    server.serve_forever()
+
+def start_metrics_server(load=load_all, host=METRICS_HOST, port=METRICS_PORT):
+    """Lanza el endpoint en un hilo de fondo; si el puerto ya está en uso (otro proceso lo sirve), no hace nada."""
+    try:
+        with socket.create_connection((host, port), timeout=0.5):
+            return None
+    except OSError:
+        pass
+    thread = threading.Thread(target=serve_metrics, args=(load, host, port), daemon=True)
+    thread.start()
+    return thread
+
+def format_summary(summary):
+    lines = [f"{'etapa':<32} {'n':>5} {'p50 (s)':>9} {'p95 (s)':>9} {'máx. (s)':>9}"]
+    for stage, s in summary.items():
+        lines.append(f"{stage:<32} {s['n']:>5} {s['p50']:>9.3f} {s['p95']:>9.3f} {s['max']:>9.3f}")
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Trazas de tiempo por sesión: resumen y endpoint de métricas.")
+    parser.add_argument("mode", choices=["report", "serve"])
+    parser.add_argument("--session", help="Modo 'report': muestra las trazas de una sesión en orden.")
+    parser.add_argument("--frames", nargs="*", help="Carpetas de frames con trazas de Windows (por defecto, las del catálogo).")
+    parser.add_argument("--port", type=int, default=METRICS_PORT)
+    args = parser.parse_args()
+
+    if args.mode == "serve":
+        serve_metrics(lambda: load_all(args.frames), port=args.port)
+    else:
+        records = load_all(args.frames)
+        if args.session:
+            for r in sorted((r for r in records if r.get('s') == args.session), key=lambda r: r['w']):
+                print(f"{time.strftime('%H:%M:%S', time.localtime(r['w']))} {r['e']:<32} {r['d']:>9.3f} s  ({r['p']})")
+        else:
+            print(format_summary(stage_summary(records)))